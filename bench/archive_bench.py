@@ -0,0 +1,124 @@
+"""Benchmark: latency with years of history in the hot tables vs after archival.
+
+Seeds YEARS of synthetic history, measures the day view, booking and the owner's
+booking history, moves everything older than the retention into the archive
+database (parking_app.app.archive, followed by VACUUM) and measures again.
+
+  day_recent    day views spread over the kept history and the booking horizon
+  book          single bookings of distinct free days
+  owner_history /owner/bookings pages, including pages served from the archive
+
+    python -m bench.archive_bench
+    python -m bench.archive_bench --years 5 --keep-days 400
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from .clients import ASGIClient
+from .portal_bench import measure
+from .seed import CONTENTION_SPOT, seed
+
+
+def _db_info(path: Path) -> dict:
+    con = sqlite3.connect(path)
+    try:
+        info = {
+            "file_mb": round(path.stat().st_size / 1e6, 2),
+            "offers": con.execute("SELECT COUNT(*) FROM offers").fetchone()[0],
+            "bookings": con.execute("SELECT COUNT(*) FROM bookings").fetchone()[0],
+        }
+    finally:
+        con.close()
+    return info
+
+
+async def _phase(info: dict, n: int, concurrency: int, book_days: range, keep_days: int) -> dict:
+    from parking_app.app import berlin, main
+
+    main.DAY_VIEW_CACHE.clear()
+    client = ASGIClient(main.app)
+    await client.startup()
+    try:
+        today = berlin.today()
+        span = keep_days + info["ahead_days"]
+        out = {}
+        out["day_recent"] = await measure(
+            n,
+            concurrency,
+            lambda i: client.request("GET", f"/day/{(today + timedelta(days=(i * 7919) % span - keep_days)).isoformat()}?lot=bank"),
+        )
+        out["book"] = await measure(
+            len(book_days),
+            concurrency,
+            lambda i: client.request(
+                "POST", "/book", {"day": (today + timedelta(days=book_days[i])).isoformat(), "spot": CONTENTION_SPOT, "lot": "bank"}
+            ),
+        )
+        login = await client.request("POST", "/owner", {"code": info["owner_code"]})
+        cookie = {"Cookie": login.headers.get("set-cookie", "").split(";")[0]}
+        # 50 per page: with 5 years the later pages lie in the archive.
+        out["owner_history"] = await measure(
+            n // 4, concurrency, lambda i: client.request("GET", f"/owner/bookings?p={i % 12}", headers=cookie)
+        )
+        return out
+    finally:
+        await client.shutdown()
+
+
+async def _main(args: argparse.Namespace) -> dict:
+    from parking_app.app import archive
+
+    with tempfile.TemporaryDirectory(prefix="parking-archive-") as tmp:
+        root = Path(tmp)
+        info = seed(root, years=args.years)
+        db_path = root / "parking.sqlite3"
+        half = (info["ahead_days"] - 10) // 2
+        before_db = _db_info(db_path)
+        before = await _phase(info, args.requests, args.concurrency, range(5, 5 + half), args.keep_days)
+
+        t0 = time.perf_counter()
+        res = archive.archive(args.keep_days)
+        archive.vacuum()
+        archive_s = time.perf_counter() - t0
+        after_db = _db_info(db_path)
+        after = await _phase(info, args.requests, args.concurrency, range(5 + half, 5 + 2 * half), args.keep_days)
+
+    return {
+        "years": args.years,
+        "keep_days": args.keep_days,
+        "archived": {"offers": res.offers, "bookings": res.bookings, "seconds": round(archive_s, 2)},
+        "hot_before": before_db,
+        "hot_after": after_db,
+        "before": before,
+        "after": after,
+    }
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--years", type=int, default=5, help="years of seeded history")
+    ap.add_argument("--keep-days", type=int, default=400)
+    ap.add_argument("--requests", type=int, default=800, help="requests per read scenario")
+    ap.add_argument("--concurrency", type=int, default=16)
+    args = ap.parse_args()
+
+    result = asyncio.run(_main(args))
+    print(json.dumps(result, indent=2))
+    # The history must not lose bookings when they move to the archive.
+    ok = all(
+        r["owner_history"]["status"] == {"200": r["owner_history"]["requests"]} for r in (result["before"], result["after"])
+    )
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
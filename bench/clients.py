@@ -0,0 +1,143 @@
+"""Minimal HTTP clients for the benchmarks (no extra dependencies).
+
+ASGIClient drives the app in-process through the ASGI interface, HTTPClient talks
+to a running server. Both return Response and never follow redirects.
+"""
+from __future__ import annotations
+
+import asyncio
+import urllib.error
+import urllib.request
+from dataclasses import dataclass, field
+from typing import Any, Optional
+from urllib.parse import urlencode, urlsplit
+
+
+@dataclass
+class Response:
+    status: int
+    body: bytes = b""
+    headers: dict[str, str] = field(default_factory=dict)
+
+
+def _encode(data: Optional[dict[str, Any]]) -> bytes:
+    # Lists become repeated fields (weekdays=0&weekdays=1), like an HTML form.
+    return urlencode(data or {}, doseq=True).encode()
+
+
+class ASGIClient:
+    def __init__(self, app) -> None:
+        self.app = app
+        self._lifespan: Optional[asyncio.Task] = None
+        self._events: asyncio.Queue = asyncio.Queue()
+        self._replies: asyncio.Queue = asyncio.Queue()
+
+    async def startup(self) -> None:
+        async def receive():
+            return await self._events.get()
+
+        async def send(message):
+            await self._replies.put(message)
+
+        self._lifespan = asyncio.create_task(self.app({"type": "lifespan", "asgi": {"version": "3.0"}}, receive, send))
+        await self._events.put({"type": "lifespan.startup"})
+        msg = await self._replies.get()
+        if msg["type"] != "lifespan.startup.complete":
+            raise RuntimeError(f"startup failed: {msg}")
+
+    async def shutdown(self) -> None:
+        await self._events.put({"type": "lifespan.shutdown"})
+        await self._replies.get()
+        await self._lifespan
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        data: Optional[dict[str, Any]] = None,
+        headers: Optional[dict[str, str]] = None,
+    ) -> Response:
+        parts = urlsplit(url)
+        body = _encode(data) if method == "POST" else b""
+        raw_headers = [(b"host", b"bench")]
+        if method == "POST":
+            raw_headers += [
+                (b"content-type", b"application/x-www-form-urlencoded"),
+                (b"content-length", str(len(body)).encode()),
+            ]
+        raw_headers += [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": parts.path,
+            "raw_path": parts.path.encode(),
+            "query_string": parts.query.encode(),
+            "root_path": "",
+            "headers": raw_headers,
+            "client": ("127.0.0.1", 50000),
+            "server": ("bench", 80),
+        }
+        sent = False
+
+        async def receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            await asyncio.Event().wait()  # client never disconnects
+
+        resp = Response(status=0)
+        chunks: list[bytes] = []
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                resp.status = message["status"]
+                resp.headers = {k.decode().lower(): v.decode() for k, v in message.get("headers", [])}
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, send)
+        resp.body = b"".join(chunks)
+        return resp
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HTTPClient:
+    def __init__(self, base_url: str) -> None:
+        self.base_url = base_url.rstrip("/")
+        self._opener = urllib.request.build_opener(_NoRedirect)
+
+    async def startup(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def _call(self, method: str, url: str, data, headers) -> Response:
+        req = urllib.request.Request(
+            self.base_url + url,
+            data=_encode(data) if method == "POST" else None,
+            headers=headers or {},
+            method=method,
+        )
+        try:
+            with self._opener.open(req, timeout=60) as r:
+                return Response(r.status, r.read(), {k.lower(): v for k, v in r.headers.items()})
+        except urllib.error.HTTPError as e:  # 3xx/4xx/5xx
+            return Response(e.code, e.read(), {k.lower(): v for k, v in e.headers.items()})
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        data: Optional[dict[str, Any]] = None,
+        headers: Optional[dict[str, str]] = None,
+    ) -> Response:
+        return await asyncio.to_thread(self._call, method, url, data, headers)
@@ -0,0 +1,145 @@
+"""Benchmark: bookings per second and commits per second, per-booking commit vs group commit.
+
+Concurrent clients book distinct (spot, day) pairs through the worker's write
+queue (db.WriteQueue); every pair is attempted twice, so half the attempts are
+conflicts that must come back as "not booked" to exactly one caller each.
+
+  per-op  one transaction per booking on the writer thread (before group commit)
+  group   bookings arriving within GROUP_COMMIT_WINDOW_S share one transaction
+
+In WAL mode every commit appends a commit frame to the WAL, and with
+synchronous=FULL each commit is one fsync; with the app's default NORMAL the WAL is
+only synced at checkpoints. Commits per second is therefore the fsync rate under
+FULL, and the write-transaction rate under NORMAL.
+
+    python -m bench.commit_bench
+    python -m bench.commit_bench --clients 64 --bookings 4000
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import secrets
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+from parking_app.app import db
+
+SPOTS = 80
+BOOK_SQL = """
+INSERT INTO bookings(spot_id, day, booker_email, status, created_at, manage_token)
+SELECT o.spot_id, o.day, '', 'active', '', ?
+FROM offers o JOIN spots s ON s.id=o.spot_id
+WHERE s.name=? AND o.day=?
+ON CONFLICT(spot_id, day) DO NOTHING
+"""
+
+
+def _setup(root: Path, days: int, synchronous: str) -> None:
+    db.DB_PATH = root / f"commit-{synchronous.lower()}.sqlite3"
+    db.PRAGMAS = tuple(
+        f"PRAGMA synchronous = {synchronous}" if p.startswith("PRAGMA synchronous") else p for p in db.PRAGMAS
+    )
+    db.migrate()
+    today = date.today()
+    with db.connect() as con:
+        con.executemany(
+            "INSERT INTO spots(name, owner_code, lot) VALUES(?, ?, 'bank')",
+            [(f"P{i:02d}", f"B{i:03d}") for i in range(1, SPOTS + 1)],
+        )
+        con.execute(
+            """
+            WITH RECURSIVE d(n) AS (SELECT 0 UNION ALL SELECT n+1 FROM d WHERE n+1<?)
+            INSERT INTO offers(spot_id, day, created_at)
+            SELECT s.id, date(?, '+' || d.n || ' days'), '' FROM spots s, d
+            """,
+            (days, today.isoformat()),
+        )
+        con.commit()
+
+
+def _book(spot: str, day: str):
+    def op(con):
+        return con.execute(BOOK_SQL, (secrets.token_urlsafe(24), spot, day)).rowcount == 1
+
+    return op
+
+
+def _run(mode: str, clients: int, bookings: int, synchronous: str) -> dict:
+    today = date.today()
+    targets = [(f"P{i % SPOTS + 1:02d}", (today + timedelta(days=i // SPOTS)).isoformat()) for i in range(bookings // 2)]
+    attempts = targets + targets  # second attempt of every pair is a conflict
+    with tempfile.TemporaryDirectory(prefix="parking-commit-") as tmp:
+        _setup(Path(tmp), len(targets) // SPOTS + 1, synchronous)
+        q = db.WriteQueue()
+        lock = threading.Lock()
+        won = [0]
+        per_op_commits = [0]
+
+        def client(k: int) -> None:
+            for spot, day in attempts[k::clients]:
+                op = _book(spot, day)
+                if mode == "group":
+                    ok = q.submit(op).result()
+                else:
+                    def alone(con, op=op):
+                        with db.immediate(con):
+                            return op(con)
+
+                    ok = q.submit_exclusive(alone).result()
+                    with lock:
+                        per_op_commits[0] += 1
+                if ok:
+                    with lock:
+                        won[0] += 1
+
+        threads = [threading.Thread(target=client, args=(k,)) for k in range(clients)]
+        t0 = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        wall = time.perf_counter() - t0
+        q.close()
+        commits = q.commits if mode == "group" else per_op_commits[0]
+        with db.connect() as con:
+            rows = con.execute("SELECT COUNT(*) FROM bookings").fetchone()[0]
+        db.close_pool()
+
+    return {
+        "mode": mode,
+        "synchronous": synchronous,
+        "attempts": len(attempts),
+        "booked": won[0],
+        "rows": rows,
+        "seconds": round(wall, 4),
+        "bookings_per_s": round(len(attempts) / wall, 1),
+        "commits": commits,
+        "commits_per_s": round(commits / wall, 1),
+        "ops_per_commit": round(len(attempts) / commits, 2),
+    }
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--clients", type=int, default=32)
+    ap.add_argument("--bookings", type=int, default=2000, help="attempts per run (half of them conflicts)")
+    args = ap.parse_args()
+
+    results = [
+        _run(mode, args.clients, args.bookings, sync)
+        for sync in ("FULL", "NORMAL")
+        for mode in ("per-op", "group")
+    ]
+    print(json.dumps(results, indent=2))
+    # Exactly one winner per (spot, day), whichever way it was committed.
+    ok = all(r["booked"] == r["rows"] == r["attempts"] // 2 for r in results)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
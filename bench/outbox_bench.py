@@ -0,0 +1,141 @@
+"""Benchmark: owner withdrawal with hundreds of opted-in bookings, then delivery.
+
+Runs against a throwaway database and a minimal local SMTP server (accepts and
+counts messages). Measures how long withdraw_range takes when it queues one mail
+per cancelled booking, then delivers the queue through the outbox (one reused SMTP
+connection per batch) and, for comparison, with one connection per mail.
+
+    python -m bench.outbox_bench
+    python -m bench.outbox_bench --bookings 1000
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+from parking_app.app import berlin, db, outbox
+from parking_app.app.emailer import SmtpConfig, SmtpSender, build_message
+from parking_app.app.series import withdraw_range
+
+
+class SmtpSink:
+    """Just enough SMTP for smtplib: every DATA is accepted and counted."""
+
+    def __init__(self) -> None:
+        self.connections = 0
+        self.messages = 0
+        self.port = 0
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        threading.Thread(target=self._serve, daemon=True).start()
+        self._ready.wait()
+
+    def _serve(self) -> None:
+        asyncio.set_event_loop(self._loop)
+        server = self._loop.run_until_complete(asyncio.start_server(self._session, "127.0.0.1", 0))
+        self.port = server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+
+    async def _session(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        writer.write(b"220 sink\r\n")
+        in_data = False
+        while line := await reader.readline():
+            if in_data:
+                if line == b".\r\n":
+                    in_data = False
+                    self.messages += 1
+                    writer.write(b"250 queued\r\n")
+            elif line[:4].upper() == b"DATA":
+                in_data = True
+                writer.write(b"354 go ahead\r\n")
+            elif line[:4].upper() == b"QUIT":
+                writer.write(b"221 bye\r\n")
+                await writer.drain()
+                break
+            else:
+                writer.write(b"250 ok\r\n")
+            await writer.drain()
+        writer.close()
+
+    def reset(self) -> None:
+        self.connections = self.messages = 0
+
+
+def _seed(n: int, today: date) -> int:
+    with db.connect() as con:
+        con.execute("INSERT INTO spots(name, owner_code, lot) VALUES('P01', 'B001', 'bank')")
+        spot_id = con.execute("SELECT id FROM spots WHERE name='P01'").fetchone()[0]
+        days = [(today + timedelta(days=i + 2)).isoformat() for i in range(n)]
+        con.executemany("INSERT INTO offers(spot_id, day, created_at) VALUES(?, ?, '')", [(spot_id, d) for d in days])
+        con.executemany(
+            "INSERT INTO bookings(spot_id, day, booker_email, status, created_at, manage_token)"
+            " VALUES(?, ?, ?, 'active', '', ?)",
+            [(spot_id, d, f"booker{i}@example.org", f"tok{i}") for i, d in enumerate(days)],
+        )
+    return spot_id
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--bookings", type=int, default=500, help="opted-in bookings the withdrawal cancels")
+    args = ap.parse_args()
+
+    sink = SmtpSink()
+    cfg = SmtpConfig(host="127.0.0.1", port=sink.port, sender="bench@localhost")
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = Path(tmp) / "bench.sqlite3"
+        db.migrate()
+        today = berlin.today()
+        spot_id = _seed(args.bookings, today)
+
+        con = db.open_connection()
+        t0 = time.perf_counter()
+        res = withdraw_range(
+            con, spot_id, today, today + timedelta(days=3650), set(range(7)), "", "2026-01-01T00:00:00Z", "bench", "http://bench"
+        )
+        withdraw_ms = (time.perf_counter() - t0) * 1000
+
+        t0 = time.perf_counter()
+        sender = SmtpSender(cfg)
+        while outbox.deliver_due(con, sender).claimed:
+            pass
+        sender.close()
+        outbox_s = time.perf_counter() - t0
+        delivered, outbox_connections = sink.messages, sink.connections
+
+        # The old way: one connection (formerly one process) per mail.
+        rows = con.execute("SELECT dedupe_key, recipient, subject, body FROM outbox").fetchall()
+        sink.reset()
+        t0 = time.perf_counter()
+        for r in rows:
+            single = SmtpSender(cfg)
+            single.send(build_message(cfg, r[0], r[1], r[2], r[3]))
+            single.close()
+        per_mail_s = time.perf_counter() - t0
+        counts = outbox.counts(con)
+        con.close()
+        db.close_pool()
+
+    print(
+        f"withdraw: cancelled={res.cancelled} queued={res.notified} time={withdraw_ms:.1f} ms\n"
+        f"outbox:   {delivered} mails over {outbox_connections} connection(s) in {outbox_s * 1000:.0f} ms "
+        f"({delivered / outbox_s:.0f}/s)\n"
+        f"per mail: {sink.messages} mails over {sink.connections} connections in {per_mail_s * 1000:.0f} ms "
+        f"({sink.messages / per_mail_s:.0f}/s)"
+    )
+    assert res.notified == res.cancelled == args.bookings, "every cancelled booking should queue one mail"
+    assert counts == {"sent": args.bookings}, counts
+    assert outbox_connections == 1, f"{outbox_connections} SMTP connections (expected one reused)"
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,285 @@
+"""Benchmark the portal's hot paths against a seeded synthetic database.
+
+Seeds all spots with years of offers and bookings (bench/seed.py), then measures
+throughput and p50/p99 latency per scenario and writes the results as JSON so two
+commits can be compared. By default the app runs in-process over ASGI; --workers N
+starts uvicorn with N worker processes and benchmarks over HTTP instead.
+
+    python -m bench.portal_bench --out bench/results/$(git rev-parse --short HEAD).json
+    python -m bench.portal_bench --workers 4
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Awaitable, Callable
+
+from .clients import ASGIClient, HTTPClient, Response
+from .seed import CONTENTION_SPOT, SERIES_SPOT, seed
+
+REPO = Path(__file__).resolve().parents[1]
+
+
+def _percentile(sorted_ms: list[float], q: float) -> float:
+    # nearest-rank on the sorted sample
+    return sorted_ms[min(len(sorted_ms) - 1, max(0, round(q * len(sorted_ms)) - 1))]
+
+
+async def measure(
+    n: int,
+    concurrency: int,
+    call: Callable[[int], Awaitable[Response]],
+) -> dict:
+    """Run call(0..n-1) with at most `concurrency` in flight; latency and throughput."""
+    sem = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    statuses: Counter[int] = Counter()
+
+    async def one(i: int) -> None:
+        async with sem:
+            t0 = time.perf_counter()
+            resp = await call(i)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            statuses[resp.status] += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n)))
+    wall = time.perf_counter() - t0
+    latencies.sort()
+    return {
+        "requests": n,
+        "concurrency": concurrency,
+        "seconds": round(wall, 4),
+        "rps": round(n / wall, 1),
+        "mean_ms": round(statistics.fmean(latencies), 3),
+        "p50_ms": round(_percentile(latencies, 0.50), 3),
+        "p99_ms": round(_percentile(latencies, 0.99), 3),
+        "max_ms": round(latencies[-1], 3),
+        "status": {str(k): v for k, v in sorted(statuses.items())},
+    }
+
+
+async def run_scenarios(client, info: dict, db_path: Path, n: int, concurrency: int) -> dict:
+    from parking_app.app import berlin
+
+    today = berlin.today()
+    horizon = info["ahead_days"]
+    code = info["owner_code"]
+    tokens = info["tokens"]
+    out: dict[str, dict] = {}
+
+    hot = [today.isoformat(), (today + timedelta(days=1)).isoformat()]
+    out["day_hot"] = await measure(n, concurrency, lambda i: client.request("GET", f"/day/{hot[i % 2]}?lot=bank"))
+    span = 365 * info["years"] + horizon
+    out["day_spread"] = await measure(
+        n,
+        concurrency,
+        lambda i: client.request(
+            "GET",
+            f"/day/{(today + timedelta(days=(i * 7919) % span - 365 * info['years'])).isoformat()}?lot={('bank', 'post')[i % 2]}",
+        ),
+    )
+
+    # Everyone races for the same spot and day; exactly one may win each round.
+    rounds, racers = 20, 32
+    results = []
+    winners_ok = True
+    for r in range(rounds):
+        day = (today + timedelta(days=10 + r)).isoformat()
+        res = await measure(
+            racers,
+            racers,
+            lambda i, day=day: client.request("POST", "/book", {"day": day, "spot": CONTENTION_SPOT, "lot": "bank"}),
+        )
+        winners_ok = winners_ok and res["status"].get("303", 0) == 1
+        results.append(res)
+    out["book_contention"] = _merge(results) | {"rounds": rounds, "one_winner_per_round": winners_ok}
+
+    # A year of Mon-Fri on a free spot; bookings are removed again between runs.
+    series_runs = []
+    start, end = today + timedelta(days=40), today + timedelta(days=40 + 364)
+    for _ in range(5):
+        _reset_spot(db_path, SERIES_SPOT, today)
+        series_runs.append(
+            await measure(
+                1,
+                1,
+                lambda i: client.request(
+                    "POST",
+                    "/series",
+                    {
+                        "spot": SERIES_SPOT,
+                        "start_day": start.isoformat(),
+                        "end_day": end.isoformat(),
+                        "mode": "soft",
+                        "weekdays": ["0", "1", "2", "3", "4"],
+                    },
+                ),
+            )
+        )
+    out["series_year"] = _merge(series_runs)
+
+    # Logged in once; the session cookie identifies the owner from then on.
+    login = await client.request("POST", "/owner", {"code": code})
+    cookie = {"Cookie": login.headers.get("set-cookie", "").split(";")[0]}
+    out["owner_portal"] = await measure(
+        n // 2, concurrency, lambda i: client.request("GET", f"/owner/portal?p={i % 26}", headers=cookie)
+    )
+    out["manage"] = await measure(n, concurrency, lambda i: client.request("GET", f"/manage/{tokens[i % len(tokens)]}"))
+
+    month = f"/api/availability?lot=bank&from={today.isoformat()}&to={(today + timedelta(days=30)).isoformat()}"
+    out["api_month"] = await measure(n, concurrency, lambda i: client.request("GET", month))
+    api_etag = (await client.request("GET", month)).headers.get("etag", "")
+    out["api_month_304"] = await measure(
+        n, concurrency, lambda i: client.request("GET", month, headers={"If-None-Match": api_etag})
+    )
+    years = f"/api/availability?lot=bank&from={(today - timedelta(days=365 * info['years'])).isoformat()}&to={today.isoformat()}"
+    out["api_history"] = await measure(n // 20, 4, lambda i: client.request("GET", years))
+
+    t0 = time.perf_counter()
+    first = await client.request("GET", "/plan/annotated.png")
+    out["plan_annotated_cold"] = {"status": first.status, "ms": round((time.perf_counter() - t0) * 1000, 3), "bytes": len(first.body)}
+    out["plan_annotated"] = await measure(n // 2, concurrency, lambda i: client.request("GET", "/plan/annotated.png"))
+    etag = first.headers.get("etag", "")
+    out["plan_annotated_304"] = await measure(
+        n, concurrency, lambda i: client.request("GET", "/plan/annotated.png", headers={"If-None-Match": etag})
+    )
+    return out
+
+
+def _merge(results: list[dict]) -> dict:
+    # Combine several measure() runs; percentiles are taken over the per-run values.
+    total = sum(r["requests"] for r in results)
+    seconds = sum(r["seconds"] for r in results)
+    status: Counter[str] = Counter()
+    for r in results:
+        status.update(r["status"])
+    return {
+        "requests": total,
+        "concurrency": max(r["concurrency"] for r in results),
+        "seconds": round(seconds, 4),
+        "rps": round(total / seconds, 1),
+        "mean_ms": round(statistics.fmean(r["mean_ms"] for r in results), 3),
+        "p50_ms": round(statistics.median(r["p50_ms"] for r in results), 3),
+        "p99_ms": round(max(r["p99_ms"] for r in results), 3),
+        "max_ms": round(max(r["max_ms"] for r in results), 3),
+        "status": dict(sorted(status.items())),
+    }
+
+
+def _reset_spot(db_path: Path, spot: str, today: date) -> None:
+    con = sqlite3.connect(db_path, timeout=30)
+    with con:
+        con.execute(
+            "DELETE FROM bookings WHERE spot_id=(SELECT id FROM spots WHERE name=?) AND day>?",
+            (spot, today.isoformat()),
+        )
+    con.close()
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_uvicorn(root: Path, workers: int) -> tuple[subprocess.Popen, str]:
+    port = _free_port()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "bench.serve:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning", "--timeout-graceful-shutdown", "5"],
+        cwd=REPO,
+        env={**os.environ, "BENCH_ROOT": str(root)},
+    )
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return proc, base
+        except OSError:
+            if proc.poll() is not None:
+                raise RuntimeError("uvicorn exited during startup")
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("uvicorn did not start")
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return ""
+
+
+async def _main(args: argparse.Namespace) -> dict:
+    with tempfile.TemporaryDirectory(prefix="parking-bench-") as tmp:
+        root = Path(tmp)
+        t0 = time.perf_counter()
+        info = seed(root, years=args.years)
+        seed_s = time.perf_counter() - t0
+
+        proc = None
+        if args.workers:
+            proc, base = _start_uvicorn(root, args.workers)
+            client = HTTPClient(base)
+        else:
+            from parking_app.app.main import app
+
+            client = ASGIClient(app)
+        await client.startup()
+        try:
+            scenarios = await run_scenarios(client, info, root / "parking.sqlite3", args.requests, args.concurrency)
+        finally:
+            await client.shutdown()
+            if proc is not None:
+                proc.terminate()
+                proc.wait(timeout=30)
+
+    return {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "mode": f"uvicorn x{args.workers}" if args.workers else "asgi",
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "seed": {k: info[k] for k in ("spots", "offers", "bookings", "years")} | {"seconds": round(seed_s, 2)},
+        "scenarios": scenarios,
+    }
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--out", type=Path, help="write JSON results here (default: stdout only)")
+    ap.add_argument("--workers", type=int, default=0, help="run uvicorn with N workers instead of in-process")
+    ap.add_argument("--requests", type=int, default=400, help="requests per read scenario")
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--years", type=int, default=3, help="years of seeded history")
+    args = ap.parse_args()
+
+    result = asyncio.run(_main(args))
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.out:
+        args.out.parent.mkdir(parents=True, exist_ok=True)
+        args.out.write_text(text + "\n", encoding="utf-8")
+    ok = result["scenarios"]["book_contention"]["one_winner_per_round"]
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+"""Synthetic benchmark data: a self-contained app directory with years of history.
+
+configure() points the app (database, secrets, plan, data) at a bench directory;
+seed() fills it with all spots from owners.py plus offers and bookings.
+"""
+from __future__ import annotations
+
+import random
+import secrets
+from datetime import timedelta
+from pathlib import Path
+
+from PIL import Image, ImageDraw
+
+# Spots kept free in the future for the write scenarios (offers, no bookings).
+CONTENTION_SPOT = "P60"
+SERIES_SPOT = "P59"
+OWNER_SPOT = "P01"
+
+
+def configure(root: Path) -> None:
+    """Point every path the app uses at root (call before the app starts up)."""
+    from parking_app.app import db, main, owners, plan_labels, templating
+
+    root.mkdir(parents=True, exist_ok=True)
+    (root / "static").mkdir(exist_ok=True)
+    db.DB_PATH = root / "parking.sqlite3"
+    owners.SECRETS_DIR = root / "secrets"
+    owners.OWNERS_PATH = owners.SECRETS_DIR / "owners.json"
+    plan_labels.BASE_DIR = root
+    plan_labels.PLAN_DIR = root / "plan"
+    plan_labels.DATA_DIR = root / "data"
+    plan_labels.SECRETS_DIR = root / "secrets"
+    plan_labels.PLAN_IMAGE = plan_labels.PLAN_DIR / "plan-1.png"
+    plan_labels.LABELS_PATH = plan_labels.DATA_DIR / "plan_labels.json"
+    plan_labels.ADMIN_TOKEN_PATH = plan_labels.SECRETS_DIR / "plan_admin_token.txt"
+    main.BASE_DIR = root
+    main.SECRETS_DIR = root / "secrets"
+    main.DATA_DIR = root / "data"
+    main.PLAN_IMAGE = plan_labels.PLAN_IMAGE
+    templating.set_cache_dir(main.TEMPLATES, root / "data" / "template_cache")
+
+
+def _plan(root: Path, rnd: random.Random) -> list[dict]:
+    # Roughly the size of the real site plan, with all 60 bank spots labelled.
+    w, h = 2400, 1600
+    img = Image.new("RGB", (w, h), (235, 235, 230))
+    draw = ImageDraw.Draw(img)
+    for _ in range(120):
+        x, y = rnd.randrange(w), rnd.randrange(h)
+        draw.rectangle((x, y, x + rnd.randrange(40, 300), y + rnd.randrange(20, 120)), outline=(90, 90, 90), width=3)
+    (root / "plan").mkdir(exist_ok=True)
+    img.save(root / "plan" / "plan-1.png")
+    return [{"n": n, "x": 120 + (n - 1) % 12 * 180, "y": 150 + (n - 1) // 12 * 280} for n in range(1, 61)]
+
+
+def seed(root: Path, years: int = 3, ahead_days: int = 365, rnd_seed: int = 1) -> dict:
+    """Create the bench directory; returns row counts and the names the scenarios use."""
+    from parking_app.app import berlin, db, main
+    from parking_app.app.owners import ensure_owner_codes
+    from parking_app.app.plan_labels import replace_labels
+
+    rnd = random.Random(rnd_seed)
+    configure(root)
+    labels = _plan(root, rnd)
+    db.migrate()
+    main.init_spots()
+    codes = ensure_owner_codes()
+
+    today = berlin.today()
+    first = today - timedelta(days=365 * years)
+    days = [first + timedelta(days=i) for i in range((today - first).days + ahead_days + 1)]
+
+    with db.connect() as con:
+        spots = {r["name"]: r["id"] for r in con.execute("SELECT id, name FROM spots")}
+        offers, bookings = [], []
+        for name, spot_id in spots.items():
+            reserved = name in (CONTENTION_SPOT, SERIES_SPOT)
+            for d in days:
+                future = d > today
+                if reserved:
+                    if future:
+                        offers.append((spot_id, d.isoformat()))
+                    continue
+                if d.weekday() >= 5 or rnd.random() > 0.6:
+                    continue
+                offers.append((spot_id, d.isoformat()))
+                if rnd.random() < (0.3 if future else 0.7):
+                    status = "active" if rnd.random() < 0.9 else "cancelled_by_booker"
+                    bookings.append((spot_id, d.isoformat(), status, secrets.token_urlsafe(24)))
+        with db.immediate(con):
+            con.executemany("INSERT INTO offers(spot_id, day, created_at) VALUES(?, ?, 'seed')", offers)
+            con.executemany(
+                "INSERT INTO bookings(spot_id, day, booker_email, status, created_at, manage_token) "
+                "VALUES(?, ?, '', ?, 'seed', ?)",
+                bookings,
+            )
+            replace_labels(con, "bank", labels)
+            # The seed is not a change other workers need to replay.
+            con.execute("DELETE FROM change_log")
+        con.execute("PRAGMA optimize")
+    db.close_pool()
+
+    return {
+        "spots": len(spots),
+        "offers": len(offers),
+        "bookings": len(bookings),
+        "years": years,
+        "ahead_days": ahead_days,
+        "owner_code": codes[OWNER_SPOT],
+        "tokens": [b[3] for b in rnd.sample(bookings, min(500, len(bookings)))],
+    }
@@ -0,0 +1,77 @@
+"""Benchmark: book a 10-year Monday–Friday series for one spot.
+
+Runs against a throwaway database and asserts that the series engine needs a
+bounded number of statements, independent of the number of days.
+
+    python -m bench.series_bench
+"""
+from __future__ import annotations
+
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+from parking_app.app import berlin, db
+from parking_app.app.series import book_series
+
+MAX_STATEMENTS = 8
+
+
+class CountingConnection:
+    """Proxy that counts execute/executemany round trips."""
+
+    def __init__(self, con: sqlite3.Connection) -> None:
+        self._con = con
+        self.statements = 0
+
+    def execute(self, *args, **kwargs):
+        self.statements += 1
+        return self._con.execute(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        self.statements += 1
+        return self._con.executemany(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._con, name)
+
+
+def main() -> int:
+    horizon = 3650  # MAX_BOOK_AHEAD_DAYS
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = Path(tmp) / "bench.sqlite3"
+        db.migrate()
+        today = date.today()
+        max_day = today + timedelta(days=horizon)
+        with db.connect() as con:
+            con.execute("INSERT INTO spots(name, owner_code, lot) VALUES('P01', 'B001', 'bank')")
+            spot_id = con.execute("SELECT id FROM spots WHERE name='P01'").fetchone()[0]
+            con.executemany(
+                "INSERT INTO offers(spot_id, day, created_at) VALUES(?, ?, '')",
+                [(spot_id, (today + timedelta(days=i)).strftime("%Y-%m-%d")) for i in range(horizon + 1)],
+            )
+            berlin.ensure_days(con, today, max_day)  # done at app startup
+
+        weekdays = {0, 1, 2, 3, 4}
+        targets = berlin.weekday_count(today, max_day, weekdays)
+        with db.connect() as raw:
+            con = CountingConnection(raw)
+            t0 = time.perf_counter()
+            res = book_series(con, spot_id, today, max_day, weekdays, "hard", today, max_day, "bench")
+            elapsed = time.perf_counter() - t0
+        db.close_pool()
+
+    print(
+        f"series: {targets} days, booked={len(res.booked)} failed={len(res.failed)} "
+        f"statements={con.statements} time={elapsed * 1000:.1f} ms"
+    )
+    assert not res.hard_failed and len(res.booked) == targets, "series should book every target day"
+    assert con.statements <= MAX_STATEMENTS, f"{con.statements} statements (max {MAX_STATEMENTS})"
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
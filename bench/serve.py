@@ -0,0 +1,16 @@
+"""uvicorn entry point for the multi-worker benchmark (bench directory from $BENCH_ROOT).
+
+    BENCH_ROOT=/tmp/bench uvicorn bench.serve:app --workers 4
+"""
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+from .seed import configure
+
+configure(Path(os.environ["BENCH_ROOT"]))
+
+from parking_app.app.main import app  # noqa: E402  (paths must be set first)
+
+__all__ = ["app"]
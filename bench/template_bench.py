@@ -0,0 +1,76 @@
+"""Benchmark: template compile time on a cold start and day view render cost.
+
+  cold    fresh process, empty bytecode cache: every template parsed and compiled
+  warm    fresh process, cache filled by a previous precompile()
+  render  day.html with all bank spots offered, per render
+
+    python -m bench.template_bench
+"""
+from __future__ import annotations
+
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+
+REPO = Path(__file__).resolve().parents[1]
+RUNS = 5
+
+_CHILD = """
+import sys, time
+from pathlib import Path
+from parking_app.app.templating import make_templates, precompile
+t0 = time.perf_counter()
+precompile(make_templates(cache_dir=Path(sys.argv[1])))
+print((time.perf_counter() - t0) * 1000)
+"""
+
+
+def _precompile_ms(cache_dir: Path) -> float:
+    out = subprocess.run(
+        [sys.executable, "-c", _CHILD, str(cache_dir)], cwd=REPO, capture_output=True, text=True, check=True
+    )
+    return float(out.stdout.strip())
+
+
+def _render_us(n: int = 2000) -> float:
+    from parking_app.app.owners import spot_label
+    from parking_app.app.templating import make_templates
+
+    with tempfile.TemporaryDirectory() as tmp:
+        template = make_templates(cache_dir=Path(tmp)).env.get_template("day.html")
+        offers = [
+            {"spot": f"P{i:02d}", "label": spot_label("bank", f"P{i:02d}"), "booked": i % 3 == 0}
+            for i in range(1, 61)
+        ]
+        ctx = {
+            "day": date.today().isoformat(), "lot": "bank", "lot_title": "Bankparkplatz", "offers": offers,
+            "prev_day": "", "next_day": "", "maxAhead": 3650, "year": date.today().year,
+        }
+        template.render(ctx)
+        t0 = time.perf_counter()
+        for _ in range(n):
+            template.render(ctx)
+        return (time.perf_counter() - t0) / n * 1e6
+
+
+def main() -> int:
+    cold, warm = [], []
+    for _ in range(RUNS):
+        with tempfile.TemporaryDirectory() as tmp:
+            cold.append(_precompile_ms(Path(tmp)))
+            warm.append(_precompile_ms(Path(tmp)))
+    result = {
+        "precompile_cold_ms": round(min(cold), 1),
+        "precompile_warm_ms": round(min(warm), 1),
+        "day_render_us": round(_render_us(), 1),
+    }
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,297 @@
+"""Archival of past offers and bookings into a separate database file.
+
+Nearly all traffic touches today and the next weeks, so days older than the
+retention are moved from the hot tables (offers, bookings) into the archive
+database next to the main one (parking-archive.sqlite3). The hot tables and
+their indexes stay small enough to live in the page cache. archive_state.cutoff
+in the main database is the boundary: days before it live in the archive.
+
+A chunk of days is moved in two transactions:
+  1. replace the archive's rows of those days with a copy of the hot rows
+  2. check that the hot rows still equal the copy, delete them and advance the
+     cutoff (writes the main file only; on a mismatch the chunk starts over)
+Readers only take archive rows with day < cutoff: rows copied but not yet
+deleted are never seen twice, and a crash between the two loses nothing.
+day_stats/lot_stats keep counting archived rows, and the deletes write no
+change_log entries (archive_state.moving): no worker caches past days.
+
+Owner history (owner_history) reads hot and archive storage together; the other
+views only show hot days.
+
+    python -m parking_app.app.archive
+    python -m parking_app.app.archive --keep-days 730 --vacuum
+"""
+from __future__ import annotations
+
+import argparse
+import sqlite3
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Iterator, Optional
+
+from . import berlin, db
+
+RETENTION_DAYS = 400  # a year of history plus slack stays hot
+CHUNK_DAYS = 31  # days per transaction pair; keeps write locks short while the app runs
+CHUNK_RETRIES = 3
+
+ARCHIVE_SCHEMA = (
+    "PRAGMA archive.journal_mode = WAL",
+    """
+    CREATE TABLE IF NOT EXISTS archive.offers (
+      spot_id INTEGER NOT NULL,
+      day TEXT NOT NULL,
+      id INTEGER NOT NULL,  -- id in the hot table it came from
+      created_at TEXT NOT NULL,
+      PRIMARY KEY (spot_id, day)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS archive.bookings (
+      spot_id INTEGER NOT NULL,
+      day TEXT NOT NULL,
+      id INTEGER NOT NULL,
+      booker_email TEXT NOT NULL,
+      status TEXT NOT NULL,
+      created_at TEXT NOT NULL,
+      cancelled_at TEXT,
+      cancel_reason TEXT,
+      manage_token TEXT NOT NULL,
+      PRIMARY KEY (spot_id, day)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS archive.idx_offers_day ON offers(day)",
+    "CREATE INDEX IF NOT EXISTS archive.idx_bookings_day ON bookings(day)",
+)
+
+# Per hot table: the statements that move a range of days [?, ?) (plain literals so
+# the index advisor plans them).
+MOVE_SQL = {
+    "offers": {
+        "clear": "DELETE FROM archive.offers WHERE day >= ? AND day < ?",
+        "copy": """
+            INSERT INTO archive.offers(spot_id, day, id, created_at)
+            SELECT spot_id, day, id, created_at FROM main.offers WHERE day >= ? AND day < ?
+        """,
+        "counts": """
+            SELECT (SELECT COUNT(*) FROM main.offers WHERE day >= ? AND day < ?),
+                   (SELECT COUNT(*) FROM archive.offers WHERE day >= ? AND day < ?)
+        """,
+        "changed": """
+            SELECT 1 FROM main.offers h
+            WHERE h.day >= ? AND h.day < ? AND NOT EXISTS (
+              SELECT 1 FROM archive.offers a
+              WHERE a.spot_id=h.spot_id AND a.day=h.day AND (a.id, a.created_at) IS (h.id, h.created_at)
+            )
+            LIMIT 1
+        """,
+        "delete": "DELETE FROM main.offers WHERE day >= ? AND day < ?",
+    },
+    "bookings": {
+        "clear": "DELETE FROM archive.bookings WHERE day >= ? AND day < ?",
+        "copy": """
+            INSERT INTO archive.bookings(
+              spot_id, day, id, booker_email, status, created_at, cancelled_at, cancel_reason, manage_token)
+            SELECT spot_id, day, id, booker_email, status, created_at, cancelled_at, cancel_reason, manage_token
+            FROM main.bookings WHERE day >= ? AND day < ?
+        """,
+        "counts": """
+            SELECT (SELECT COUNT(*) FROM main.bookings WHERE day >= ? AND day < ?),
+                   (SELECT COUNT(*) FROM archive.bookings WHERE day >= ? AND day < ?)
+        """,
+        "changed": """
+            SELECT 1 FROM main.bookings h
+            WHERE h.day >= ? AND h.day < ? AND NOT EXISTS (
+              SELECT 1 FROM archive.bookings a
+              WHERE a.spot_id=h.spot_id AND a.day=h.day
+                AND (a.id, a.booker_email, a.status, a.created_at, a.cancelled_at, a.cancel_reason, a.manage_token)
+                 IS (h.id, h.booker_email, h.status, h.created_at, h.cancelled_at, h.cancel_reason, h.manage_token)
+            )
+            LIMIT 1
+        """,
+        "delete": "DELETE FROM main.bookings WHERE day >= ? AND day < ?",
+    },
+}
+
+HISTORY_SQL = """
+SELECT day, status, created_at, cancelled_at, cancel_reason FROM main.bookings WHERE spot_id=?
+UNION ALL
+SELECT day, status, created_at, cancelled_at, cancel_reason FROM archive.bookings
+WHERE spot_id=? AND day < (SELECT cutoff FROM main.archive_state)
+ORDER BY day DESC
+LIMIT ? OFFSET ?
+"""
+
+
+@dataclass
+class ArchiveResult:
+    cutoff: str
+    chunks: int = 0
+    offers: int = 0
+    bookings: int = 0
+    seconds: float = 0.0
+
+
+def archive_path() -> Path:
+    return db.DB_PATH.with_name(db.DB_PATH.stem + "-archive" + db.DB_PATH.suffix)
+
+
+def cutoff(con: sqlite3.Connection) -> str:
+    return con.execute("SELECT cutoff FROM archive_state").fetchone()[0]
+
+
+@contextmanager
+def attached(con: sqlite3.Connection) -> Iterator[sqlite3.Connection]:
+    """The archive attached as schema "archive" (outside of transactions only)."""
+    con.execute("ATTACH DATABASE ? AS archive", (str(archive_path()),))
+    try:
+        yield con
+    finally:
+        con.execute("DETACH DATABASE archive")
+
+
+def ensure_schema(con: sqlite3.Connection) -> None:
+    for stmt in ARCHIVE_SCHEMA:
+        con.execute(stmt)
+
+
+def owner_history(con: sqlite3.Connection, spot_id: int, limit: int, offset: int) -> tuple[int, list[sqlite3.Row]]:
+    """(total, one page newest first) of a spot's bookings, hot and archived."""
+    if not cutoff(con) or not archive_path().exists():
+        total = con.execute("SELECT COUNT(*) FROM bookings WHERE spot_id=?", (spot_id,)).fetchone()[0]
+        rows = con.execute(
+            """
+            SELECT day, status, created_at, cancelled_at, cancel_reason
+            FROM bookings
+            WHERE spot_id=?
+            ORDER BY day DESC
+            LIMIT ? OFFSET ?
+            """,
+            (spot_id, limit, offset),
+        ).fetchall()
+        return total, rows
+    with attached(con):
+        # Each statement reads the cutoff itself, so a concurrent archive run never makes
+        # a row count twice or not at all; total and page may still straddle such a run.
+        total = con.execute(
+            """
+            SELECT (SELECT COUNT(*) FROM main.bookings WHERE spot_id=?)
+                 + (SELECT COUNT(*) FROM archive.bookings
+                    WHERE spot_id=? AND day < (SELECT cutoff FROM main.archive_state))
+            """,
+            (spot_id, spot_id),
+        ).fetchone()[0]
+        rows = con.execute(HISTORY_SQL, (spot_id, spot_id, limit, offset)).fetchall()
+    return total, rows
+
+
+def _copy(con: sqlite3.Connection, lo: str, hi: str) -> None:
+    with db.immediate(con):
+        for sql in MOVE_SQL.values():
+            con.execute(sql["clear"], (lo, hi))
+            con.execute(sql["copy"], (lo, hi))
+
+
+def _copy_matches(con: sqlite3.Connection, sql: dict[str, str], lo: str, hi: str) -> bool:
+    hot, archived = con.execute(sql["counts"], (lo, hi, lo, hi)).fetchone()
+    return hot == archived and con.execute(sql["changed"], (lo, hi)).fetchone() is None
+
+
+def _move(con: sqlite3.Connection, lo: str, hi: str) -> Optional[tuple[int, int]]:
+    """Delete the copied days from the hot tables; None if they changed since the copy."""
+    with db.immediate(con):
+        if not all(_copy_matches(con, sql, lo, hi) for sql in MOVE_SQL.values()):
+            con.rollback()
+            return None
+        # The delete triggers count the rows out of the statistics; those keep history.
+        day_stats = con.execute(
+            "SELECT day, lot, offers, active, cancelled FROM day_stats WHERE day >= ? AND day < ?", (lo, hi)
+        ).fetchall()
+        lot_stats = con.execute("SELECT offers, active, cancelled, lot FROM lot_stats").fetchall()
+        # Past days are in no worker's caches: with moving set the delete triggers
+        # write no change_log rows (migration 7).
+        con.execute("UPDATE archive_state SET moving=1")
+        offers = con.execute(MOVE_SQL["offers"]["delete"], (lo, hi)).rowcount
+        bookings = con.execute(MOVE_SQL["bookings"]["delete"], (lo, hi)).rowcount
+        con.execute("UPDATE archive_state SET moving=0")
+        con.executemany(
+            "INSERT OR REPLACE INTO day_stats(day, lot, offers, active, cancelled) VALUES(?, ?, ?, ?, ?)",
+            [tuple(r) for r in day_stats],
+        )
+        con.executemany("UPDATE lot_stats SET offers=?, active=?, cancelled=? WHERE lot=?", [tuple(r) for r in lot_stats])
+        con.execute("UPDATE archive_state SET cutoff=? WHERE cutoff < ?", (hi, hi))
+    return offers, bookings
+
+
+def archive(keep_days: int = RETENTION_DAYS, today: Optional[date] = None, chunk_days: int = CHUNK_DAYS) -> ArchiveResult:
+    """Move the days before today - keep_days into the archive database."""
+    if keep_days < 1:
+        raise ValueError(f"keep_days must be at least 1, got {keep_days}")
+    t0 = time.perf_counter()
+    target = ((today or berlin.today()) - timedelta(days=keep_days)).isoformat()
+    db.migrate()
+    con = db.open_connection()
+    try:
+        with attached(con):
+            ensure_schema(con)
+            result = ArchiveResult(cutoff=max(cutoff(con), target))
+            while True:
+                lo = con.execute(
+                    "SELECT MIN(day) FROM (SELECT MIN(day) AS day FROM offers UNION ALL SELECT MIN(day) FROM bookings)"
+                ).fetchone()[0]
+                if lo is None or lo >= target:
+                    break
+                hi = min((date.fromisoformat(lo) + timedelta(days=chunk_days)).isoformat(), target)
+                for _ in range(CHUNK_RETRIES):
+                    _copy(con, lo, hi)
+                    moved = _move(con, lo, hi)
+                    if moved is not None:
+                        break
+                else:
+                    raise RuntimeError(f"days {lo}..{hi} keep changing, archival stopped")
+                result.chunks += 1
+                result.offers += moved[0]
+                result.bookings += moved[1]
+            # Nothing (left) to move: still record the boundary, readers rely on it.
+            with db.immediate(con):
+                con.execute("UPDATE archive_state SET cutoff=? WHERE cutoff < ?", (target, target))
+        con.execute("PRAGMA optimize")
+    finally:
+        con.close()
+    result.seconds = round(time.perf_counter() - t0, 3)
+    return result
+
+
+def vacuum() -> None:
+    """Shrink the main file after a large first archival (blocks writers while it runs)."""
+    con = db.open_connection()
+    try:
+        con.execute("VACUUM")
+    finally:
+        con.close()
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m parking_app.app.archive", description=__doc__.splitlines()[0])
+    ap.add_argument("--keep-days", type=int, default=RETENTION_DAYS, help="days of history kept hot (at least 1)")
+    ap.add_argument("--vacuum", action="store_true", help="VACUUM the main database afterwards")
+    args = ap.parse_args(argv)
+    if args.keep_days < 1:
+        ap.error("--keep-days must be at least 1")
+
+    res = archive(args.keep_days)
+    print(
+        f"archived {res.offers} offers and {res.bookings} bookings in {res.chunks} chunks "
+        f"to {archive_path()} (days before {res.cutoff}, {res.seconds} s)"
+    )
+    if args.vacuum:
+        vacuum()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
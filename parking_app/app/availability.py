@@ -0,0 +1,95 @@
+"""Availability of a lot over a date range as JSON (GET /api/availability).
+
+    {"lot": "bank", "from": "2026-10-01", "to": "2026-10-31", "days": [
+      {"day": "2026-10-01", "free": ["P03", "P17"], "booked": ["P05"]},
+      ...]}
+
+Days without any offer are left out. The rows come from one range query over
+offers (idx_offers_day) and are encoded day by day while streaming, so a long
+range never sits in memory as a whole.
+"""
+from __future__ import annotations
+
+import json
+import sqlite3
+from typing import Iterator
+
+from .db import connect
+
+# Bytes collected before a chunk is handed to the response.
+CHUNK_BYTES = 16 * 1024
+FETCH_ROWS = 512
+
+# CROSS JOIN keeps offers (by idx_offers_day) as the outer loop: rows come out in
+# day order and only each day's spots are sorted, so the first rows stream at once.
+RANGE_SQL = """
+SELECT o.day AS day, s.name AS spot, b.status AS booking_status
+FROM offers o
+CROSS JOIN spots s ON s.id=o.spot_id
+LEFT JOIN bookings b ON b.spot_id=o.spot_id AND b.day=o.day
+WHERE o.day BETWEEN ? AND ? AND s.lot=?
+ORDER BY o.day, s.name
+"""
+
+
+def day_spot_statuses(con: sqlite3.Connection, day: str, lot: str) -> dict[str, str]:
+    """spot name -> free|booked for all spots offered on that day (others: not offered)."""
+    rows = con.execute(
+        """
+        SELECT s.name AS spot, b.status AS booking_status
+        FROM offers o
+        JOIN spots s ON s.id=o.spot_id
+        LEFT JOIN bookings b ON b.spot_id=o.spot_id AND b.day=o.day
+        WHERE o.day=? AND s.lot=?
+        """,
+        (day, lot),
+    ).fetchall()
+    return {r["spot"]: ("booked" if r["booking_status"] == "active" else "free") for r in rows}
+
+
+def _day_json(day: str, free: list[str], booked: list[str]) -> str:
+    return json.dumps({"day": day, "free": free, "booked": booked}, separators=(",", ":"))
+
+
+def encode_rows(rows: Iterator[sqlite3.Row], lot: str, first: str, last: str) -> Iterator[bytes]:
+    """RANGE_SQL rows (ordered by day) -> JSON document in chunks."""
+    head = json.dumps({"lot": lot, "from": first, "to": last}, separators=(",", ":"))
+    parts = [head[:-1], ',"days":[']
+    size = 0
+    sep = ""
+    day, free, booked = None, [], []
+    for r in rows:
+        if r["day"] != day:
+            if day is not None:
+                chunk = sep + _day_json(day, free, booked)
+                parts.append(chunk)
+                size += len(chunk)
+                sep = ","
+                if size >= CHUNK_BYTES:
+                    yield "".join(parts).encode()
+                    parts, size = [], 0
+            day, free, booked = r["day"], [], []
+        (booked if r["booking_status"] == "active" else free).append(r["spot"])
+    if day is not None:
+        parts.append(sep + _day_json(day, free, booked))
+    parts.append("]}")
+    yield "".join(parts).encode()
+
+
+def stream_availability(lot: str, first: str, last: str) -> Iterator[bytes]:
+    """Run the range query on a pooled connection and yield the encoded document.
+
+    Iterated by the response in a worker thread; the connection goes back to the
+    pool when the generator finishes or the client goes away.
+    """
+    with connect() as con:
+        cur = con.execute(RANGE_SQL, (first, last, lot))
+        yield from encode_rows(_fetch(cur), lot, first, last)
+
+
+def _fetch(cur: sqlite3.Cursor) -> Iterator[sqlite3.Row]:
+    while True:
+        rows = cur.fetchmany(FETCH_ROWS)
+        if not rows:
+            return
+        yield from rows
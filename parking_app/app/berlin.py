@@ -0,0 +1,277 @@
+"""Berlin-time calendar: the current day, the owner cutoff and the days table.
+
+All dates follow the site's clock (Europe/Berlin), never the server's local time
+or UTC: around midnight those disagree about "today" for one or two hours, which
+shifted booking windows and owner cutoffs by a day.
+
+today() and owner_cancel_from() come from a snapshot that is recomputed only when
+the next boundary passes (12:00 cutoff, midnight), so hot paths compare strings
+instead of converting time zones.
+
+The days table (migration 9) holds one row per day with weekday, ISO week and
+public holiday; range queries join it to pick weekdays in SQL instead of looping
+over date objects. ensure_days() fills it: the booking horizon at startup, any
+other range on demand from write paths.
+
+Holidays are the nationwide ones, plus those of one federal state when
+PARKING_HOLIDAY_REGION is set (e.g. RP). They are only shown, nothing is
+skipped because of them.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Iterator, Optional
+from zoneinfo import ZoneInfo
+
+log = logging.getLogger("parking_app.calendar")
+
+TZ = ZoneInfo("Europe/Berlin")
+OWNER_WITHDRAW_CUTOFF_HOUR = 12  # owner may cancel booked spots until 12:00 on the previous day
+
+# days covered at startup around the booking horizon (a year of uptime without restart)
+DAYS_BEFORE = 400
+DAYS_AFTER = 366
+
+
+@dataclass(frozen=True)
+class _Snapshot:
+    today: date
+    today_iso: str
+    cancel_from: str  # first day whose booking the owner may still cancel
+    expires: float  # unix time of the next boundary
+
+
+_snapshot: Optional[_Snapshot] = None
+
+
+def now() -> datetime:
+    return datetime.now(TZ)
+
+
+def _take(ts: float) -> _Snapshot:
+    current = datetime.fromtimestamp(ts, TZ)
+    today = current.date()
+    cutoff = current.replace(hour=OWNER_WITHDRAW_CUTOFF_HOUR, minute=0, second=0, microsecond=0)
+    if current <= cutoff:
+        cancel_from = today + timedelta(days=1)
+        expires = cutoff.timestamp() + 1e-6  # 12:00:00.000000 itself still counts
+    else:
+        cancel_from = today + timedelta(days=2)
+        expires = datetime.combine(today + timedelta(days=1), datetime.min.time(), TZ).timestamp()
+    return _Snapshot(today, today.isoformat(), cancel_from.isoformat(), expires)
+
+
+def _current() -> _Snapshot:
+    global _snapshot
+    ts = time.time()
+    snap = _snapshot
+    if snap is None or ts >= snap.expires:
+        snap = _snapshot = _take(ts)
+    return snap
+
+
+def today() -> date:
+    return _current().today
+
+
+def today_iso() -> str:
+    return _current().today_iso
+
+
+def owner_cancel_from() -> str:
+    """First day (YYYY-MM-DD) whose booking the owner may still cancel right now."""
+    return _current().cancel_from
+
+
+def owner_cancel_allowed(day: str) -> bool:
+    """Owner may cancel a booked spot until 12:00 on the previous day (Berlin time)."""
+    try:
+        y, m, d = map(int, day.split("-"))
+        day = date(y, m, d).isoformat()
+    except Exception:
+        return False
+    return day >= owner_cancel_from()
+
+
+def weekday_count(first: date, last: date, weekdays: set[int]) -> int:
+    """Days in [first, last] falling on one of the weekdays (0=Mon), without iterating."""
+    if last < first:
+        return 0
+    n = (last - first).days + 1
+    full, rest = divmod(n, 7)
+    start = first.weekday()
+    return full * len(weekdays) + sum(1 for i in range(rest) if (start + i) % 7 in weekdays)
+
+
+def iter_days(first: date, last: date, weekdays: set[int]) -> Iterator[str]:
+    """YYYY-MM-DD of the days in [first, last] on the given weekdays (outside the days table)."""
+    d = first
+    one = timedelta(days=1)
+    while d <= last:
+        if d.weekday() in weekdays:
+            yield d.isoformat()
+        d += one
+
+
+# --- Holidays -----------------------------------------------------------------------
+
+
+def easter(year: int) -> date:
+    """Easter Sunday (Gregorian, anonymous algorithm)."""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+# Statewide holidays on top of the nationwide ones, by state code (current rules;
+# holidays of single communities such as Mariä Himmelfahrt in parts of Bavaria
+# are left out).
+REGIONAL_HOLIDAYS: dict[str, tuple[str, ...]] = {
+    "BW": ("epiphany", "corpus_christi", "all_saints"),
+    "BY": ("epiphany", "corpus_christi", "all_saints"),
+    "BE": ("womens_day",),
+    "BB": ("reformation",),
+    "HB": ("reformation",),
+    "HH": ("reformation",),
+    "HE": ("corpus_christi",),
+    "MV": ("womens_day", "reformation"),
+    "NI": ("reformation",),
+    "NW": ("corpus_christi", "all_saints"),
+    "RP": ("corpus_christi", "all_saints"),
+    "SL": ("corpus_christi", "assumption", "all_saints"),
+    "SN": ("reformation", "repentance"),
+    "ST": ("epiphany", "reformation"),
+    "SH": ("reformation",),
+    "TH": ("childrens_day", "reformation"),
+}
+
+
+def _region(value: str) -> str:
+    region = value.strip().upper()
+    if region and region not in REGIONAL_HOLIDAYS:
+        log.warning("unknown PARKING_HOLIDAY_REGION %r, using nationwide holidays only", value)
+        return ""
+    return region
+
+
+HOLIDAY_REGION = _region(os.environ.get("PARKING_HOLIDAY_REGION", ""))  # "" = nationwide only
+
+
+def holidays(year: int, region: Optional[str] = None) -> dict[date, str]:
+    """Public holidays in Germany: nationwide plus those of region (default HOLIDAY_REGION)."""
+    e = easter(year)
+    days = {
+        date(year, 1, 1): "Neujahr",
+        e - timedelta(days=2): "Karfreitag",
+        e + timedelta(days=1): "Ostermontag",
+        date(year, 5, 1): "Tag der Arbeit",
+        e + timedelta(days=39): "Christi Himmelfahrt",
+        e + timedelta(days=50): "Pfingstmontag",
+        date(year, 10, 3): "Tag der Deutschen Einheit",
+        date(year, 12, 25): "1. Weihnachtstag",
+        date(year, 12, 26): "2. Weihnachtstag",
+    }
+    nov22 = date(year, 11, 22)
+    extra = {
+        "epiphany": (date(year, 1, 6), "Heilige Drei Könige"),
+        "womens_day": (date(year, 3, 8), "Internationaler Frauentag"),
+        "corpus_christi": (e + timedelta(days=60), "Fronleichnam"),
+        "assumption": (date(year, 8, 15), "Mariä Himmelfahrt"),
+        "childrens_day": (date(year, 9, 20), "Weltkindertag"),
+        "reformation": (date(year, 10, 31), "Reformationstag"),
+        "all_saints": (date(year, 11, 1), "Allerheiligen"),
+        "repentance": (nov22 - timedelta(days=(nov22.weekday() - 2) % 7), "Buß- und Bettag"),  # Wed before Nov 23
+    }
+    for key in REGIONAL_HOLIDAYS.get(HOLIDAY_REGION if region is None else region, ()):
+        d, name = extra[key]
+        days[d] = name
+    return days
+
+
+# --- days table ---------------------------------------------------------------------
+
+_covered: Optional[tuple[str, str]] = None  # range known to be in the table (committed)
+
+
+def _rows(first: date, last: date):
+    names: dict[int, dict[date, str]] = {}
+    d = first
+    one = timedelta(days=1)
+    while d <= last:
+        if d.year not in names:
+            names[d.year] = holidays(d.year)
+        iso = d.isocalendar()
+        yield d.isoformat(), d.weekday(), iso[0], iso[1], names[d.year].get(d)
+        d += one
+
+
+def ensure_days(con: sqlite3.Connection, first: date, last: date) -> int:
+    """Make the days table cover [first, last]; returns the rows added.
+
+    Usually a check against the remembered range, without a query. Missing days
+    are written in the caller's transaction; the table stays one contiguous range.
+    """
+    global _covered
+    lo, hi = first.isoformat(), last.isoformat()
+    covered = _covered
+    if covered is not None and covered[0] <= lo and hi <= covered[1]:
+        return 0
+    cur_lo, cur_hi = con.execute("SELECT (SELECT MIN(day) FROM days), (SELECT MAX(day) FROM days)").fetchone()
+    if cur_lo is None:
+        fill = [(first, last)]
+    else:
+        fill = []
+        if lo < cur_lo:
+            fill.append((first, date.fromisoformat(cur_lo) - timedelta(days=1)))
+        if hi > cur_hi:
+            fill.append((date.fromisoformat(cur_hi) + timedelta(days=1), last))
+    if not fill:
+        _covered = (cur_lo, cur_hi)
+        return 0
+    # Not remembered yet: the caller's transaction may still roll back.
+    before = con.total_changes
+    for a, b in fill:
+        con.executemany(
+            "INSERT OR IGNORE INTO days(day, weekday, iso_year, iso_week, holiday) VALUES(?, ?, ?, ?, ?)", _rows(a, b)
+        )
+    return con.total_changes - before
+
+
+def sync_holidays(con: sqlite3.Connection) -> int:
+    """Rewrite the stored holiday names that differ from holidays() (region changed); returns the count."""
+    lo, hi = con.execute("SELECT (SELECT MIN(day) FROM days), (SELECT MAX(day) FROM days)").fetchone()
+    if lo is None:
+        return 0
+    first, last = date.fromisoformat(lo), date.fromisoformat(hi)
+    expected = {
+        d.isoformat(): name
+        for year in range(first.year, last.year + 1)
+        for d, name in holidays(year).items()
+        if first <= d <= last
+    }
+    rows = con.execute("SELECT day, holiday FROM days WHERE day BETWEEN ? AND ? AND holiday IS NOT NULL", (lo, hi))
+    stored = {r[0]: r[1] for r in rows}
+    changes = [(expected.get(d), d) for d in stored.keys() | expected.keys() if stored.get(d) != expected.get(d)]
+    con.executemany("UPDATE days SET holiday=? WHERE day=?", changes)
+    return len(changes)
+
+
+def ensure_horizon(con: sqlite3.Connection, ahead_days: int) -> int:
+    """Startup: the days from DAYS_BEFORE ago to the booking horizon plus slack, with current holidays."""
+    t = today()
+    added = ensure_days(con, t - timedelta(days=DAYS_BEFORE), t + timedelta(days=ahead_days + DAYS_AFTER))
+    sync_holidays(con)
+    return added
@@ -1,65 +1,400 @@
 from __future__ import annotations
 
+import logging
+import queue
 import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Any, Callable, Iterator, Optional
+
+from . import metrics
+from .migrations import apply_migrations
 
 DB_PATH = Path(__file__).resolve().parents[1] / "data" / "parking.sqlite3"
 
+# Connections are long-lived and shared by the request threadpool, so the pool is
+# bounded: a burst of requests waits for a free connection instead of opening more.
+POOL_SIZE = 8
+POOL_TIMEOUT_S = 10.0
+BUSY_TIMEOUT_MS = 5000
+# BEGIN IMMEDIATE retries on top of busy_timeout (e.g. several workers writing at once).
+WRITE_RETRIES = 3
+WRITE_RETRY_BACKOFF_S = 0.05
+
+# Group commit: small writes arriving within the window share one transaction.
+GROUP_COMMIT_WINDOW_S = 0.002
+GROUP_COMMIT_MAX = 64
+
+# Statements slower than this are logged with their query plan.
+SLOW_QUERY_MS = 100
+
+log = logging.getLogger("parking_app.sql")
+
+# Applied once per connection (not per request).
+PRAGMAS = (
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA synchronous = NORMAL",  # safe with WAL, one fsync per checkpoint instead of per commit
+    "PRAGMA cache_size = -16000",  # ~16 MB page cache per connection
+    "PRAGMA mmap_size = 268435456",  # 256 MB
+    "PRAGMA temp_store = MEMORY",
+    f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}",
+)
+
+
+class TimedConnection(sqlite3.Connection):
+    """Connection that reports every statement to metrics and logs slow ones.
+
+    Only execute()/executemany() are timed; rows fetched later are not included.
+    """
 
-def connect() -> sqlite3.Connection:
-    con = sqlite3.connect(DB_PATH)
+    def execute(self, sql, parameters=(), /):
+        t0 = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._observe(sql, parameters, time.perf_counter() - t0, many=False)
+
+    def executemany(self, sql, seq_of_parameters, /):
+        t0 = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._observe(sql, None, time.perf_counter() - t0, many=True)
+
+    def _observe(self, sql: str, parameters, elapsed: float, many: bool) -> None:
+        slow = elapsed * 1000 >= SLOW_QUERY_MS
+        metrics.record_sql(elapsed, slow)
+        if slow:
+            log.warning("slow query %.1f ms%s: %s%s", elapsed * 1000, " (executemany)" if many else "",
+                        " ".join(sql.split()), self._plan(sql, parameters))
+
+    def _plan(self, sql: str, parameters) -> str:
+        if parameters is None or not sql.lstrip().upper().startswith(("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")):
+            return ""
+        try:
+            rows = super().execute("EXPLAIN QUERY PLAN " + sql, parameters).fetchall()
+        except sqlite3.Error:
+            return ""
+        return "".join(f"\n    {r[3]}" for r in rows)
+
+
+def open_connection() -> sqlite3.Connection:
+    """New configured connection outside the pool (pool members and long-lived listeners)."""
+    con = sqlite3.connect(
+        DB_PATH, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False, factory=TimedConnection
+    )
     con.row_factory = sqlite3.Row
-    con.execute("PRAGMA foreign_keys = ON")
+    # WAL is persistent in the database file; readers no longer block behind writers.
+    con.execute("PRAGMA journal_mode = WAL")
+    for pragma in PRAGMAS:
+        con.execute(pragma)
     return con
 
 
-def migrate() -> None:
+class ConnectionPool:
+    """Bounded pool of configured connections (one pool per worker process)."""
+
+    def __init__(self, size: int = POOL_SIZE) -> None:
+        self.size = size
+        self._idle: queue.LifoQueue[sqlite3.Connection] = queue.LifoQueue(maxsize=size)
+        self._created = 0
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def acquire(self, timeout: float = POOL_TIMEOUT_S) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                try:
+                    return open_connection()
+                except Exception:
+                    self._created -= 1
+                    raise
+        try:
+            return self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise RuntimeError("database connection pool exhausted") from None
+
+    def release(self, con: sqlite3.Connection) -> None:
+        # Never hand out a connection with a half-finished transaction.
+        if con.in_transaction:
+            con.rollback()
+        if self._closed:
+            con.close()
+            return
+        self._idle.put_nowait(con)
+
+    def discard(self, con: sqlite3.Connection) -> None:
+        try:
+            con.close()
+        finally:
+            with self._lock:
+                self._created -= 1
+
+    def close(self) -> None:
+        self._closed = True
+        while True:
+            try:
+                con = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            con.close()
+            with self._lock:
+                self._created -= 1
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+    return _pool
+
+
+def close_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+@contextmanager
+def connect() -> Iterator[sqlite3.Connection]:
+    """Borrow a pooled connection; commits on success, rolls back on error."""
+    pool = get_pool()
+    con = pool.acquire()
+    ok = False
+    try:
+        yield con
+        if con.in_transaction:
+            con.commit()
+        ok = True
+    finally:
+        _give_back(pool, con, ok)
+
+
+def _give_back(pool: ConnectionPool, con: sqlite3.Connection, ok: bool) -> None:
+    # After an error the connection may be unusable (e.g. file replaced); don't recycle it then.
+    if ok or _healthy(con):
+        pool.release(con)
+    else:
+        pool.discard(con)
+
+
+def _healthy(con: sqlite3.Connection) -> bool:
+    try:
+        if con.in_transaction:
+            con.rollback()
+        con.execute("SELECT 1").fetchone()
+        return True
+    except sqlite3.Error:
+        return False
+
+
+def is_busy(exc: BaseException) -> bool:
+    return isinstance(exc, sqlite3.OperationalError) and (
+        "locked" in str(exc) or "busy" in str(exc)
+    )
+
+
+@contextmanager
+def immediate(con: sqlite3.Connection, retries: int = WRITE_RETRIES) -> Iterator[sqlite3.Connection]:
+    """Run a block inside BEGIN IMMEDIATE; commits on success, rolls back on error.
+
+    Taking the write lock up front means check-then-write sequences cannot interleave
+    with another writer. SQLITE_BUSY on BEGIN is retried with a short backoff.
+    """
+    _begin_immediate(con, retries)
+    try:
+        yield con
+    except BaseException:
+        con.rollback()
+        raise
+    con.commit()
+
+
+def _begin_immediate(con: sqlite3.Connection, retries: int = WRITE_RETRIES) -> None:
+    for attempt in range(retries + 1):
+        try:
+            con.execute("BEGIN IMMEDIATE")
+            return
+        except sqlite3.OperationalError as e:
+            if not is_busy(e) or attempt == retries:
+                raise
+            time.sleep(WRITE_RETRY_BACKOFF_S * (attempt + 1))
+
+
+@dataclass
+class _Write:
+    fn: Callable[[sqlite3.Connection], Any]
+    future: Future
+    keep: Optional[Callable[[Any], bool]] = None
+    exclusive: bool = False
+
+
+class WriteQueue:
+    """The worker's single writer thread, with group commit for small operations.
+
+    submit(fn): fn(con) runs inside a shared transaction under its own SAVEPOINT and
+    must not commit. Operations queued within GROUP_COMMIT_WINDOW_S (up to
+    GROUP_COMMIT_MAX) are committed together; each caller still gets its own result
+    or exception. An operation that raises, or whose result fails keep(result), is
+    rolled back to its savepoint without affecting the others.
+
+    submit_exclusive(fn): fn(con) runs alone and manages its own transactions
+    (e.g. immediate()); used for large writes such as series.
+    """
+
+    def __init__(self) -> None:
+        self._q: queue.Queue[Optional[_Write]] = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.commits = 0
+        self.ops = 0
+
+    def submit(self, fn: Callable[[sqlite3.Connection], Any], keep: Optional[Callable[[Any], bool]] = None) -> Future:
+        return self._put(_Write(fn, Future(), keep))
+
+    def submit_exclusive(self, fn: Callable[[sqlite3.Connection], Any]) -> Future:
+        return self._put(_Write(fn, Future(), exclusive=True))
+
+    def _put(self, item: _Write) -> Future:
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+                    self._thread.start()
+        self._q.put(item)
+        return item.future
+
+    def close(self) -> None:
+        with self._start_lock:
+            if self._thread is not None:
+                self._q.put(None)
+                self._thread.join()
+                self._thread = None
+
+    def _run(self) -> None:
+        con = open_connection()
+        pending: Optional[_Write] = None
+        try:
+            while True:
+                item = pending if pending is not None else self._q.get()
+                pending = None
+                if item is None:
+                    return
+                if item.exclusive:
+                    self._exclusive(con, item)
+                    continue
+                batch = [item]
+                deadline = time.monotonic() + GROUP_COMMIT_WINDOW_S
+                while len(batch) < GROUP_COMMIT_MAX:
+                    try:
+                        nxt = self._q.get(timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                    if nxt is None or nxt.exclusive:
+                        pending = nxt
+                        break
+                    batch.append(nxt)
+                self._group(con, batch)
+        finally:
+            con.close()
+
+    def _exclusive(self, con: sqlite3.Connection, item: _Write) -> None:
+        if not item.future.set_running_or_notify_cancel():
+            return
+        try:
+            result = item.fn(con)
+        except BaseException as e:
+            item.future.set_exception(e)
+        else:
+            item.future.set_result(result)
+        finally:
+            if con.in_transaction:
+                con.rollback()
+
+    def _group(self, con: sqlite3.Connection, batch: list[_Write]) -> None:
+        batch = [w for w in batch if w.future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        try:
+            _begin_immediate(con)
+        except BaseException as e:
+            for w in batch:
+                w.future.set_exception(e)
+            return
+
+        outcomes: list[tuple[bool, Any]] = []
+        try:
+            for w in batch:
+                con.execute("SAVEPOINT op")
+                try:
+                    result = w.fn(con)
+                except Exception as e:
+                    con.execute("ROLLBACK TO op")
+                    con.execute("RELEASE op")
+                    outcomes.append((False, e))
+                    continue
+                if w.keep is not None and not w.keep(result):
+                    con.execute("ROLLBACK TO op")
+                con.execute("RELEASE op")
+                outcomes.append((True, result))
+            con.commit()
+        except BaseException as e:
+            # Savepoint handling or the commit itself failed: nothing of the batch is kept.
+            if con.in_transaction:
+                con.rollback()
+            for w in batch:
+                w.future.set_exception(e)
+            return
+        self.commits += 1
+        self.ops += len(batch)
+        metrics.record_commit(len(batch))
+        # Results only after the commit: a caller never sees a write that could still vanish.
+        for w, (ok, value) in zip(batch, outcomes):
+            if ok:
+                w.future.set_result(value)
+            else:
+                w.future.set_exception(value)
+
+
+_writes: Optional[WriteQueue] = None
+
+
+def get_write_queue() -> WriteQueue:
+    global _writes
+    if _writes is None:
+        with _pool_lock:
+            if _writes is None:
+                _writes = WriteQueue()
+    return _writes
+
+
+def close_write_queue() -> None:
+    global _writes
+    with _pool_lock:
+        q, _writes = _writes, None
+    if q is not None:
+        q.close()
+
+
+def migrate() -> int:
+    """Bring the schema up to date; a single PRAGMA read when nothing changed."""
     DB_PATH.parent.mkdir(parents=True, exist_ok=True)
     with connect() as con:
-        con.executescript(
-            """
-            CREATE TABLE IF NOT EXISTS spots (
-              id INTEGER PRIMARY KEY,
-              name TEXT NOT NULL UNIQUE,
-              owner_code TEXT NOT NULL UNIQUE,
-              lot TEXT NOT NULL DEFAULT 'bank'
-            );
-
-            CREATE TABLE IF NOT EXISTS offers (
-              id INTEGER PRIMARY KEY,
-              spot_id INTEGER NOT NULL,
-              day TEXT NOT NULL, -- YYYY-MM-DD Europe/Berlin
-              created_at TEXT NOT NULL,
-              UNIQUE(spot_id, day),
-              FOREIGN KEY(spot_id) REFERENCES spots(id) ON DELETE CASCADE
-            );
-
-            CREATE TABLE IF NOT EXISTS bookings (
-              id INTEGER PRIMARY KEY,
-              spot_id INTEGER NOT NULL,
-              day TEXT NOT NULL,
-              booker_email TEXT NOT NULL,
-              status TEXT NOT NULL, -- active|cancelled_by_owner|cancelled_by_booker
-              created_at TEXT NOT NULL,
-              cancelled_at TEXT,
-              cancel_reason TEXT,
-              manage_token TEXT NOT NULL,
-              UNIQUE(spot_id, day),
-              FOREIGN KEY(spot_id) REFERENCES spots(id) ON DELETE CASCADE
-            );
-
-            CREATE INDEX IF NOT EXISTS idx_offers_day ON offers(day);
-            CREATE INDEX IF NOT EXISTS idx_bookings_day ON bookings(day);
-            CREATE INDEX IF NOT EXISTS idx_bookings_email ON bookings(booker_email);
-            """
-        )
-
-        # Backward-compatibility migration for existing databases (pre-lot column).
-        cols = [r[1] for r in con.execute("PRAGMA table_info(spots)").fetchall()]
-        if "lot" not in cols:
-            con.execute("ALTER TABLE spots ADD COLUMN lot TEXT NOT NULL DEFAULT 'bank'")
-
-        # Ensure lot is populated and index exists (safe on new + existing installs).
-        con.execute("UPDATE spots SET lot='bank' WHERE lot IS NULL OR lot=''")
-        con.execute("CREATE INDEX IF NOT EXISTS idx_spots_lot ON spots(lot)")
-        con.commit()
+        return apply_migrations(con)
@@ -1,22 +1,134 @@
+"""Outgoing mail over SMTP (sent by the outbox worker, see outbox.py).
+
+Configured by secrets/smtp.json; without that file nothing is sent:
+
+  {"host": "smtp.example.org", "port": 587, "starttls": true,
+   "user": "parken@example.org", "password": "...",
+   "sender": "Parkplatz-Share <parken@example.org>"}
+
+"ssl": true connects with implicit TLS (port 465) instead. For local tests a
+debugging server that prints the mails is enough:
+
+  python -m smtpd -n -c DebuggingServer 127.0.0.1:8025   # Python <= 3.11
+  python -m aiosmtpd -n -l 127.0.0.1:8025                # pip install aiosmtpd
+  {"host": "127.0.0.1", "port": 8025, "sender": "parken@localhost"}
+"""
 from __future__ import annotations
 
-import subprocess
+import hashlib
+import json
+import logging
+import smtplib
+import ssl
+from dataclasses import dataclass
+from email.message import EmailMessage
+from email.utils import formatdate
 from pathlib import Path
+from typing import Optional
+
+CONFIG_FILE = "smtp.json"
+TIMEOUT_S = 30.0
+
+log = logging.getLogger("parking_app.mail")
+
+
+@dataclass(frozen=True)
+class SmtpConfig:
+    host: str
+    sender: str
+    port: int = 25
+    user: str = ""
+    password: str = ""
+    starttls: bool = False
+    ssl: bool = False
+
+
+def load_config(secrets_dir: Path) -> Optional[SmtpConfig]:
+    """secrets/smtp.json, or None if there is none (or it is unusable)."""
+    p = secrets_dir / CONFIG_FILE
+    if not p.exists():
+        return None
+    try:
+        obj = json.loads(p.read_text(encoding="utf-8"))
+        return SmtpConfig(
+            host=str(obj["host"]),
+            sender=str(obj["sender"]),
+            port=int(obj.get("port") or (465 if obj.get("ssl") else 25)),
+            user=str(obj.get("user") or ""),
+            password=str(obj.get("password") or ""),
+            starttls=bool(obj.get("starttls")),
+            ssl=bool(obj.get("ssl")),
+        )
+    except Exception:
+        log.exception("%s unusable, no mail is sent", p)
+        return None
+
+
+def build_message(cfg: SmtpConfig, msg_key: str, to: str, subject: str, body: str) -> EmailMessage:
+    msg = EmailMessage()
+    msg["From"] = cfg.sender
+    msg["To"] = to
+    msg["Subject"] = subject
+    msg["Date"] = formatdate(localtime=True)
+    # Derived from the outbox row's dedupe_key only, so a resent row (retry, or a
+    # worker that died before recording the send) carries the same Message-ID.
+    digest = hashlib.sha256(msg_key.encode("utf-8")).hexdigest()[:32]
+    domain = cfg.sender.rpartition("@")[2].strip("> ") or "localhost"
+    msg["Message-ID"] = f"<{digest}@{domain}>"
+    msg.set_content(body)
+    return msg
+
+
+class SmtpSender:
+    """One SMTP connection reused for many messages.
+
+    Opened on the first send; a connection the server dropped in the meantime
+    (idle timeout, message limit) is reopened once before the error counts.
+    """
+
+    def __init__(self, cfg: SmtpConfig) -> None:
+        self.cfg = cfg
+        self._smtp: Optional[smtplib.SMTP] = None
+
+    @property
+    def connected(self) -> bool:
+        return self._smtp is not None
+
+    def _connect(self) -> smtplib.SMTP:
+        cfg = self.cfg
+        if cfg.ssl:
+            smtp: smtplib.SMTP = smtplib.SMTP_SSL(cfg.host, cfg.port, timeout=TIMEOUT_S, context=ssl.create_default_context())
+        else:
+            smtp = smtplib.SMTP(cfg.host, cfg.port, timeout=TIMEOUT_S)
+        try:
+            if cfg.starttls:
+                smtp.starttls(context=ssl.create_default_context())
+            if cfg.user:
+                smtp.login(cfg.user, cfg.password)
+        except Exception:
+            smtp.close()
+            raise
+        return smtp
+
+    def send(self, msg: EmailMessage) -> None:
+        """Send one message; raises smtplib/OS errors (see outbox.deliver_due)."""
+        reused = self._smtp is not None
+        if self._smtp is None:
+            self._smtp = self._connect()
+        try:
+            self._smtp.send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            self._smtp = None
+            if not reused:
+                raise
+            self._smtp = self._connect()
+            self._smtp.send_message(msg)
 
-WORKSPACE = Path("/root/.openclaw/workspace")
-
-
-def send_email(to: str, subject: str, body: str) -> None:
-    tmp = Path("/tmp/parking_mail.txt")
-    tmp.write_text(body, encoding="utf-8")
-    cmd = [
-        "python3",
-        str(WORKSPACE / "email" / "strato_send.py"),
-        "--to",
-        to,
-        "--subject",
-        subject,
-        "--body-file",
-        str(tmp),
-    ]
-    subprocess.run(cmd, cwd=str(WORKSPACE), check=False)
+    def close(self) -> None:
+        smtp, self._smtp = self._smtp, None
+        if smtp is None:
+            return
+        try:
+            smtp.quit()
+        except Exception:
+            smtp.close()
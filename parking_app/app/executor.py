@@ -0,0 +1,185 @@
+"""Dedicated database executors for the async handlers.
+
+Writes run on the worker's single writer thread (db.WriteQueue), so writes of one
+worker are serialized in order and never wait on each other for the SQLite write
+lock. Small writes (@db_batched) are group-committed; larger ones (@db_write) run
+alone. Reads run on a small pool of reader threads, one connection each (WAL:
+readers never block the writer). Submissions are bounded; excess requests wait in
+the event loop instead of piling up threads.
+
+Handlers keep their synchronous body and take the connection as a parameter:
+
+    @app.get("/day/{day}")
+    @db_read
+    def day_view(request: Request, day: str, con: sqlite3.Connection = DB_CON): ...
+"""
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import inspect
+import sqlite3
+import threading
+import typing
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+from typing import Any, Callable, Optional, TypeVar
+
+from fastapi.responses import PlainTextResponse
+
+from .db import close_write_queue, get_write_queue, is_busy, open_connection
+
+READ_THREADS = 4
+MAX_PENDING_READS = 64
+MAX_PENDING_WRITES = 64
+
+T = TypeVar("T")
+
+
+class _Injected:
+    def __repr__(self) -> str:
+        return "DB_CON"
+
+
+DB_CON: Any = _Injected()  # default of the `con` parameter; replaced by the executor
+
+
+class DBExecutor:
+    def __init__(self, name: str, threads: int, max_pending: int) -> None:
+        self.name = name
+        self.threads = threads
+        self.max_pending = max_pending
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._local = threading.local()
+        self._cons: list[sqlite3.Connection] = []
+        self._cons_lock = threading.Lock()
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    def _con(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = self._local.con = open_connection()
+            with self._cons_lock:
+                self._cons.append(con)
+        return con
+
+    def _call(self, fn: Callable[..., T], args: tuple, kwargs: dict) -> T:
+        con = self._con()
+        try:
+            return fn(*args, con=con, **kwargs)
+        finally:
+            # Same contract as the old per-request connection: uncommitted work is dropped.
+            if con.in_transaction:
+                con.rollback()
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(self.threads, thread_name_prefix=f"db-{self.name}")
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+        async with self._slots:
+            # copy_context: metrics and other contextvars follow the call into the thread
+            ctx = contextvars.copy_context()
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._pool, ctx.run, self._call, fn, args, kwargs)
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+        self._slots = None
+        with self._cons_lock:
+            for con in self._cons:
+                con.close()
+            self._cons.clear()
+        self._local = threading.local()
+
+
+class WriteExecutor:
+    """Async front of db.WriteQueue (bounded like the readers)."""
+
+    def __init__(self, max_pending: int) -> None:
+        self.max_pending = max_pending
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    async def run(self, fn: Callable[..., T], *args: Any, batched: bool = False, **kwargs: Any) -> T:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+        ctx = contextvars.copy_context()
+
+        def op(con: sqlite3.Connection) -> T:
+            return ctx.run(fn, *args, con=con, **kwargs)
+
+        async with self._slots:
+            q = get_write_queue()
+            fut = q.submit(op, keep=_keep) if batched else q.submit_exclusive(op)
+            return await asyncio.wrap_future(fut)
+
+    def close(self) -> None:
+        close_write_queue()
+        self._slots = None
+
+
+def _keep(response: Any) -> bool:
+    # A batched handler that answers with an error keeps none of its writes,
+    # just like returning without commit() did before.
+    return getattr(response, "status_code", 200) < 400
+
+
+readers = DBExecutor("read", READ_THREADS, MAX_PENDING_READS)
+writer = WriteExecutor(MAX_PENDING_WRITES)
+
+BUSY_MESSAGE = "Gerade viel los – bitte nochmal versuchen."
+
+
+def _endpoint(fn: Callable[..., Any], run: Callable[..., Any]) -> Callable[..., Any]:
+    # FastAPI reads the signature: drop `con` and hand over resolved annotations
+    # (the wrapper lives in this module, string annotations would not resolve here).
+    hints = typing.get_type_hints(fn)
+    sig = inspect.signature(fn)
+    params = [
+        p.replace(annotation=hints.get(p.name, p.annotation))
+        for p in sig.parameters.values()
+        if p.name != "con"
+    ]
+
+    @wraps(fn)
+    async def endpoint(*args: Any, **kwargs: Any) -> Any:
+        return await run(fn, *args, **kwargs)
+
+    endpoint.__signature__ = sig.replace(parameters=params, return_annotation=hints.get("return", sig.return_annotation))
+    endpoint.__annotations__ = {k: v for k, v in hints.items() if k != "con"}
+    return endpoint
+
+
+def db_read(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """Run a sync handler body on a reader thread with its connection as `con`."""
+    return _endpoint(fn, readers.run)
+
+
+def db_write(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """Run a sync handler body alone on the writer thread; it manages its own transactions."""
+    return _endpoint(fn, writer.run)
+
+
+def db_batched(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """Run a small sync handler body on the writer thread inside a group commit.
+
+    The body must not commit. Its writes are kept unless it raises or returns an
+    error response (status >= 400).
+    """
+
+    async def run(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        try:
+            return await writer.run(fn, *args, batched=True, **kwargs)
+        except sqlite3.OperationalError as e:
+            if not is_busy(e):
+                raise
+            return PlainTextResponse(BUSY_MESSAGE, status_code=503)
+
+    return _endpoint(fn, run)
+
+
+def close() -> None:
+    readers.close()
+    writer.close()
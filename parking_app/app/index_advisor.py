@@ -0,0 +1,131 @@
+"""Index advisor: EXPLAIN QUERY PLAN over every SQL statement in the app.
+
+Collects the SQL string literals of the app modules (f-strings get their
+placeholders replaced by "?"), plans each one against an empty database with
+the current schema and flags full table scans.
+
+    python -m parking_app.app.index_advisor
+"""
+from __future__ import annotations
+
+import ast
+import re
+import sqlite3
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from .archive import ensure_schema as ensure_archive_schema
+from .migrations import apply_migrations
+
+APP_DIR = Path(__file__).resolve().parent
+SQL_RE = re.compile(r"^(SELECT|INSERT|UPDATE|DELETE|WITH)\s+\S")
+
+# Migrations run once and build SQL from identifier templates; not request paths.
+SKIP_FILES = {Path(__file__).name, "migrations.py"}
+
+# Tables small enough that a scan is fine (spots: one row per parking spot,
+# lot_stats: one row per lot, archive_state: one row).
+SMALL_TABLES = {"spots", "lot_stats", "archive_state"}
+
+
+@dataclass
+class Finding:
+    source: str  # file:line
+    sql: str
+    plan: list[str] = field(default_factory=list)
+    full_scans: list[str] = field(default_factory=list)
+    error: str = ""
+
+
+def _literal(node: ast.AST) -> str | None:
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    if isinstance(node, ast.JoinedStr):
+        parts = []
+        for v in node.values:
+            if isinstance(v, ast.Constant):
+                parts.append(str(v.value))
+            else:
+                parts.append("?")  # e.g. IN ({placeholders})
+        return "".join(parts)
+    return None
+
+
+def collect_statements(app_dir: Path = APP_DIR) -> list[tuple[str, str]]:
+    out = []
+    for path in sorted(app_dir.glob("*.py")):
+        if path.name in SKIP_FILES:
+            continue
+        tree = ast.parse(path.read_text(encoding="utf-8"), filename=str(path))
+        seen_fstring_parts: set[int] = set()
+        for node in ast.walk(tree):
+            if isinstance(node, ast.JoinedStr):
+                seen_fstring_parts.update(id(v) for v in node.values)
+            if id(node) in seen_fstring_parts:
+                continue
+            text = _literal(node)
+            if text is None:
+                continue
+            sql = " ".join(text.split())
+            if not SQL_RE.match(sql):
+                continue
+            out.append((path.name, node.lineno, sql))
+    out.sort()
+    return [(f"{name}:{lineno}", sql) for name, lineno, sql in out]
+
+
+def _schema() -> sqlite3.Connection:
+    con = sqlite3.connect(":memory:")
+    apply_migrations(con)
+    con.execute("ATTACH DATABASE ':memory:' AS archive")
+    ensure_archive_schema(con)
+    return con
+
+
+def _scanned_table(detail: str) -> str | None:
+    # "SCAN offers" is a full table scan; "SCAN o USING INDEX ..." walks an index.
+    if not detail.startswith("SCAN ") or " USING " in detail or detail.startswith("SCAN CONSTANT"):
+        return None
+    return detail.split()[1].split(".")[-1]  # "main.spots" -> "spots"
+
+
+def advise(statements: list[tuple[str, str]] | None = None) -> list[Finding]:
+    con = _schema()
+    aliases_ok = SMALL_TABLES | {"s"}  # queries alias spots as "s"
+    findings = []
+    for source, sql in statements if statements is not None else collect_statements():
+        f = Finding(source=source, sql=sql)
+        try:
+            params = [None] * sql.count("?")
+            rows = con.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+        except sqlite3.Error as e:
+            f.error = str(e)
+            findings.append(f)
+            continue
+        f.plan = [r[3] for r in rows]
+        for detail in f.plan:
+            table = _scanned_table(detail)
+            if table and table not in aliases_ok:
+                f.full_scans.append(detail)
+        findings.append(f)
+    con.close()
+    return findings
+
+
+def main() -> int:
+    findings = advise()
+    bad = [f for f in findings if f.full_scans or f.error]
+    for f in findings:
+        mark = "SCAN" if f.full_scans else ("ERR " if f.error else "ok  ")
+        print(f"{mark} {f.source}: {f.sql[:100]}")
+        for detail in f.plan:
+            print(f"       {detail}")
+        if f.error:
+            print(f"       error: {f.error}")
+    print(f"\n{len(findings)} statements, {len(bad)} flagged")
+    return 1 if bad else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
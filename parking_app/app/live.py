@@ -0,0 +1,189 @@
+"""Live updates for the day view: server-sent events per (lot, day).
+
+The Hub is an in-process pub/sub on the event loop. Every open /day/{day}/events
+stream is a Subscriber with a small bounded queue; a subscriber that does not
+keep up is dropped (its stream ends, EventSource reconnects and starts over with
+a fresh snapshot) instead of holding events for it.
+
+Events are fed from the change log, so writes of every worker reach every stream:
+while anybody listens, a poller runs versions.sync(), reloads the spot statuses of
+the watched days that changed and publishes the difference per spot.
+
+    event: snapshot   {"P01": {"label": "BP01", "status": "free"}, ...}
+    event: spot       {"spot": "P01", "label": "BP01", "change": "booked", "status": "booked"}
+
+change is offered|withdrawn|booked|freed; status is free|booked|none.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Optional
+
+from . import versions
+from .availability import day_spot_statuses
+from .executor import readers
+from .owners import spot_label
+
+QUEUE_SIZE = 64
+MAX_SUBSCRIBERS = 2000  # per worker; an idle stream is one queue and one parked task
+POLL_S = 0.5
+PING_S = 25.0  # comment line so proxies keep idle streams open
+RETRY_MS = 3000
+
+Key = tuple[str, str]  # (lot, day)
+
+log = logging.getLogger("parking_app.live")
+
+
+@dataclass(eq=False)
+class Subscriber:
+    key: Key
+    queue: asyncio.Queue = field(default_factory=lambda: asyncio.Queue(QUEUE_SIZE))
+    dropped: bool = False
+
+
+def _load(lot: str, day: str, con) -> dict[str, str]:
+    return day_spot_statuses(con, day, lot)
+
+
+def diff(lot: str, old: dict[str, str], new: dict[str, str]) -> list[dict]:
+    """Per-spot events turning statuses old into new."""
+    events = []
+    for spot in sorted(old.keys() | new.keys()):
+        before, after = old.get(spot), new.get(spot)
+        if before == after:
+            continue
+        if before is None:
+            change = "offered"
+        elif after is None:
+            change = "withdrawn"
+        else:
+            change = "booked" if after == "booked" else "freed"
+        events.append({"spot": spot, "label": spot_label(lot, spot), "change": change, "status": after or "none"})
+    return events
+
+
+class Hub:
+    def __init__(self) -> None:
+        self._subs: dict[Key, set[Subscriber]] = {}
+        self._count = 0
+        self._snapshots: dict[Key, dict[str, str]] = {}
+        # Filled from versions callbacks, which run in whatever thread called sync().
+        self._dirty_lock = threading.Lock()
+        self._dirty: set[str] = set()
+        self._all_dirty = False
+        self._poller: Optional[asyncio.Task] = None
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def full(self) -> bool:
+        return self._count >= MAX_SUBSCRIBERS
+
+    def subscribe(self, key: Key) -> Subscriber:
+        sub = Subscriber(key)
+        self._subs.setdefault(key, set()).add(sub)
+        self._count += 1
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.get_running_loop().create_task(self._poll())
+        return sub
+
+    def unsubscribe(self, sub: Subscriber) -> None:
+        subs = self._subs.get(sub.key)
+        if subs is None or sub not in subs:
+            return
+        subs.discard(sub)
+        self._count -= 1
+        if not subs:
+            del self._subs[sub.key]
+            self._snapshots.pop(sub.key, None)
+
+    def publish(self, key: Key, event: dict) -> None:
+        for sub in list(self._subs.get(key, ())):
+            try:
+                sub.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self._drop(sub)
+
+    def _drop(self, sub: Subscriber) -> None:
+        self.unsubscribe(sub)
+        sub.dropped = True
+        self.dropped += 1
+        while not sub.queue.empty():
+            sub.queue.get_nowait()
+        sub.queue.put_nowait(None)  # wakes the stream, which then ends
+
+    async def snapshot(self, key: Key) -> dict[str, str]:
+        statuses = await readers.run(_load, *key)
+        # The poller may already hold a newer state; never go back behind it.
+        if key in self._subs:
+            self._snapshots.setdefault(key, statuses)
+        return statuses
+
+    def mark_dirty(self, day: Optional[str]) -> None:
+        if not self._subs:
+            return
+        with self._dirty_lock:
+            self._dirty.add(day)
+
+    def mark_all_dirty(self, _key: Optional[str] = None) -> None:
+        if not self._subs:
+            return
+        with self._dirty_lock:
+            self._all_dirty = True
+
+    async def _poll(self) -> None:
+        while self._subs:
+            await asyncio.sleep(POLL_S)
+            try:
+                await self._refresh()
+            except Exception:
+                log.exception("live update failed")
+
+    async def _refresh(self) -> None:
+        await asyncio.to_thread(versions.sync)
+        with self._dirty_lock:
+            days, everything = self._dirty, self._all_dirty
+            self._dirty, self._all_dirty = set(), False
+        for key in [k for k in self._subs if everything or k[1] in days]:
+            new = await readers.run(_load, *key)
+            if key not in self._subs:
+                continue
+            old = self._snapshots.get(key, {})
+            self._snapshots[key] = new
+            for event in diff(key[0], old, new):
+                self.publish(key, event)
+
+
+hub = Hub()
+
+
+def _sse(event: str, data: object) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+async def stream(lot: str, day: str) -> AsyncIterator[str]:
+    """Body of one /day/{day}/events response; ends when the client goes away."""
+    sub = hub.subscribe((lot, day))
+    try:
+        # Subscribed before the snapshot is read: nothing falls in between. Events
+        # carry absolute statuses, so one already contained in it does no harm.
+        statuses = await hub.snapshot(sub.key)
+        snapshot = {spot: {"label": spot_label(lot, spot), "status": st} for spot, st in statuses.items()}
+        yield f"retry: {RETRY_MS}\n" + _sse("snapshot", snapshot)
+        while True:
+            try:
+                event = await asyncio.wait_for(sub.queue.get(), PING_S)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            if event is None:
+                return
+            yield _sse("spot", event)
+    finally:
+        hub.unsubscribe(sub)
@@ -1,34 +1,92 @@
 from __future__ import annotations
 
 import secrets
+import sqlite3
 from datetime import datetime, timedelta, date
+from email.utils import formatdate
 from typing import Optional
-from zoneinfo import ZoneInfo
+from urllib.parse import urlencode
 
-from fastapi import FastAPI, Form, Request
-from fastapi.responses import HTMLResponse, RedirectResponse, PlainTextResponse, FileResponse, JSONResponse
+from fastapi import FastAPI, Form, Query, Request
+from fastapi.responses import HTMLResponse, RedirectResponse, PlainTextResponse, FileResponse, JSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
 
-from .db import connect, migrate
-from .owners import ensure_owner_codes, is_post_spot
-from .plan_labels import ensure_admin_token, load_labels, save_labels, render_annotated, PLAN_IMAGE
+from .db import close_pool, connect, immediate, migrate
+from . import executor
+from .executor import DB_CON, db_batched, db_read, db_write
+from .owners import ensure_owner_codes, is_post_spot, spot_label
+from .templating import make_templates, precompile
+from . import plan_labels as plan_store
+from .sessions import (
+    ADMIN_COOKIE,
+    OWNER_COOKIE,
+    Credentials,
+    current_owner,
+    ensure_session_key,
+    is_admin,
+    login_admin,
+    login_owner,
+    logout,
+)
+from .series import book_series, offer_series, parse_weekdays, withdraw_range
+from .plan_labels import (
+    MAX_BATCH as MAX_LABEL_BATCH,
+    OVERLAY_LEVEL,
+    PLAN_IMAGE,
+    TILE_FORMATS,
+    add_labels,
+    annotated_plan,
+    ensure_admin_token,
+    import_legacy_labels,
+    label_set,
+    move_label,
+    plan_pyramid,
+    post_plan_path,
+    render_status_overlay,
+    reset_labels,
+    start_render_pool,
+    stop_render_pool,
+    undo_label,
+)
+from . import berlin, live, metrics, outbox, versions
+from .archive import owner_history
+from .availability import day_spot_statuses, stream_availability
+from .cache import LRUCache
 from .admin_announce import ensure_admin_code, load_announcement, save_announcement
-# anonym mode: no outbound email
+from .outbox import enqueue_cancellations, enqueue_confirmation, parse_email
 
 app = FastAPI(title="Parkplatz-Share")
+app.add_middleware(metrics.MetricsMiddleware)
 
 BASE_DIR = __import__("pathlib").Path(__file__).resolve().parents[1]
 SECRETS_DIR = BASE_DIR / "secrets"
 DATA_DIR = BASE_DIR / "data"
-TEMPLATES = Jinja2Templates(directory=str(BASE_DIR / "templates"))
+TEMPLATES = make_templates()
+
+# Every credential check goes through this index (memory only, see sessions.py).
+CREDENTIALS = Credentials(
+    secrets={
+        "admin": lambda: ensure_admin_code(SECRETS_DIR),
+        "plan": ensure_admin_token,
+        "session_key": lambda: ensure_session_key(SECRETS_DIR),
+    },
+    watch=lambda: [SECRETS_DIR / "admin_code.txt", SECRETS_DIR / "session_key.txt", plan_store.ADMIN_TOKEN_PATH],
+)
 TEMPLATES.env.globals["year"] = datetime.utcnow().year
 
 app.mount("/static", StaticFiles(directory=str(BASE_DIR / "static")), name="static")
 
 # Booking/offer horizon. Previously 90 days; intentionally generous so owners can plan far ahead.
 MAX_BOOK_AHEAD_DAYS = 3650  # ~10 years
-OWNER_WITHDRAW_CUTOFF_HOUR = 12  # owner may cancel booked spots until 12:00 on previous day (Europe/Berlin)
+
+# Owner portal: days per page (two weeks, month, quarter).
+PORTAL_PAGE_SIZE = 14
+PORTAL_PAGE_SIZES = (14, 31, 92)
+
+# Admin diagnostics: default look-ahead and the offered horizons (days).
+DIAG_DAYS = 30
+DIAG_HORIZONS = (30, 90, 365, MAX_BOOK_AHEAD_DAYS)
+WEEKDAY_LABELS = ["Montag", "Dienstag", "Mittwoch", "Donnerstag", "Freitag", "Samstag", "Sonntag"]
 
 
 def now_iso() -> str:
@@ -45,99 +103,128 @@ def normalize_lot(lot: Optional[str]) -> str:
     return lot if lot in {"bank", "post"} else "bank"
 
 
-def berlin_day_list(start_day: str, days: int) -> list[str]:
-    dt = parse_day(start_day)
-    return [(dt + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(days)]
-
+def normalize_page_size(size: int) -> int:
+    return size if size in PORTAL_PAGE_SIZES else PORTAL_PAGE_SIZE
 
-def daterange(start: date, end: date):
-    # inclusive
-    cur = start
-    while cur <= end:
-        yield cur
-        cur = cur + timedelta(days=1)
 
-
-def owner_cancel_allowed(day_str: str) -> bool:
-    """Owner may cancel a booked spot until 12:00 on the previous day (Berlin time)."""
-    try:
-        target = parse_day(day_str)
-    except Exception:
-        return False
-    cutoff_dt = datetime(
-        target.year,
-        target.month,
-        target.day,
-        OWNER_WITHDRAW_CUTOFF_HOUR,
-        0,
-        0,
-        tzinfo=ZoneInfo("Europe/Berlin"),
-    ) - timedelta(days=1)
-    return datetime.now(ZoneInfo("Europe/Berlin")) <= cutoff_dt
+def portal_url(p: int, size: int = PORTAL_PAGE_SIZE, **result: object) -> str:
+    """Owner portal URL; result carries the counts of the last bulk action (op=..., inserted=...)."""
+    query = {"p": p, "size": normalize_page_size(size), **result}
+    return "/owner/portal?" + urlencode(query)
 
 
 def init_spots() -> None:
-    mapping = ensure_owner_codes()  # P01..P60 and PP01..PP60 -> CODE
+    """Seed spots from owners.json as a diff: only missing rows / changed lots are written."""
+    mapping = ensure_owner_codes()  # P01..P60 and PP::... -> CODE
     with connect() as con:
+        existing = {r["name"]: r["lot"] for r in con.execute("SELECT name, lot FROM spots")}
+        missing = []
+        relot = []
         for spot, code in mapping.items():
             lot = "post" if is_post_spot(spot) else "bank"
-            con.execute(
-                "INSERT OR IGNORE INTO spots(name, owner_code, lot) VALUES(?, ?, ?)",
-                (spot, code, lot),
-            )
-            # Keep existing rows consistent if they already existed.
-            con.execute("UPDATE spots SET lot=? WHERE name=?", (lot, spot))
-        con.commit()
+            if spot not in existing:
+                missing.append((spot, code, lot))
+            elif existing[spot] != lot:
+                # Keep existing rows consistent if they already existed.
+                relot.append((lot, spot))
+        if not missing and not relot:
+            return
+        with immediate(con):
+            con.executemany("INSERT OR IGNORE INTO spots(name, owner_code, lot) VALUES(?, ?, ?)", missing)
+            con.executemany("UPDATE spots SET lot=? WHERE name=?", relot)
 
 
 @app.on_event("startup")
 def _startup() -> None:
     migrate()
     init_spots()
+    import_legacy_labels()  # plan_labels.json of older installs, once
     # ensure admin code exists (stored locally; not in repo)
     ensure_admin_code(SECRETS_DIR)
+    CREDENTIALS.load()
+    precompile(TEMPLATES)
+    start_render_pool()
+    with connect() as con:
+        berlin.ensure_horizon(con, MAX_BOOK_AHEAD_DAYS)
+    # Mail only goes out with secrets/smtp.json; until then the outbox just fills.
+    outbox.start(SECRETS_DIR)
+
+
+@app.on_event("shutdown")
+def _shutdown() -> None:
+    outbox.stop()
+    executor.close()
+    stop_render_pool()
+    versions.close()
+    close_pool()
 
 
 @app.get("/", response_class=HTMLResponse)
-def home(request: Request, lot: str = "bank"):
+async def home(request: Request, lot: str = "bank"):
     # Root should always open the current Berlin day view directly.
-    today_berlin = datetime.now(ZoneInfo("Europe/Berlin")).strftime("%Y-%m-%d")
     lot = normalize_lot(lot)
-    return RedirectResponse(url=f"/day/{today_berlin}?lot={lot}", status_code=303)
+    return RedirectResponse(url=f"/day/{berlin.today_iso()}?lot={lot}", status_code=303)
 
 
 @app.get("/admin", response_class=HTMLResponse)
 def admin_login(request: Request):
+    if is_admin(request, CREDENTIALS):
+        return admin_page(request)
     return TEMPLATES.TemplateResponse("admin_login.html", {"request": request})
 
 
+def admin_page(request: Request, ann: Optional[dict] = None, **extra: object) -> Response:
+    if ann is None:
+        ann = load_announcement(DATA_DIR)
+    if ann is None:
+        ann = {"enabled": False, "level": "info", "title": "", "body": "", "updated_at": ""}
+    return TEMPLATES.TemplateResponse("admin.html", {"request": request, "ann": ann, **extra})
+
+
 @app.get("/admin/diag", response_class=HTMLResponse)
-def admin_diag(request: Request, code: str):
-    code = (code or "").strip()
-    real = ensure_admin_code(SECRETS_DIR)
-    if code != real:
+@db_read
+def admin_diag(request: Request, code: str = "", days: int = DIAG_DAYS, con: sqlite3.Connection = DB_CON):
+    if not is_admin(request, CREDENTIALS, code):
         return PlainTextResponse("forbidden", status_code=403)
 
-    # counts
-    with connect() as con:
-        counts = {
-            "spots": con.execute("SELECT COUNT(*) AS c FROM spots").fetchone()["c"],
-            "offers": con.execute("SELECT COUNT(*) AS c FROM offers").fetchone()["c"],
-            "bookings": con.execute("SELECT COUNT(*) AS c FROM bookings").fetchone()["c"],
-        }
-
-        # offers next 30 days
-        today = date.today()
-        days = [(today + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(0, 30)]
-        offers_next = []
-        for d in days:
-            off = con.execute("SELECT COUNT(*) AS c FROM offers WHERE day=?", (d,)).fetchone()["c"]
-            act = con.execute(
-                "SELECT COUNT(*) AS c FROM bookings WHERE day=? AND status='active'",
-                (d,),
-            ).fetchone()["c"]
-            if off or act:
-                offers_next.append({"day": d, "offers": off, "active_bookings": act})
+    horizon = max(1, min(days, MAX_BOOK_AHEAD_DAYS))
+
+    # Totals and per-day numbers come from the trigger-maintained counters
+    # (lot_stats/day_stats), so the cost does not grow with the booking history.
+    counts = {"spots": 0, "offers": 0, "bookings": 0}
+    lots: dict[str, dict] = {}
+    for r in con.execute("SELECT lot, COUNT(*) AS c FROM spots GROUP BY lot"):
+        counts["spots"] += r["c"]
+        lots[r["lot"]] = {"spots": r["c"], "offers": 0, "active": 0, "utilisation": None}
+    for r in con.execute("SELECT offers, active, cancelled FROM lot_stats"):
+        counts["offers"] += r["offers"]
+        counts["bookings"] += r["active"] + r["cancelled"]
+
+    today = berlin.today()
+    lo = today.isoformat()
+    hi = (today + timedelta(days=horizon - 1)).isoformat()
+    offers_next: list[dict] = []
+    for r in con.execute(
+        """
+        SELECT day, lot, offers, active, cancelled FROM day_stats
+        WHERE day BETWEEN ? AND ? AND (offers>0 OR active>0 OR cancelled>0)
+        ORDER BY day, lot
+        """,
+        (lo, hi),
+    ):
+        if not offers_next or offers_next[-1]["day"] != r["day"]:
+            offers_next.append({"day": r["day"], "offers": 0, "active_bookings": 0, "cancelled": 0, "lots": {}})
+        row = offers_next[-1]
+        row["offers"] += r["offers"]
+        row["active_bookings"] += r["active"]
+        row["cancelled"] += r["cancelled"]
+        row["lots"][r["lot"]] = {"offers": r["offers"], "active": r["active"]}
+        lot = lots.setdefault(r["lot"], {"spots": 0, "offers": 0, "active": 0, "utilisation": None})
+        lot["offers"] += r["offers"]
+        lot["active"] += r["active"]
+    for lot in lots.values():
+        if lot["offers"]:
+            lot["utilisation"] = round(100 * lot["active"] / lot["offers"], 1)
 
     # basic route listing
     want = [
@@ -163,16 +250,17 @@ def admin_diag(request: Request, code: str):
     routes.sort(key=lambda x: want.index(x["path"]))
 
     now_utc = datetime.utcnow().replace(microsecond=0).isoformat() + "Z"
-    # keep it simple (avoid extra subprocess helpers)
-    now_berlin = datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
+    now_berlin = berlin.now().strftime("%Y-%m-%dT%H:%M:%S")
 
     return TEMPLATES.TemplateResponse(
         "admin_diag.html",
         {
             "request": request,
-            "code": code,
             "counts": counts,
             "offers_next": offers_next,
+            "lots": lots,
+            "horizon": horizon,
+            "horizons": DIAG_HORIZONS,
             "routes": routes,
             "max_ahead": MAX_BOOK_AHEAD_DAYS,
             "now_utc": now_utc,
@@ -182,35 +270,47 @@ def admin_diag(request: Request, code: str):
     )
 
 
+@app.get("/metrics")
+def metrics_endpoint(request: Request, code: str = ""):
+    """Prometheus text format; admin code as ?code= or "Authorization: Bearer <code>"."""
+    auth = request.headers.get("authorization", "")
+    if auth.lower().startswith("bearer "):
+        code = auth[7:]
+    if not is_admin(request, CREDENTIALS, code.strip()):
+        return PlainTextResponse("forbidden", status_code=403)
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 @app.post("/admin", response_class=HTMLResponse)
 def admin_portal(request: Request, code: str = Form(...)):
-    code = (code or "").strip()
-    real = ensure_admin_code(SECRETS_DIR)
-    if code != real:
+    if not CREDENTIALS.is_admin_code(code):
         return TEMPLATES.TemplateResponse("admin_login.html", {"request": request, "error": "Code falsch."}, status_code=401)
-
-    ann = load_announcement(DATA_DIR)
-    if ann is None:
-        ann = {"enabled": False, "level": "info", "title": "", "body": "", "updated_at": ""}
-    return TEMPLATES.TemplateResponse("admin.html", {"request": request, "code": code, "ann": ann})
+    resp = admin_page(request)
+    login_admin(resp, request, CREDENTIALS)
+    return resp
 
 
 @app.post("/admin/save", response_class=HTMLResponse)
-def admin_save(request: Request, code: str = Form(...), enabled: Optional[str] = Form(None), level: str = Form("info"), title: str = Form(""), body: str = Form("")):
-    code = (code or "").strip()
-    real = ensure_admin_code(SECRETS_DIR)
-    if code != real:
+def admin_save(request: Request, code: str = Form(""), enabled: Optional[str] = Form(None), level: str = Form("info"), title: str = Form(""), body: str = Form("")):
+    if not is_admin(request, CREDENTIALS, code):
         return PlainTextResponse("forbidden", status_code=403)
 
     save_announcement(DATA_DIR, title=title, body=body, level=level, enabled=bool(enabled))
     ann = load_announcement(DATA_DIR)
     if ann is None:
         ann = {"enabled": False, "level": level, "title": title, "body": body, "updated_at": ""}
-    return TEMPLATES.TemplateResponse("admin.html", {"request": request, "code": code, "ann": ann, "saved": True})
+    return admin_page(request, ann, saved=True)
+
+
+@app.post("/admin/logout")
+async def admin_logout():
+    resp = RedirectResponse(url="/admin", status_code=303)
+    logout(resp, ADMIN_COOKIE)
+    return resp
 
 
 @app.get("/series", response_class=HTMLResponse)
-def series_form(request: Request, spot: str = "", start: str = "", end: str = ""):
+async def series_form(request: Request, spot: str = "", start: str = "", end: str = ""):
     spots = [f"P{i:02d}" for i in range(1, 61)]
     return TEMPLATES.TemplateResponse(
         "series.html",
@@ -226,6 +326,7 @@ def series_form(request: Request, spot: str = "", start: str = "", end: str = ""
 
 
 @app.post("/series", response_class=HTMLResponse)
+@db_write
 def series_book(
     request: Request,
     spot: str = Form(...),
@@ -233,6 +334,8 @@ def series_book(
     end_day: str = Form(...),
     mode: str = Form(...),
     weekdays: Optional[list[str]] = Form(None),
+    email: str = Form(""),
+    con: sqlite3.Connection = DB_CON,
 ):
     spot = spot.strip().upper()
 
@@ -248,6 +351,7 @@ def series_book(
                 "prefill_spot": spot,
                 "prefill_start": start_day,
                 "prefill_end": end_day,
+                "prefill_email": email,
                 "maxAhead": MAX_BOOK_AHEAD_DAYS,
                 "error": "Ungültiges Datum.",
             },
@@ -263,6 +367,7 @@ def series_book(
                 "prefill_spot": spot,
                 "prefill_start": start_day,
                 "prefill_end": end_day,
+                "prefill_email": email,
                 "maxAhead": MAX_BOOK_AHEAD_DAYS,
                 "error": "Ende liegt vor Start.",
             },
@@ -272,14 +377,7 @@ def series_book(
     if mode not in ("hard", "soft"):
         mode = "hard"
 
-    allowed_wd = set()
-    for w in (weekdays or []):
-        try:
-            wi = int(w)
-        except Exception:
-            continue
-        if 0 <= wi <= 6:
-            allowed_wd.add(wi)
+    allowed_wd = parse_weekdays(weekdays)
     if not allowed_wd:
         return TEMPLATES.TemplateResponse(
             "series.html",
@@ -289,84 +387,43 @@ def series_book(
                 "prefill_spot": spot,
                 "prefill_start": start_day,
                 "prefill_end": end_day,
+                "prefill_email": email,
                 "maxAhead": MAX_BOOK_AHEAD_DAYS,
                 "error": "Bitte mindestens einen Wochentag wählen.",
             },
             status_code=400,
         )
 
-    today = date.today()
+    booker_email = parse_email(email)
+    if booker_email is None:
+        return TEMPLATES.TemplateResponse(
+            "series.html",
+            {
+                "request": request,
+                "spots": [f"P{i:02d}" for i in range(1, 61)],
+                "prefill_spot": spot,
+                "prefill_start": start_day,
+                "prefill_end": end_day,
+                "prefill_email": email,
+                "maxAhead": MAX_BOOK_AHEAD_DAYS,
+                "error": "Ungültige E-Mail-Adresse.",
+            },
+            status_code=400,
+        )
+
+    today = berlin.today()
     max_day = today + timedelta(days=MAX_BOOK_AHEAD_DAYS)
 
     base = str(request.base_url).rstrip("/")
 
-    def reason_for_day(d: date, spot_id: int) -> Optional[str]:
-        day_s = d.strftime("%Y-%m-%d")
-        if d < today:
-            return "liegt in der Vergangenheit"
-        if d > max_day:
-            return "liegt außerhalb der 90-Tage-Grenze"
-        # must have offer
-        off = con.execute("SELECT 1 FROM offers WHERE spot_id=? AND day=?", (spot_id, day_s)).fetchone()
-        if not off:
-            return "nicht angeboten"
-        # check booking collision
-        existing = con.execute("SELECT status FROM bookings WHERE spot_id=? AND day=?", (spot_id, day_s)).fetchone()
-        if existing and existing["status"] == "active":
-            return "bereits gebucht"
-        return None
-
-    booked: list[dict] = []
-    failed: list[dict] = []
-    hard_failed = False
+    row = con.execute("SELECT id, lot FROM spots WHERE name=?", (spot,)).fetchone()
+    if not row:
+        return PlainTextResponse("Unbekannter Parkplatz", status_code=400)
 
-    with connect() as con:
-        row = con.execute("SELECT id FROM spots WHERE name=?", (spot,)).fetchone()
-        if not row:
-            return PlainTextResponse("Unbekannter Parkplatz", status_code=400)
-        spot_id = row["id"]
-
-        # pre-check for hard mode
-        targets: list[date] = [d for d in daterange(start, end) if d.weekday() in allowed_wd]
-
-        if mode == "hard":
-            for d in targets:
-                r = reason_for_day(d, spot_id)
-                if r:
-                    failed.append({"day": d.strftime("%Y-%m-%d"), "reason": r})
-            if failed:
-                hard_failed = True
-                # no changes
-                return TEMPLATES.TemplateResponse(
-                    "series_result.html",
-                    {
-                        "request": request,
-                        "spot": spot,
-                        "start_day": start_day,
-                        "end_day": end_day,
-                        "mode": mode,
-                        "booked": [],
-                        "failed": failed,
-                        "hard_failed": True,
-                    },
-                    status_code=409,
-                )
-
-        # soft mode: attempt what we can
-        for d in targets:
-            day_s = d.strftime("%Y-%m-%d")
-            r = reason_for_day(d, spot_id)
-            if r:
-                failed.append({"day": day_s, "reason": r})
-                continue
-            token = secrets.token_urlsafe(24)
-            con.execute(
-                "INSERT OR REPLACE INTO bookings(spot_id, day, booker_email, status, created_at, manage_token) VALUES(?,?,?,?,?,?)",
-                (spot_id, day_s, "", "active", now_iso(), token),
-            )
-            booked.append({"day": day_s, "link": f"{base}/manage/{token}"})
-
-        con.commit()
+    res = book_series(
+        con, row["id"], start, end, allowed_wd, mode, today, max_day, now_iso(),
+        booker_email, spot_label(row["lot"], spot), base,
+    )
 
     return TEMPLATES.TemplateResponse(
         "series_result.html",
@@ -376,10 +433,11 @@ def series_book(
             "start_day": start_day,
             "end_day": end_day,
             "mode": mode,
-            "booked": booked,
-            "failed": failed,
-            "hard_failed": False,
+            "booked": [{"day": day_s, "link": f"{base}/manage/{token}"} for day_s, token in res.booked],
+            "failed": res.failed,
+            "hard_failed": res.hard_failed,
         },
+        status_code=409 if res.hard_failed else 200,
     )
 
 
@@ -389,115 +447,284 @@ def plan_raw():
 
 
 @app.get("/plan/annotated.png")
-def plan_annotated():
-    out = BASE_DIR / "static" / "plan_annotated.png"
-    render_annotated(out)
-    return FileResponse(str(out), media_type="image/png")
-
-
-def _resolve_post_plan() -> Optional[str]:
-    candidates = [
-        BASE_DIR / "plan" / "Plan_Postparkplatz.png",
-        BASE_DIR / "Plan" / "Plan_Postparkplatz.png",
-        BASE_DIR / "static" / "Plan_Postparkplatz.png",
-        BASE_DIR / "Plan_Postparkplatz.png",
-    ]
-    for p in candidates:
-        if p.exists():
-            return str(p)
-    return None
+def plan_annotated(request: Request, v: str = ""):
+    if not PLAN_IMAGE.exists():
+        return PlainTextResponse("Parkplatzplan nicht gefunden.", status_code=404)
+    plan = annotated_plan(BASE_DIR / "static" / "plan_annotated.png")
+    headers = {
+        "ETag": plan.etag,
+        "Last-Modified": formatdate(plan.mtime, usegmt=True),
+        # Versioned URLs (?v=<version>) never change; the bare URL is revalidated via ETag.
+        "Cache-Control": "public, max-age=31536000, immutable" if v == plan.version else "public, no-cache",
+    }
+    if request.headers.get("if-none-match") == plan.etag:
+        return Response(status_code=304, headers=headers)
+    return Response(plan.png, media_type="image/png", headers=headers)
 
 
 @app.get("/plan/post.png")
 def plan_post():
-    p = _resolve_post_plan()
+    p = post_plan_path()
     if not p:
         return PlainTextResponse("Postparkplatz-Plan nicht gefunden.", status_code=404)
-    return FileResponse(p, media_type="image/png")
+    return FileResponse(str(p), media_type="image/png")
+
+
+def _pyramid(lot: str):
+    return plan_pyramid(normalize_lot(lot), BASE_DIR / "static" / "plan_annotated.png")
+
+
+@app.get("/plan/{lot}/meta.json")
+def plan_tiles_meta(lot: str):
+    pyr = _pyramid(lot)
+    if pyr is None:
+        return PlainTextResponse("Parkplatzplan nicht gefunden.", status_code=404)
+    return JSONResponse(pyr.meta(), headers={"Cache-Control": "public, no-cache"})
+
+
+STATUS_OVERLAY_CACHE: LRUCache[bytes] = LRUCache(maxsize=64)
+# Rendered days show spot names/lots: any spots change invalidates all cached days.
+versions.subscribe("spots", lambda _key: versions.bump_all())
+# Open live streams re-read the days that changed (and everything after a gap).
+versions.subscribe("day", live.hub.mark_dirty)
+versions.subscribe("spots", live.hub.mark_all_dirty)
+versions.subscribe("*", live.hub.mark_all_dirty)
+# Owner codes live in spots; the credential index reloads them on the next lookup.
+versions.subscribe("spots", CREDENTIALS.owners_changed)
+versions.subscribe("*", CREDENTIALS.owners_changed)
+
+
+@app.get("/plan/{lot}/status/{day}")
+@db_read
+def plan_status_overlay(
+    request: Request,
+    lot: str,
+    day: str,
+    z: int = OVERLAY_LEVEL,
+    con: sqlite3.Connection = DB_CON,
+):
+    """Plan with per-spot availability rings for one day (free/booked/not offered)."""
+    lot = normalize_lot(lot)
+    try:
+        parse_day(day)
+    except Exception:
+        return PlainTextResponse("Ungültiges Datum.", status_code=400)
+    pyr = _pyramid(lot)
+    if pyr is None:
+        return PlainTextResponse("Parkplatzplan nicht gefunden.", status_code=404)
+    fmt = "webp" if "image/webp" in request.headers.get("accept", "") else "png"
+    versions.sync()
+    epoch, day_v = versions.version(day)
+    key = (lot, day, z, fmt, pyr.version, epoch, day_v)
+    etag = '"' + "-".join(str(k) for k in key) + '"'
+    headers = {"ETag": etag, "Vary": "Accept", "Cache-Control": "public, no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    data = STATUS_OVERLAY_CACHE.get_or_create(
+        key, lambda: render_status_overlay(pyr, lot, day_spot_statuses(con, day, lot), z, fmt)
+    )
+    return Response(data, media_type=TILE_FORMATS[fmt], headers=headers)
+
+
+@app.get("/plan/{lot}/{z}/{x}/{y}")
+def plan_tile(request: Request, lot: str, z: int, x: int, y: int, v: str = ""):
+    pyr = _pyramid(lot)
+    if pyr is None:
+        return PlainTextResponse("Parkplatzplan nicht gefunden.", status_code=404)
+    # Content negotiation: WebP where the browser supports it, PNG otherwise.
+    fmt = "webp" if "image/webp" in request.headers.get("accept", "") else "png"
+    etag = f'"{pyr.version}-{z}-{x}-{y}-{fmt}"'
+    headers = {
+        "ETag": etag,
+        "Vary": "Accept",
+        "Cache-Control": "public, max-age=31536000, immutable" if v == pyr.version else "public, no-cache",
+    }
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    data = pyr.tile(z, x, y, fmt)
+    if data is None:
+        return PlainTextResponse("Kachel nicht gefunden.", status_code=404)
+    return Response(data, media_type=TILE_FORMATS[fmt], headers=headers)
 
 
 @app.get("/plan/labeler", response_class=HTMLResponse)
 def plan_labeler(request: Request, k: str = ""):
-    token = ensure_admin_token()
-    if k != token:
+    if not CREDENTIALS.is_plan_token(k):
         return PlainTextResponse("Forbidden", status_code=403)
-    return TEMPLATES.TemplateResponse("plan_labeler.html", {"request": request, "token": token, "year": datetime.utcnow().year})
+    return TEMPLATES.TemplateResponse("plan_labeler.html", {"request": request, "token": CREDENTIALS.plan_token(), "year": datetime.utcnow().year})
+
+
+def _point(d: object) -> tuple[int, int]:
+    if not isinstance(d, dict):
+        raise ValueError("point")
+    return int(d["x"]), int(d["y"])
 
 
 @app.get("/plan/api/labels")
-def plan_labels(k: str = ""):
-    token = ensure_admin_token()
-    if k != token:
+def plan_labels(k: str = "", lot: str = "bank"):
+    if not CREDENTIALS.is_plan_token(k):
         return PlainTextResponse("Forbidden", status_code=403)
-    return JSONResponse(load_labels())
+    labels = label_set(normalize_lot(lot))
+    return JSONResponse({"version": labels.version, "labels": labels.labels})
 
 
 @app.post("/plan/api/add")
-def plan_add(payload: dict, k: str = ""):
-    token = ensure_admin_token()
-    if k != token:
+@db_batched
+def plan_add(payload: dict, k: str = "", lot: str = "bank", con: sqlite3.Connection = DB_CON):
+    if not CREDENTIALS.is_plan_token(k):
+        return PlainTextResponse("Forbidden", status_code=403)
+    try:
+        point = _point(payload)
+    except (KeyError, TypeError, ValueError):
+        return PlainTextResponse("Ungültige Koordinaten.", status_code=400)
+    version, added = add_labels(con, normalize_lot(lot), [point])
+    return JSONResponse({"version": version, "added": added})
+
+
+@app.post("/plan/api/batch")
+@db_batched
+def plan_add_batch(payload: dict, k: str = "", lot: str = "bank", con: sqlite3.Connection = DB_CON):
+    """Several clicks of the labeler in one request: {"points": [{"x": .., "y": ..}, ...]}."""
+    if not CREDENTIALS.is_plan_token(k):
+        return PlainTextResponse("Forbidden", status_code=403)
+    points = payload.get("points")
+    if not isinstance(points, list) or len(points) > MAX_LABEL_BATCH:
+        return PlainTextResponse(f"Bitte 0 bis {MAX_LABEL_BATCH} Punkte senden.", status_code=400)
+    try:
+        points = [_point(d) for d in points]
+    except (KeyError, TypeError, ValueError):
+        return PlainTextResponse("Ungültige Koordinaten.", status_code=400)
+    version, added = add_labels(con, normalize_lot(lot), points)
+    return JSONResponse({"version": version, "added": added})
+
+
+@app.post("/plan/api/move")
+@db_batched
+def plan_move(payload: dict, k: str = "", lot: str = "bank", con: sqlite3.Connection = DB_CON):
+    if not CREDENTIALS.is_plan_token(k):
         return PlainTextResponse("Forbidden", status_code=403)
-    labels = load_labels()
-    n = len(labels) + 1
-    x = int(payload.get("x"))
-    y = int(payload.get("y"))
-    labels.append({"n": n, "x": x, "y": y})
-    save_labels(labels)
-    return JSONResponse(labels)
+    try:
+        n = int(payload["n"])
+        x, y = _point(payload)
+    except (KeyError, TypeError, ValueError):
+        return PlainTextResponse("Ungültige Koordinaten.", status_code=400)
+    version = move_label(con, normalize_lot(lot), n, x, y)
+    if version is None:
+        return PlainTextResponse("Nummer nicht gefunden.", status_code=404)
+    return JSONResponse({"version": version, "moved": {"n": n, "x": x, "y": y}})
 
 
 @app.post("/plan/api/undo")
-def plan_undo(k: str = ""):
-    token = ensure_admin_token()
-    if k != token:
+@db_batched
+def plan_undo(k: str = "", lot: str = "bank", con: sqlite3.Connection = DB_CON):
+    if not CREDENTIALS.is_plan_token(k):
         return PlainTextResponse("Forbidden", status_code=403)
-    labels = load_labels()
-    if labels:
-        labels.pop()
-        save_labels(labels)
-    return JSONResponse(labels)
+    version, removed = undo_label(con, normalize_lot(lot))
+    return JSONResponse({"version": version, "removed": removed})
 
 
 @app.post("/plan/api/reset")
-def plan_reset(k: str = ""):
-    token = ensure_admin_token()
-    if k != token:
+@db_batched
+def plan_reset(k: str = "", lot: str = "bank", con: sqlite3.Connection = DB_CON):
+    if not CREDENTIALS.is_plan_token(k):
         return PlainTextResponse("Forbidden", status_code=403)
-    labels = []
-    save_labels(labels)
-    return JSONResponse(labels)
+    return JSONResponse({"version": reset_labels(con, normalize_lot(lot))})
 
 
 @app.get("/day/{day}", response_class=HTMLResponse)
-def day_view(request: Request, day: str, lot: str = "bank"):
+@db_read
+def day_view(request: Request, day: str, lot: str = "bank", con: sqlite3.Connection = DB_CON):
     # list offered spots + booking status
     day_dt = parse_day(day)
+    day = day_dt.strftime("%Y-%m-%d")  # canonical form, matches the keys bumped by writes
+    lot = normalize_lot(lot)
+
+    # Every write to offers/bookings (any worker) bumps versions.version(day) via the
+    # change log, so a changed day simply misses the cache.
+    versions.sync()
+    key = (day, lot, versions.version(day))
+    html = DAY_VIEW_CACHE.get_or_create(key, lambda: render_day_view(con, day_dt, lot))
+    return HTMLResponse(html)
+
+
+DAY_VIEW_CACHE: LRUCache[bytes] = LRUCache(maxsize=256)
+
+
+@app.get("/day/{day}/events")
+async def day_events(day: str, lot: str = "bank"):
+    """Server-sent events for one day view (see live.py)."""
+    try:
+        day = parse_day(day).strftime("%Y-%m-%d")
+    except Exception:
+        return PlainTextResponse("Ungültiges Datum.", status_code=400)
+    if live.hub.full():
+        return PlainTextResponse("Gerade zu viele Live-Verbindungen.", status_code=503)
+    return StreamingResponse(
+        live.stream(normalize_lot(lot), day),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+API_MAX_RANGE_DAYS = 3660
+
+
+@app.get("/api/availability")
+@db_read
+def api_availability(
+    request: Request,
+    lot: str = "bank",
+    first: str = Query(..., alias="from"),
+    last: str = Query(..., alias="to"),
+    con: sqlite3.Connection = DB_CON,
+):
+    """Free/booked spots per day for a date range (see availability.py for the format)."""
+    try:
+        first_dt, last_dt = parse_day(first), parse_day(last)
+    except Exception:
+        return PlainTextResponse("Ungültiges Datum.", status_code=400)
+    if last_dt < first_dt:
+        return PlainTextResponse("'to' liegt vor 'from'.", status_code=400)
+    if (last_dt - first_dt).days >= API_MAX_RANGE_DAYS:
+        return PlainTextResponse(f"Zeitraum zu lang (max. {API_MAX_RANGE_DAYS} Tage).", status_code=400)
+    lot = normalize_lot(lot)
+    first, last = first_dt.strftime("%Y-%m-%d"), last_dt.strftime("%Y-%m-%d")
+
+    # The version is read before the rows: the body is never older than its ETag.
+    v = versions.range_version(con, first, last)
+    etag = '"' + "-".join([lot, first, last, *map(str, v)]) + '"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return StreamingResponse(stream_availability(lot, first, last), media_type="application/json", headers=headers)
+
+
+def render_day_view(con: sqlite3.Connection, day_dt: date, lot: str) -> bytes:
+    day = day_dt.strftime("%Y-%m-%d")
     prev_day = (day_dt - timedelta(days=1)).strftime("%Y-%m-%d")
     next_day = (day_dt + timedelta(days=1)).strftime("%Y-%m-%d")
-    lot = normalize_lot(lot)
 
-    with connect() as con:
-        offers = con.execute(
-            """
-            SELECT s.name AS spot, s.id AS spot_id,
-                   o.id AS offer_id,
-                   b.status AS booking_status,
-                   b.booker_email AS booker_email
-            FROM offers o
-            JOIN spots s ON s.id=o.spot_id
-            LEFT JOIN bookings b ON b.spot_id=o.spot_id AND b.day=o.day
-            WHERE o.day=? AND s.lot=?
-            ORDER BY s.name
-            """,
-            (day, lot),
-        ).fetchall()
+    rows = con.execute(
+        """
+        SELECT s.name AS spot, b.status AS booking_status
+        FROM offers o
+        JOIN spots s ON s.id=o.spot_id
+        LEFT JOIN bookings b ON b.spot_id=o.spot_id AND b.day=o.day
+        WHERE o.day=? AND s.lot=?
+        ORDER BY s.name
+        """,
+        (day, lot),
+    ).fetchall()
+    # Display fields are computed here, the template only prints them.
+    offers = [
+        {"spot": r["spot"], "label": spot_label(lot, r["spot"]), "booked": r["booking_status"] == "active"}
+        for r in rows
+    ]
 
     lot_title = "Bankparkplatz" if lot == "bank" else "Postparkplatz"
 
-    return TEMPLATES.TemplateResponse(
-        "day.html",
+    return TEMPLATES.get_template("day.html").render(
         {
-            "request": request,
             "day": day,
             "lot": lot,
             "lot_title": lot_title,
@@ -506,62 +733,90 @@ def day_view(request: Request, day: str, lot: str = "bank"):
             "next_day": next_day,
             "maxAhead": MAX_BOOK_AHEAD_DAYS,
             "year": datetime.utcnow().year,
-        },
-    )
+        }
+    ).encode("utf-8")
+
+
+BOOK_SQL = """
+INSERT INTO bookings(spot_id, day, booker_email, status, created_at, manage_token)
+SELECT o.spot_id, o.day, ?, 'active', ?, ?
+FROM offers o JOIN spots s ON s.id=o.spot_id
+WHERE s.name=? AND s.lot=? AND o.day=?
+ON CONFLICT(spot_id, day) DO UPDATE SET
+  booker_email=excluded.booker_email,
+  status='active',
+  created_at=excluded.created_at,
+  cancelled_at=NULL,
+  cancel_reason=NULL,
+  manage_token=excluded.manage_token
+WHERE bookings.status <> 'active'
+"""
 
 
 @app.post("/book", response_class=HTMLResponse)
+@db_batched
 def book(
     request: Request,
     day: str = Form(...),
     spot: str = Form(...),
     lot: str = Form("bank"),
+    email: str = Form(""),
+    con: sqlite3.Connection = DB_CON,
 ):
+    # Mail is opt-in: without an address the booking stays anonymous.
+    booker_email = parse_email(email)
+    if booker_email is None:
+        return PlainTextResponse("Ungültige E-Mail-Adresse.", status_code=400)
     token = secrets.token_urlsafe(24)
     lot = normalize_lot(lot)
-    with connect() as con:
-        row = con.execute("SELECT id FROM spots WHERE name=? AND lot=?", (spot, lot)).fetchone()
+    created_at = now_iso()
+    # Single statement: insert only if the spot is offered that day; a cancelled
+    # booking is taken over, an active one is left untouched (rowcount 0).
+    # Committed with the rest of the batch by the write queue.
+    cur = con.execute(BOOK_SQL, (booker_email, created_at, token, spot, lot, day))
+    if cur.rowcount != 1:
+        # Slow path only for the loser: explain why nothing was written.
+        row = con.execute(
+            """
+            SELECT s.id AS spot_id, o.id AS offer_id
+            FROM spots s
+            LEFT JOIN offers o ON o.spot_id=s.id AND o.day=?
+            WHERE s.name=? AND s.lot=?
+            """,
+            (day, spot, lot),
+        ).fetchone()
         if not row:
             return PlainTextResponse("Unbekannter Parkplatz", status_code=400)
-        spot_id = row["id"]
-        # must have offer
-        off = con.execute("SELECT 1 FROM offers WHERE spot_id=? AND day=?", (spot_id, day)).fetchone()
-        if not off:
+        if row["offer_id"] is None:
             return PlainTextResponse("Dieser Parkplatz ist an dem Tag nicht angeboten.", status_code=400)
-        # check booking collision
-        existing = con.execute("SELECT status FROM bookings WHERE spot_id=? AND day=?", (spot_id, day)).fetchone()
-        if existing and existing["status"] == "active":
-            return PlainTextResponse("Schon gebucht.", status_code=409)
+        return PlainTextResponse("Schon gebucht.", status_code=409)
 
-        con.execute(
-            "INSERT OR REPLACE INTO bookings(spot_id, day, booker_email, status, created_at, manage_token) VALUES(?,?,?,?,?,?)",
-            (spot_id, day, "", "active", now_iso(), token),
-        )
-        con.commit()
-
-    # No e-mail: show booking code immediately
+    if booker_email:
+        base = str(request.base_url).rstrip("/")
+        enqueue_confirmation(con, booker_email, spot_label(lot, spot), [(day, token)], base, created_at)
+    # Show the booking code immediately (the mail, if any, follows from the outbox).
     return RedirectResponse(url=f"/manage/{token}", status_code=303)
 
 
 @app.get("/manage/{token}", response_class=HTMLResponse)
-def manage(request: Request, token: str):
-    with connect() as con:
-        b = con.execute(
-            """SELECT b.id, b.day, b.status, b.booker_email, s.name as spot
-               FROM bookings b JOIN spots s ON s.id=b.spot_id
-               WHERE b.manage_token=?""",
-            (token,),
-        ).fetchone()
+@db_read
+def manage(request: Request, token: str, con: sqlite3.Connection = DB_CON):
+    b = con.execute(
+        """SELECT b.id, b.day, b.status, b.booker_email, s.name as spot
+           FROM bookings b JOIN spots s ON s.id=b.spot_id
+           WHERE b.manage_token=?""",
+        (token,),
+    ).fetchone()
     if not b:
         return PlainTextResponse("Ungültiger Link.", status_code=404)
     return TEMPLATES.TemplateResponse("manage.html", {"request": request, "b": b, "token": token, "year": datetime.utcnow().year})
 
 
 @app.get("/manage/{token}/download")
-def download_booking_link(request: Request, token: str):
+@db_read
+def download_booking_link(request: Request, token: str, con: sqlite3.Connection = DB_CON):
     # Return a simple text file with the manage URL.
-    with connect() as con:
-        b = con.execute("SELECT 1 FROM bookings WHERE manage_token=?", (token,)).fetchone()
+    b = con.execute("SELECT 1 FROM bookings WHERE manage_token=?", (token,)).fetchone()
     if not b:
         return PlainTextResponse("Ungültiger Link.", status_code=404)
     base = str(request.base_url).rstrip("/")
@@ -572,71 +827,93 @@ def download_booking_link(request: Request, token: str):
 
 
 @app.post("/manage/{token}/cancel")
-def cancel_booking(request: Request, token: str, reason: str = Form("")):
-    with connect() as con:
-        b = con.execute(
-            "SELECT id, status FROM bookings WHERE manage_token=?",
-            (token,),
-        ).fetchone()
-        if not b:
-            return PlainTextResponse("Ungültiger Link.", status_code=404)
-        if b["status"] != "active":
-            return RedirectResponse(url=f"/manage/{token}", status_code=303)
-        con.execute(
-            "UPDATE bookings SET status='cancelled_by_booker', cancelled_at=?, cancel_reason=? WHERE manage_token=?",
-            (now_iso(), reason.strip()[:200], token),
-        )
-        con.commit()
+@db_batched
+def cancel_booking(request: Request, token: str, reason: str = Form(""), con: sqlite3.Connection = DB_CON):
+    b = con.execute(
+        "SELECT id, day, status FROM bookings WHERE manage_token=?",
+        (token,),
+    ).fetchone()
+    if not b:
+        return PlainTextResponse("Ungültiger Link.", status_code=404)
+    if b["status"] != "active":
+        return RedirectResponse(url=f"/manage/{token}", status_code=303)
+    con.execute(
+        "UPDATE bookings SET status='cancelled_by_booker', cancelled_at=?, cancel_reason=? WHERE manage_token=?",
+        (now_iso(), reason.strip()[:200], token),
+    )
     return RedirectResponse(url=f"/manage/{token}", status_code=303)
 
 
 @app.get("/owner", response_class=HTMLResponse)
-def owner_login(request: Request):
+async def owner_login(request: Request):
     return TEMPLATES.TemplateResponse("owner_login.html", {"request": request, "year": datetime.utcnow().year})
 
 
 @app.get("/owner/portal", response_class=HTMLResponse)
-def owner_portal_get(request: Request, code: str, p: int = 0):
-    code = (code or "").strip().upper()
+@db_read
+def owner_portal_get(
+    request: Request,
+    code: str = "",
+    p: int = 0,
+    size: int = PORTAL_PAGE_SIZE,
+    op: str = "",
+    inserted: int = 0,
+    removed: int = 0,
+    cancelled: int = 0,
+    skipped: int = 0,
+    notified: int = 0,
+    con: sqlite3.Connection = DB_CON,
+):
     if p < 0:
         p = 0
 
-    page_size = 14
+    page_size = normalize_page_size(size)
+
+    owner = current_owner(request, CREDENTIALS, code)
+    if owner is None:
+        return RedirectResponse(url="/owner", status_code=303)
+    if code:
+        # Old link with the code in the URL: log in and continue without it.
+        resp = RedirectResponse(url=portal_url(p, size), status_code=303)
+        login_owner(resp, request, CREDENTIALS, owner)
+        return resp
+
+    today_d = berlin.today()
+    max_day = today_d + timedelta(days=MAX_BOOK_AHEAD_DAYS)
+
+    start_d = today_d + timedelta(days=p * page_size)
+    if start_d > max_day:
+        start_d = max_day
+    # only show remaining days up to max_day
+    end_d = min(start_d + timedelta(days=page_size - 1), max_day)
+    start_s, end_s = start_d.isoformat(), end_d.isoformat()
+
+    # One statement for the whole window: the days table supplies every day of the
+    # page with its weekday, offers and bookings are joined in.
+    rows = [
+        {
+            "day": r["day"],
+            "weekday": WEEKDAY_LABELS[r["weekday"]],
+            "holiday": r["holiday"],
+            "offered": bool(r["offered"]),
+            "booking_status": r["status"],
+            "booker_email": r["booker_email"],
+        }
+        for r in con.execute(
+            """
+            SELECT d.day, d.weekday, d.holiday, o.id IS NOT NULL AS offered, b.status, b.booker_email
+            FROM days d
+            LEFT JOIN offers o ON o.spot_id=? AND o.day=d.day
+            LEFT JOIN bookings b ON b.spot_id=? AND b.day=d.day
+            WHERE d.day BETWEEN ? AND ?
+            ORDER BY d.day
+            """,
+            (owner.spot_id, owner.spot_id, start_s, end_s),
+        )
+    ]
 
-    with connect() as con:
-        spot = con.execute("SELECT id, name FROM spots WHERE owner_code=?", (code,)).fetchone()
-        if not spot:
-            return RedirectResponse(url="/owner", status_code=303)
-
-        today_d = date.today()
-        max_day = today_d + timedelta(days=MAX_BOOK_AHEAD_DAYS)
-
-        start_d = today_d + timedelta(days=p * page_size)
-        if start_d > max_day:
-            start_d = max_day
-
-        start_s = start_d.strftime("%Y-%m-%d")
-        # only show remaining days up to max_day
-        remaining = (max_day - start_d).days + 1
-        n_days = min(page_size, max(0, remaining))
-
-        days = berlin_day_list(start_s, n_days)
-        rows = []
-        weekday_labels = ["Montag", "Dienstag", "Mittwoch", "Donnerstag", "Freitag", "Samstag", "Sonntag"]
-        for day in days:
-            off = con.execute("SELECT 1 FROM offers WHERE spot_id=? AND day=?", (spot["id"], day)).fetchone()
-            bk = con.execute("SELECT status, booker_email FROM bookings WHERE spot_id=? AND day=?", (spot["id"], day)).fetchone()
-            d_obj = datetime.strptime(day, "%Y-%m-%d").date()
-            rows.append({
-                "day": day,
-                "weekday": weekday_labels[d_obj.weekday()],
-                "offered": bool(off),
-                "booking_status": (bk["status"] if bk else None),
-                "booker_email": (bk["booker_email"] if bk else None),
-            })
-
-    page_start = days[0] if days else start_s
-    page_end = days[-1] if days else start_s
+    page_start = rows[0]["day"] if rows else start_s
+    page_end = rows[-1]["day"] if rows else start_s
     has_prev = p > 0
     has_next = (start_d + timedelta(days=page_size)) <= max_day
 
@@ -644,22 +921,24 @@ def owner_portal_get(request: Request, code: str, p: int = 0):
         "owner.html",
         {
             "request": request,
-            "spot": spot["name"],
-            "code": code,
+            "spot": owner.spot,
             "rows": rows,
             "p": p,
             "has_prev": has_prev,
             "has_next": has_next,
             "page_start": page_start,
             "page_end": page_end,
+            "size": page_size,
+            "page_sizes": PORTAL_PAGE_SIZES,
+            "result": {"op": op, "inserted": inserted, "removed": removed, "cancelled": cancelled, "skipped": skipped, "notified": notified},
             "year": datetime.utcnow().year,
         },
     )
 
 
 @app.get("/owner/bookings", response_class=HTMLResponse)
-def owner_bookings(request: Request, code: str, p: int = 0, portal_p: int = 0):
-    code = (code or "").strip().upper()
+@db_read
+def owner_bookings(request: Request, code: str = "", p: int = 0, portal_p: int = 0, con: sqlite3.Connection = DB_CON):
     if p < 0:
         p = 0
     if portal_p < 0:
@@ -668,22 +947,12 @@ def owner_bookings(request: Request, code: str, p: int = 0, portal_p: int = 0):
     page_size = 50
     offset = p * page_size
 
-    with connect() as con:
-        spot = con.execute("SELECT id, name FROM spots WHERE owner_code=?", (code,)).fetchone()
-        if not spot:
-            return RedirectResponse(url="/owner", status_code=303)
+    owner = current_owner(request, CREDENTIALS, code)
+    if owner is None:
+        return RedirectResponse(url="/owner", status_code=303)
 
-        total = con.execute("SELECT COUNT(*) AS c FROM bookings WHERE spot_id=?", (spot["id"],)).fetchone()["c"]
-        rows = con.execute(
-            """
-            SELECT day, status, created_at, cancelled_at, cancel_reason
-            FROM bookings
-            WHERE spot_id=?
-            ORDER BY day DESC
-            LIMIT ? OFFSET ?
-            """,
-            (spot["id"], page_size, offset),
-        ).fetchall()
+    # Older days have been moved to the archive database; the history spans both.
+    total, rows = owner_history(con, owner.spot_id, page_size, offset)
 
     has_prev = p > 0
     has_next = (offset + page_size) < total
@@ -692,8 +961,7 @@ def owner_bookings(request: Request, code: str, p: int = 0, portal_p: int = 0):
         "owner_bookings.html",
         {
             "request": request,
-            "spot": spot["name"],
-            "code": code,
+            "spot": owner.spot,
             "rows": rows,
             "p": p,
             "has_prev": has_prev,
@@ -706,47 +974,55 @@ def owner_bookings(request: Request, code: str, p: int = 0, portal_p: int = 0):
 
 @app.post("/owner", response_class=HTMLResponse)
 def owner_portal(request: Request, code: str = Form(...)):
-    code = code.strip().upper()
-    with connect() as con:
-        spot = con.execute("SELECT id, name FROM spots WHERE owner_code=?", (code,)).fetchone()
-        if not spot:
-            return TEMPLATES.TemplateResponse(
-                "owner_login.html",
-                {"request": request, "error": "Code unbekannt."},
-                status_code=401,
-            )
+    owner = CREDENTIALS.owner_by_code(code)
+    if owner is None:
+        return TEMPLATES.TemplateResponse(
+            "owner_login.html",
+            {"request": request, "error": "Code unbekannt."},
+            status_code=401,
+        )
+
+    resp = RedirectResponse(url=portal_url(0), status_code=303)
+    login_owner(resp, request, CREDENTIALS, owner)
+    return resp
 
-    return RedirectResponse(url=f"/owner/portal?code={code}&p=0", status_code=303)
+
+@app.post("/owner/logout")
+async def owner_logout():
+    resp = RedirectResponse(url="/owner", status_code=303)
+    logout(resp, OWNER_COOKIE)
+    return resp
 
 
 @app.post("/owner/offer")
-def owner_offer(code: str = Form(...), day: str = Form(...), p: int = Form(0)):
-    code = code.strip().upper()
-    with connect() as con:
-        spot = con.execute("SELECT id, name FROM spots WHERE owner_code=?", (code,)).fetchone()
-        if not spot:
-            return PlainTextResponse("Code unbekannt", status_code=401)
-        con.execute(
-            "INSERT OR IGNORE INTO offers(spot_id, day, created_at) VALUES(?,?,?)",
-            (spot["id"], day, now_iso()),
-        )
-        con.commit()
-    return RedirectResponse(url=f"/owner/portal?code={code}&p={p}", status_code=303)
+@db_batched
+def owner_offer(request: Request, code: str = Form(""), day: str = Form(...), p: int = Form(0), size: int = Form(PORTAL_PAGE_SIZE), con: sqlite3.Connection = DB_CON):
+    owner = current_owner(request, CREDENTIALS, code)
+    if owner is None:
+        return PlainTextResponse("Nicht angemeldet.", status_code=401)
+    con.execute(
+        "INSERT OR IGNORE INTO offers(spot_id, day, created_at) VALUES(?,?,?)",
+        (owner.spot_id, day, now_iso()),
+    )
+    return RedirectResponse(url=portal_url(p, size), status_code=303)
 
 
 @app.post("/owner/offer_series")
+@db_write
 def owner_offer_series(
-    code: str = Form(...),
+    request: Request,
+    code: str = Form(""),
     start_day: str = Form(...),
     end_day: str = Form(...),
     weekdays: Optional[list[str]] = Form(None),
     p: int = Form(0),
+    size: int = Form(PORTAL_PAGE_SIZE),
+    con: sqlite3.Connection = DB_CON,
 ):
     """Create offers for a date range on selected weekdays.
 
     weekdays: list of "0".."6" where 0=Mon.
     """
-    code = code.strip().upper()
 
     try:
         start = parse_day(start_day)
@@ -761,52 +1037,38 @@ def owner_offer_series(
     if (end - start).days > 366:
         return PlainTextResponse("Zeitraum zu groß (max 12 Monate).", status_code=400)
 
-    allowed_wd = set()
-    for w in (weekdays or []):
-        try:
-            wi = int(w)
-        except Exception:
-            continue
-        if 0 <= wi <= 6:
-            allowed_wd.add(wi)
+    allowed_wd = parse_weekdays(weekdays)
     if not allowed_wd:
         return PlainTextResponse("Bitte mindestens einen Wochentag wählen.", status_code=400)
 
-    today = date.today()
+    today = berlin.today()
     max_day = today + timedelta(days=MAX_BOOK_AHEAD_DAYS)
 
-    inserted = 0
-    with connect() as con:
-        spot = con.execute("SELECT id, name FROM spots WHERE owner_code=?", (code,)).fetchone()
-        if not spot:
-            return PlainTextResponse("Code unbekannt", status_code=401)
-
-        for d in daterange(start, end):
-            if d < today or d > max_day:
-                continue
-            if d.weekday() not in allowed_wd:
-                continue
-            con.execute(
-                "INSERT OR IGNORE INTO offers(spot_id, day, created_at) VALUES(?,?,?)",
-                (spot["id"], d.strftime("%Y-%m-%d"), now_iso()),
-            )
-            inserted += con.total_changes  # approximate
-        con.commit()
+    owner = current_owner(request, CREDENTIALS, code)
+    if owner is None:
+        return PlainTextResponse("Nicht angemeldet.", status_code=401)
 
-    return RedirectResponse(url=f"/owner/portal?code={code}&p={p}", status_code=303)
+    res = offer_series(con, owner.spot_id, start, end, allowed_wd, today, max_day, now_iso())
+
+    return RedirectResponse(
+        url=portal_url(p, size, op="offer_series", inserted=res.inserted, skipped=res.skipped),
+        status_code=303,
+    )
 
 
 @app.post("/owner/withdraw_series")
+@db_write
 def owner_withdraw_series(
     request: Request,
-    code: str = Form(...),
+    code: str = Form(""),
     start_day: str = Form(...),
     end_day: str = Form(...),
     weekdays: Optional[list[str]] = Form(None),
     reason: str = Form(""),
     p: int = Form(0),
+    size: int = Form(PORTAL_PAGE_SIZE),
+    con: sqlite3.Connection = DB_CON,
 ):
-    code = code.strip().upper()
 
     try:
         start = parse_day(start_day)
@@ -820,114 +1082,97 @@ def owner_withdraw_series(
     if (end - start).days > 366:
         return PlainTextResponse("Zeitraum zu groß (max 12 Monate).", status_code=400)
 
-    allowed_wd = set()
-    for w in (weekdays or []):
-        try:
-            wi = int(w)
-        except Exception:
-            continue
-        if 0 <= wi <= 6:
-            allowed_wd.add(wi)
+    allowed_wd = parse_weekdays(weekdays)
     if not allowed_wd:
         return PlainTextResponse("Bitte mindestens einen Wochentag wählen.", status_code=400)
 
-    today = date.today()
+    today = berlin.today()
     max_day = today + timedelta(days=MAX_BOOK_AHEAD_DAYS)
 
-    with connect() as con:
-        spot = con.execute("SELECT id, name FROM spots WHERE owner_code=?", (code,)).fetchone()
-        if not spot:
-            return PlainTextResponse("Code unbekannt", status_code=401)
-
-        for d in daterange(start, end):
-            if d < today or d > max_day:
-                continue
-            if d.weekday() not in allowed_wd:
-                continue
-            day = d.strftime("%Y-%m-%d")
-            if day <= today.strftime("%Y-%m-%d"):
-                continue
-            con.execute("DELETE FROM offers WHERE spot_id=? AND day=?", (spot["id"], day))
-            b = con.execute(
-                "SELECT id, status FROM bookings WHERE spot_id=? AND day=?",
-                (spot["id"], day),
-            ).fetchone()
-            if b and b["status"] == "active":
-                if not owner_cancel_allowed(day):
-                    continue
-                con.execute(
-                    "UPDATE bookings SET status='cancelled_by_owner', cancelled_at=?, cancel_reason=? WHERE id=?",
-                    (now_iso(), (reason.strip() or "Owner hat die Serie zurückgezogen")[:200], b["id"]),
-                )
-
-        con.commit()
-
-    return RedirectResponse(url=f"/owner/portal?code={code}&p={p}", status_code=303)
+    owner = current_owner(request, CREDENTIALS, code)
+    if owner is None:
+        return PlainTextResponse("Nicht angemeldet.", status_code=401)
+
+    # Today itself can no longer be withdrawn.
+    lo = max(start, today + timedelta(days=1))
+    hi = min(end, max_day)
+    res = withdraw_range(
+        con,
+        owner.spot_id,
+        lo,
+        hi,
+        allowed_wd,
+        berlin.owner_cancel_from(),
+        now_iso(),
+        (reason.strip() or "Owner hat die Serie zurückgezogen")[:200],
+        str(request.base_url).rstrip("/"),
+    )
+
+    return RedirectResponse(
+        url=portal_url(p, size, op="withdraw_series", removed=res.removed, cancelled=res.cancelled, skipped=res.skipped, notified=res.notified),
+        status_code=303,
+    )
 
 
 @app.post("/owner/withdraw_all")
-def owner_withdraw_all(code: str = Form(...), reason: str = Form(""), p: int = Form(0)):
+@db_write
+def owner_withdraw_all(request: Request, code: str = Form(""), reason: str = Form(""), p: int = Form(0), size: int = Form(PORTAL_PAGE_SIZE), con: sqlite3.Connection = DB_CON):
     """Withdraw all future offers for this owner spot and cancel active bookings.
 
-    Anonym mode: no notifications.
+    Bookers who left an e-mail address are notified through the outbox.
     """
-    code = code.strip().upper()
-    today = date.today().strftime("%Y-%m-%d")
-    with connect() as con:
-        spot = con.execute("SELECT id, name FROM spots WHERE owner_code=?", (code,)).fetchone()
-        if not spot:
-            return PlainTextResponse("Code unbekannt", status_code=401)
-
-        # Cancel only active bookings still within allowed owner-cancel window.
-        active = con.execute(
-            "SELECT id, day FROM bookings WHERE spot_id=? AND day>? AND status='active'",
-            (spot["id"], today),
-        ).fetchall()
-        for b in active:
-            if owner_cancel_allowed(b["day"]):
-                con.execute(
-                    "UPDATE bookings SET status='cancelled_by_owner', cancelled_at=?, cancel_reason=? WHERE id=?",
-                    (now_iso(), (reason.strip() or "Owner hat alle Freigaben zurückgezogen")[:200], b["id"]),
-                )
-
-        # Delete future offers
-        con.execute(
-            "DELETE FROM offers WHERE spot_id=? AND day>?",
-            (spot["id"], today),
-        )
-        con.commit()
+    today = berlin.today()
+    owner = current_owner(request, CREDENTIALS, code)
+    if owner is None:
+        return PlainTextResponse("Nicht angemeldet.", status_code=401)
+
+    # Cancel only active bookings still within allowed owner-cancel window.
+    res = withdraw_range(
+        con,
+        owner.spot_id,
+        today + timedelta(days=1),
+        today + timedelta(days=MAX_BOOK_AHEAD_DAYS),
+        set(range(7)),
+        berlin.owner_cancel_from(),
+        now_iso(),
+        (reason.strip() or "Owner hat alle Freigaben zurückgezogen")[:200],
+        str(request.base_url).rstrip("/"),
+    )
 
-    return RedirectResponse(url=f"/owner/portal?code={code}&p={p}", status_code=303)
+    return RedirectResponse(
+        url=portal_url(p, size, op="withdraw_all", removed=res.removed, cancelled=res.cancelled, skipped=res.skipped, notified=res.notified),
+        status_code=303,
+    )
 
 
 @app.post("/owner/withdraw")
-def owner_withdraw(request: Request, code: str = Form(...), day: str = Form(...), reason: str = Form(""), p: int = Form(0)):
-    code = code.strip().upper()
-    with connect() as con:
-        spot = con.execute("SELECT id, name FROM spots WHERE owner_code=?", (code,)).fetchone()
-        if not spot:
-            return PlainTextResponse("Code unbekannt", status_code=401)
-
-        today = datetime.now().strftime("%Y-%m-%d")
-
-        con.execute("DELETE FROM offers WHERE spot_id=? AND day=?", (spot["id"], day))
-        b = con.execute(
-            "SELECT id, booker_email, manage_token, status FROM bookings WHERE spot_id=? AND day=?",
-            (spot["id"], day),
-        ).fetchone()
-        if b and b["status"] == "active":
-            if not owner_cancel_allowed(day):
-                return PlainTextResponse(
-                    "Zu spät: Storno nur bis 12:00 Uhr am Vortag möglich.",
-                    status_code=400,
-                )
-            con.execute(
-                "UPDATE bookings SET status='cancelled_by_owner', cancelled_at=?, cancel_reason=? WHERE id=?",
-                (now_iso(), (reason.strip() or "Owner hat das Angebot zurückgezogen")[:200], b["id"]),
+@db_batched
+def owner_withdraw(request: Request, code: str = Form(""), day: str = Form(...), reason: str = Form(""), p: int = Form(0), size: int = Form(PORTAL_PAGE_SIZE), con: sqlite3.Connection = DB_CON):
+    owner = current_owner(request, CREDENTIALS, code)
+    if owner is None:
+        return PlainTextResponse("Nicht angemeldet.", status_code=401)
+
+    today = berlin.today_iso()
+
+    con.execute("DELETE FROM offers WHERE spot_id=? AND day=?", (owner.spot_id, day))
+    b = con.execute(
+        "SELECT id, booker_email, manage_token, status FROM bookings WHERE spot_id=? AND day=?",
+        (owner.spot_id, day),
+    ).fetchone()
+    if b and b["status"] == "active":
+        if not berlin.owner_cancel_allowed(day):
+            return PlainTextResponse(
+                "Zu spät: Storno nur bis 12:00 Uhr am Vortag möglich.",
+                status_code=400,
             )
-        elif day <= today:
-            return PlainTextResponse("Zu spät: Rückzug für heute nicht mehr möglich.", status_code=400)
-        con.commit()
+        cancelled_at = now_iso()
+        con.execute(
+            "UPDATE bookings SET status='cancelled_by_owner', cancelled_at=?, cancel_reason=? WHERE id=?",
+            (cancelled_at, (reason.strip() or "Owner hat das Angebot zurückgezogen")[:200], b["id"]),
+        )
+        if b["booker_email"]:
+            enqueue_cancellations(con, owner.spot_id, day, day, cancelled_at, str(request.base_url).rstrip("/"))
+    elif day <= today:
+        return PlainTextResponse("Zu spät: Rückzug für heute nicht mehr möglich.", status_code=400)
 
-    # No e-mail notifications in anonym mode.
-    return RedirectResponse(url=f"/owner/portal?code={code}&p={p}", status_code=303)
+    return RedirectResponse(url=portal_url(p, size), status_code=303)
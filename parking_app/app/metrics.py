@@ -0,0 +1,221 @@
+"""Request, SQL and render metrics in Prometheus text format.
+
+MetricsMiddleware times every request and attributes the SQL statements run on
+its behalf (db.TimedConnection reports them via record_sql) to the matched route.
+Values are per worker process; every worker serves its own /metrics.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from functools import wraps
+from typing import Callable, Iterator, Optional, TypeVar
+
+F = TypeVar("F", bound=Callable)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+STATEMENT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last: +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+@dataclass
+class RequestStats:
+    statements: int = 0
+    sql_seconds: float = 0.0
+    slow: int = 0
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+_lock = threading.Lock()
+_latency: dict[tuple[str, str], Histogram] = {}
+_statements: dict[str, Histogram] = {}
+_responses: dict[tuple[str, str, str], int] = {}
+_sql: dict[str, list[float]] = {}  # route -> [statements, seconds, slow]
+_render: dict[str, Histogram] = {}
+_commits = [0, 0]  # group commits, operations in them
+
+BACKGROUND = "(background)"  # statements outside a request: startup, listener
+
+
+def record_sql(seconds: float, slow: bool = False) -> None:
+    stats = _current.get()
+    if stats is not None:
+        # Request-local; folded into the route totals when the request ends.
+        stats.statements += 1
+        stats.sql_seconds += seconds
+        stats.slow += slow
+        return
+    with _lock:
+        totals = _sql.setdefault(BACKGROUND, [0, 0.0, 0])
+        totals[0] += 1
+        totals[1] += seconds
+        totals[2] += slow
+
+
+def record_commit(ops: int) -> None:
+    with _lock:
+        _commits[0] += 1
+        _commits[1] += ops
+
+
+@contextmanager
+def render_timer(kind: str) -> Iterator[None]:
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - t0
+        with _lock:
+            _render.setdefault(kind, Histogram(LATENCY_BUCKETS)).observe(elapsed)
+
+
+def timed_render(kind: str) -> Callable[[F], F]:
+    """Decorator form of render_timer."""
+
+    def deco(fn: F) -> F:
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with render_timer(kind):
+                return fn(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return deco
+
+
+def _route_label(scope: dict) -> str:
+    endpoint = scope.get("endpoint")
+    app = scope.get("app")
+    if endpoint is None or app is None:
+        return "(unmatched)"
+    for route in getattr(app, "routes", ()):
+        if getattr(route, "endpoint", None) is endpoint or getattr(route, "app", None) is endpoint:
+            return route.path
+    return "(unmatched)"
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware (no extra task per request, unlike BaseHTTPMiddleware)."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        status = "500"
+
+        async def send_wrapper(message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - t0
+            _current.reset(token)
+            route = _route_label(scope)
+            method = scope["method"]
+            with _lock:
+                _latency.setdefault((method, route), Histogram(LATENCY_BUCKETS)).observe(elapsed)
+                _statements.setdefault(route, Histogram(STATEMENT_BUCKETS)).observe(stats.statements)
+                key = (method, route, status)
+                _responses[key] = _responses.get(key, 0) + 1
+                totals = _sql.setdefault(route, [0, 0.0, 0])
+                totals[0] += stats.statements
+                totals[1] += stats.sql_seconds
+                totals[2] += stats.slow
+
+
+def _labels(**kv: str) -> str:
+    inner = ",".join(f'{k}="{_escape(v)}"' for k, v in kv.items())
+    return "{" + inner + "}"
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _histogram(lines: list[str], name: str, hist: Histogram, **labels: str) -> None:
+    cumulative = 0
+    for le, n in zip(hist.buckets + ("+Inf",), hist.counts):
+        cumulative += n
+        lines.append(f"{name}_bucket{_labels(**labels, le=str(le))} {cumulative}")
+    lines.append(f"{name}_sum{_labels(**labels)} {hist.sum:.6f}")
+    lines.append(f"{name}_count{_labels(**labels)} {hist.count}")
+
+
+def render() -> str:
+    """All metrics in Prometheus text exposition format (version 0.0.4)."""
+    lines: list[str] = []
+    with _lock:
+        lines += [
+            "# HELP parking_http_request_duration_seconds Request latency by route.",
+            "# TYPE parking_http_request_duration_seconds histogram",
+        ]
+        for (method, route), hist in sorted(_latency.items()):
+            _histogram(lines, "parking_http_request_duration_seconds", hist, method=method, route=route)
+
+        lines += [
+            "# HELP parking_http_responses_total Responses by route and status.",
+            "# TYPE parking_http_responses_total counter",
+        ]
+        for (method, route, status), n in sorted(_responses.items()):
+            lines.append(f"parking_http_responses_total{_labels(method=method, route=route, status=status)} {n}")
+
+        lines += [
+            "# HELP parking_sql_statements_per_request SQL statements executed per request.",
+            "# TYPE parking_sql_statements_per_request histogram",
+        ]
+        for route, hist in sorted(_statements.items()):
+            _histogram(lines, "parking_sql_statements_per_request", hist, route=route)
+
+        for name, idx, help_text in (
+            ("parking_sql_statements_total", 0, "SQL statements executed."),
+            ("parking_sql_seconds_total", 1, "Time spent in execute()/executemany()."),
+            ("parking_sql_slow_statements_total", 2, "Statements slower than db.SLOW_QUERY_MS."),
+        ):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+            for route, totals in sorted(_sql.items()):
+                value = f"{totals[idx]:.6f}" if idx == 1 else str(totals[idx])
+                lines.append(f"{name}{_labels(route=route)} {value}")
+
+        lines += [
+            "# HELP parking_write_commits_total Group commits of the write queue.",
+            "# TYPE parking_write_commits_total counter",
+            f"parking_write_commits_total {_commits[0]}",
+            "# HELP parking_write_ops_total Operations committed by the write queue.",
+            "# TYPE parking_write_ops_total counter",
+            f"parking_write_ops_total {_commits[1]}",
+        ]
+
+        lines += [
+            "# HELP parking_render_duration_seconds PIL render/encode time by kind.",
+            "# TYPE parking_render_duration_seconds histogram",
+        ]
+        for kind, hist in sorted(_render.items()):
+            _histogram(lines, "parking_render_duration_seconds", hist, kind=kind)
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,388 @@
+"""Numbered schema migrations.
+
+Each migration runs in its own transaction and is recorded in schema_version;
+PRAGMA user_version mirrors the latest applied number so an up-to-date database
+is detected with a single PRAGMA read at startup.
+
+To change the schema append a new (version, name, step) entry to MIGRATIONS;
+never edit a migration that has already shipped.
+"""
+from __future__ import annotations
+
+import sqlite3
+from datetime import datetime
+from typing import Callable, Iterator, Union
+
+Step = Union[str, Callable[[sqlite3.Connection], None]]
+
+
+def _statements(script: str) -> Iterator[str]:
+    # executescript() would COMMIT first; split instead so a step stays atomic.
+    buf = ""
+    for line in script.splitlines(keepends=True):
+        buf += line
+        if sqlite3.complete_statement(buf):
+            if buf.strip():
+                yield buf
+            buf = ""
+    if buf.strip():
+        yield buf
+
+
+def _initial(con: sqlite3.Connection) -> None:
+    # IF NOT EXISTS everywhere: pre-migration installs already have these tables.
+    for stmt in _statements(
+        """
+        CREATE TABLE IF NOT EXISTS spots (
+          id INTEGER PRIMARY KEY,
+          name TEXT NOT NULL UNIQUE,
+          owner_code TEXT NOT NULL UNIQUE,
+          lot TEXT NOT NULL DEFAULT 'bank'
+        );
+
+        CREATE TABLE IF NOT EXISTS offers (
+          id INTEGER PRIMARY KEY,
+          spot_id INTEGER NOT NULL,
+          day TEXT NOT NULL, -- YYYY-MM-DD Europe/Berlin
+          created_at TEXT NOT NULL,
+          UNIQUE(spot_id, day),
+          FOREIGN KEY(spot_id) REFERENCES spots(id) ON DELETE CASCADE
+        );
+
+        CREATE TABLE IF NOT EXISTS bookings (
+          id INTEGER PRIMARY KEY,
+          spot_id INTEGER NOT NULL,
+          day TEXT NOT NULL,
+          booker_email TEXT NOT NULL,
+          status TEXT NOT NULL, -- active|cancelled_by_owner|cancelled_by_booker
+          created_at TEXT NOT NULL,
+          cancelled_at TEXT,
+          cancel_reason TEXT,
+          manage_token TEXT NOT NULL,
+          UNIQUE(spot_id, day),
+          FOREIGN KEY(spot_id) REFERENCES spots(id) ON DELETE CASCADE
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_offers_day ON offers(day);
+        CREATE INDEX IF NOT EXISTS idx_bookings_day ON bookings(day);
+        CREATE INDEX IF NOT EXISTS idx_bookings_email ON bookings(booker_email);
+        """
+    ):
+        con.execute(stmt)
+
+    # Backward-compatibility migration for existing databases (pre-lot column).
+    cols = [r[1] for r in con.execute("PRAGMA table_info(spots)").fetchall()]
+    if "lot" not in cols:
+        con.execute("ALTER TABLE spots ADD COLUMN lot TEXT NOT NULL DEFAULT 'bank'")
+
+    con.execute("UPDATE spots SET lot='bank' WHERE lot IS NULL OR lot=''")
+    con.execute("CREATE INDEX IF NOT EXISTS idx_spots_lot ON spots(lot)")
+
+
+def _stats_upsert(table: str, key_cols: str, key_vals: str, offers: str, active: str, cancelled: str) -> str:
+    return f"""
+      INSERT INTO {table}({key_cols}, offers, active, cancelled)
+      VALUES({key_vals}, {offers}, {active}, {cancelled})
+      ON CONFLICT({key_cols}) DO UPDATE SET
+        offers=offers+excluded.offers,
+        active=active+excluded.active,
+        cancelled=cancelled+excluded.cancelled;"""
+
+
+def _stats_delta(rec: str, sign: int, offer: bool) -> str:
+    """Upserts into day_stats and lot_stats for one offers/bookings row (NEW or OLD)."""
+    lot = f"(SELECT lot FROM spots WHERE id={rec}.spot_id)"
+    if offer:
+        deltas = (str(sign), "0", "0")
+    else:
+        deltas = (
+            "0",
+            f"{sign} * ({rec}.status='active')",
+            f"{sign} * ({rec}.status<>'active')",
+        )
+    return _stats_upsert("day_stats", "day, lot", f"{rec}.day, {lot}", *deltas) + _stats_upsert(
+        "lot_stats", "lot", lot, *deltas
+    )
+
+
+def _day_stats(con: sqlite3.Connection) -> None:
+    # Counters kept current by triggers, so the admin diagnostics read a few rows per day
+    # instead of counting the offers/bookings tables.
+    script = f"""
+    CREATE TABLE IF NOT EXISTS day_stats (
+      day TEXT NOT NULL,
+      lot TEXT NOT NULL,
+      offers INTEGER NOT NULL DEFAULT 0,
+      active INTEGER NOT NULL DEFAULT 0,     -- active bookings
+      cancelled INTEGER NOT NULL DEFAULT 0,  -- cancelled bookings (owner or booker)
+      PRIMARY KEY(day, lot)
+    ) WITHOUT ROWID;
+
+    CREATE TABLE IF NOT EXISTS lot_stats (
+      lot TEXT PRIMARY KEY,
+      offers INTEGER NOT NULL DEFAULT 0,
+      active INTEGER NOT NULL DEFAULT 0,
+      cancelled INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID;
+
+    CREATE TRIGGER IF NOT EXISTS trg_offers_stats_ins AFTER INSERT ON offers BEGIN
+      {_stats_delta("NEW", 1, offer=True)}
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_offers_stats_del AFTER DELETE ON offers BEGIN
+      {_stats_delta("OLD", -1, offer=True)}
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_bookings_stats_ins AFTER INSERT ON bookings BEGIN
+      {_stats_delta("NEW", 1, offer=False)}
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_bookings_stats_del AFTER DELETE ON bookings BEGIN
+      {_stats_delta("OLD", -1, offer=False)}
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_bookings_stats_upd AFTER UPDATE OF status, day, spot_id ON bookings
+    WHEN OLD.status IS NOT NEW.status OR OLD.day IS NOT NEW.day OR OLD.spot_id IS NOT NEW.spot_id
+    BEGIN
+      {_stats_delta("OLD", -1, offer=False)}
+      {_stats_delta("NEW", 1, offer=False)}
+    END;
+
+    DELETE FROM day_stats;
+    INSERT INTO day_stats(day, lot, offers, active, cancelled)
+    SELECT day, lot, SUM(o), SUM(a), SUM(c) FROM (
+      SELECT o.day AS day, s.lot AS lot, 1 AS o, 0 AS a, 0 AS c
+      FROM offers o JOIN spots s ON s.id=o.spot_id
+      UNION ALL
+      SELECT b.day, s.lot, 0, b.status='active', b.status<>'active'
+      FROM bookings b JOIN spots s ON s.id=b.spot_id
+    )
+    GROUP BY day, lot;
+
+    DELETE FROM lot_stats;
+    INSERT INTO lot_stats(lot, offers, active, cancelled)
+    SELECT lot, SUM(offers), SUM(active), SUM(cancelled) FROM day_stats GROUP BY lot;
+    """
+    for stmt in _statements(script):
+        con.execute(stmt)
+
+
+MIGRATIONS: list[tuple[int, str, Step]] = [
+    (1, "initial schema", _initial),
+    (
+        2,
+        "booking indexes",
+        """
+        -- /manage/{token}, /download, /cancel look bookings up by token.
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_bookings_manage_token ON bookings(manage_token);
+        -- withdraw paths and series checks: one spot, active bookings, day range.
+        CREATE INDEX IF NOT EXISTS idx_bookings_spot_status_day ON bookings(spot_id, status, day);
+        -- per-day active counts (admin diag); supersedes idx_bookings_day.
+        CREATE INDEX IF NOT EXISTS idx_bookings_day_status ON bookings(day, status);
+        DROP INDEX IF EXISTS idx_bookings_day;
+        """,
+    ),
+    (3, "per-day statistics", _day_stats),
+    (
+        4,
+        "change log",
+        """
+        -- Cross-worker invalidation: every worker tails this log (see versions.sync).
+        CREATE TABLE IF NOT EXISTS change_log (
+          seq INTEGER PRIMARY KEY AUTOINCREMENT,
+          topic TEXT NOT NULL,  -- day|spots|<app topic>
+          key TEXT              -- e.g. YYYY-MM-DD for topic day
+        );
+
+        CREATE TRIGGER IF NOT EXISTS trg_offers_log_ins AFTER INSERT ON offers BEGIN
+          INSERT INTO change_log(topic, key) VALUES('day', NEW.day);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_offers_log_del AFTER DELETE ON offers BEGIN
+          INSERT INTO change_log(topic, key) VALUES('day', OLD.day);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_bookings_log_ins AFTER INSERT ON bookings BEGIN
+          INSERT INTO change_log(topic, key) VALUES('day', NEW.day);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_bookings_log_del AFTER DELETE ON bookings BEGIN
+          INSERT INTO change_log(topic, key) VALUES('day', OLD.day);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_bookings_log_upd AFTER UPDATE ON bookings BEGIN
+          INSERT INTO change_log(topic, key) VALUES('day', NEW.day);
+          INSERT INTO change_log(topic, key) SELECT 'day', OLD.day WHERE OLD.day IS NOT NEW.day;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_spots_log_ins AFTER INSERT ON spots BEGIN
+          INSERT INTO change_log(topic, key) VALUES('spots', NULL);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_spots_log_upd AFTER UPDATE ON spots BEGIN
+          INSERT INTO change_log(topic, key) VALUES('spots', NULL);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_spots_log_del AFTER DELETE ON spots BEGIN
+          INSERT INTO change_log(topic, key) VALUES('spots', NULL);
+        END;
+        """,
+    ),
+    (
+        5,
+        "change log by key",
+        """
+        -- Latest change per day range (ETags of /api/availability).
+        CREATE INDEX IF NOT EXISTS idx_change_log_topic_key ON change_log(topic, key);
+        """,
+    ),
+    (
+        6,
+        "plan labels",
+        """
+        -- Numbered points on a lot's site plan (formerly data/plan_labels.json).
+        CREATE TABLE IF NOT EXISTS plan_labels (
+          lot TEXT NOT NULL,
+          n INTEGER NOT NULL,
+          x INTEGER NOT NULL,
+          y INTEGER NOT NULL,
+          PRIMARY KEY (lot, n)
+        ) WITHOUT ROWID;
+
+        -- Bumped by every change of a lot's labels; rendered plans are keyed on it.
+        -- A row also records that the lot's labels live here (no JSON import any more).
+        CREATE TABLE IF NOT EXISTS plan_label_versions (
+          lot TEXT PRIMARY KEY,
+          version INTEGER NOT NULL,
+          updated_at REAL NOT NULL  -- unix time, Last-Modified of the annotated plan
+        ) WITHOUT ROWID;
+        """,
+    ),
+    (
+        7,
+        "archive cutoff",
+        """
+        -- Offers/bookings of days before cutoff have been moved to the archive
+        -- database (see archive.py); '' = nothing archived yet.
+        -- moving is set only inside archive._move's transaction: deleting archived
+        -- days does not touch anything a worker caches, so those deletes are not logged.
+        CREATE TABLE IF NOT EXISTS archive_state (
+          id INTEGER PRIMARY KEY CHECK (id = 1),
+          cutoff TEXT NOT NULL,
+          moving INTEGER NOT NULL DEFAULT 0
+        );
+        INSERT OR IGNORE INTO archive_state(id, cutoff) VALUES(1, '');
+
+        DROP TRIGGER IF EXISTS trg_offers_log_del;
+        CREATE TRIGGER trg_offers_log_del AFTER DELETE ON offers
+        WHEN NOT EXISTS (SELECT 1 FROM archive_state WHERE moving)
+        BEGIN
+          INSERT INTO change_log(topic, key) VALUES('day', OLD.day);
+        END;
+
+        DROP TRIGGER IF EXISTS trg_bookings_log_del;
+        CREATE TRIGGER trg_bookings_log_del AFTER DELETE ON bookings
+        WHEN NOT EXISTS (SELECT 1 FROM archive_state WHERE moving)
+        BEGIN
+          INSERT INTO change_log(topic, key) VALUES('day', OLD.day);
+        END;
+        """,
+    ),
+    (
+        8,
+        "notification outbox",
+        """
+        -- Mails queued with the change they report, delivered in the background (outbox.py).
+        CREATE TABLE IF NOT EXISTS outbox (
+          id INTEGER PRIMARY KEY,
+          dedupe_key TEXT NOT NULL UNIQUE,  -- e.g. cancel:<booking id>:<cancelled_at>
+          recipient TEXT NOT NULL,
+          subject TEXT NOT NULL,
+          body TEXT NOT NULL,
+          status TEXT NOT NULL DEFAULT 'pending',  -- pending|sent|failed
+          attempts INTEGER NOT NULL DEFAULT 0,
+          next_attempt_at REAL NOT NULL DEFAULT 0,  -- unix time; claims move it ahead
+          created_at TEXT NOT NULL,
+          sent_at TEXT,
+          last_error TEXT
+        );
+        -- The delivery worker's poll: due pending rows, oldest first.
+        CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox(status, next_attempt_at);
+        -- Pruning of old sent/failed rows.
+        CREATE INDEX IF NOT EXISTS idx_outbox_status_created ON outbox(status, created_at);
+        """,
+    ),
+    (
+        9,
+        "days table",
+        """
+        -- Calendar dimension (filled by berlin.ensure_days); range queries join it
+        -- to select weekdays instead of computing them per row.
+        CREATE TABLE IF NOT EXISTS days (
+          day TEXT PRIMARY KEY,      -- YYYY-MM-DD
+          weekday INTEGER NOT NULL,  -- 0=Mon..6=Sun (as date.weekday())
+          iso_year INTEGER NOT NULL,
+          iso_week INTEGER NOT NULL,
+          holiday TEXT               -- public holiday (berlin.holidays), NULL otherwise
+        ) WITHOUT ROWID;
+        """,
+    ),
+]
+
+LATEST = MIGRATIONS[-1][0]
+
+
+def current_version(con: sqlite3.Connection) -> int:
+    return con.execute("PRAGMA user_version").fetchone()[0]
+
+
+def apply_migrations(con: sqlite3.Connection) -> int:
+    """Apply pending migrations; returns the schema version afterwards."""
+    current = current_version(con)
+    if current >= LATEST:
+        return current
+
+    if con.in_transaction:
+        con.commit()
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_version (
+          version INTEGER PRIMARY KEY,
+          name TEXT NOT NULL,
+          applied_at TEXT -- NULL: applied before versions were recorded
+        )
+        """
+    )
+    # Databases versioned via user_version only: record what they already have.
+    con.executemany(
+        "INSERT OR IGNORE INTO schema_version(version, name, applied_at) VALUES(?, ?, NULL)",
+        [(v, name) for v, name, _ in MIGRATIONS if v <= current],
+    )
+    con.commit()
+
+    for version, name, step in MIGRATIONS:
+        if version <= current:
+            continue
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            # Another worker may have migrated while we waited for the lock.
+            if current_version(con) >= version:
+                con.rollback()
+                current = current_version(con)
+                continue
+            if callable(step):
+                step(con)
+            else:
+                for stmt in _statements(step):
+                    con.execute(stmt)
+            con.execute(
+                "INSERT OR REPLACE INTO schema_version(version, name, applied_at) VALUES(?, ?, ?)",
+                (version, name, datetime.utcnow().replace(microsecond=0).isoformat() + "Z"),
+            )
+            con.execute(f"PRAGMA user_version = {version}")
+        except BaseException:
+            con.rollback()
+            raise
+        con.commit()
+        current = version
+    return current
@@ -0,0 +1,346 @@
+"""Durable outbox for notification mails.
+
+Request handlers never talk to a mail server. They insert outbox rows inside the
+transaction of the change the mail reports, e.g. one INSERT ... SELECT for all
+bookings an owner withdrawal cancels, and return. A background thread per worker
+delivers them:
+
+  1. claim up to BATCH_SIZE due rows in one UPDATE ... RETURNING; the claim moves
+     next_attempt_at LEASE_S ahead, so other workers skip those rows
+  2. send them over one SMTP connection, kept open while there is work
+  3. record the outcome: sent, retry after BACKOFF_S[attempt], or failed
+
+dedupe_key (UNIQUE, INSERT OR IGNORE) keeps a notification from being queued twice.
+Delivery is at least once: a worker dying between sending and recording resends
+after the lease, with the same Message-ID.
+
+Mail is opt-in per booking: only bookings with a booker_email get any, anonymous
+bookings (the default) never do. Without secrets/smtp.json the worker does not
+run and rows wait until it does.
+
+    python -m parking_app.app.outbox            # counts per status
+    python -m parking_app.app.outbox --send     # deliver everything due now
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import re
+import smtplib
+import sqlite3
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Optional
+
+from . import berlin, db
+from .emailer import SmtpConfig, SmtpSender, build_message, load_config
+from .owners import spot_label
+
+BATCH_SIZE = 50
+POLL_S = 2.0  # how often an idle worker looks for due rows
+LEASE_S = 300.0  # a claimed row is due again after this if its worker never reports back
+IDLE_CLOSE_S = 30.0  # SMTP connection kept open this long without work
+BACKOFF_S = (60, 300, 1800, 7200, 21600)  # before attempt 2, 3, ...
+MAX_ATTEMPTS = len(BACKOFF_S) + 1
+KEEP_DAYS = 30  # sent/failed rows are kept this long (dedupe, diagnosis)
+PRUNE_EVERY_S = 3600.0
+STOP_TIMEOUT_S = 10.0
+
+SECRETS_DIR = Path(__file__).resolve().parents[1] / "secrets"
+
+log = logging.getLogger("parking_app.mail")
+
+_EMAIL_RE = re.compile(r"[^@\s]+@[^@\s]+\.[^@\s]+")
+
+# printf() templates, filled in SQL for set-based enqueues.
+CANCEL_SUBJECT = "Parkplatz %s am %s storniert"
+CANCEL_BODY = """Hallo,
+
+deine Buchung für Parkplatz %s am %s wurde vom Besitzer storniert.
+Grund: %s
+
+Buchungsdetails: %s/manage/%s
+
+Parkplatz-Share
+"""
+
+BOOKED_SUBJECT = "Parkplatz {label}: Buchung bestätigt"
+BOOKED_BODY = """Hallo,
+
+du hast Parkplatz {label} gebucht:
+
+{days}
+
+Über den Link kannst du die Buchung ansehen und stornieren. Storniert der Besitzer,
+bekommst du eine Nachricht an diese Adresse.
+
+Parkplatz-Share
+"""
+
+# The rows just cancelled by one owner action: same spot, same cancelled_at.
+CANCEL_SQL = """
+INSERT OR IGNORE INTO outbox(dedupe_key, recipient, subject, body, created_at)
+SELECT 'cancel:' || id || ':' || cancelled_at, booker_email,
+       printf(?, ?, day), printf(?, ?, day, cancel_reason, ?, manage_token), ?
+FROM bookings
+WHERE spot_id=? AND status='cancelled_by_owner' AND day BETWEEN ? AND ?
+  AND cancelled_at=? AND booker_email <> ''
+"""
+
+CLAIM_SQL = """
+UPDATE outbox SET attempts=attempts + 1, next_attempt_at=?
+WHERE id IN (
+  SELECT id FROM outbox WHERE status='pending' AND next_attempt_at <= ?
+  ORDER BY next_attempt_at LIMIT ?
+)
+RETURNING id, dedupe_key, recipient, subject, body, attempts
+"""
+
+
+def parse_email(value: str) -> Optional[str]:
+    """Opt-in address from a form: '' stays anonymous, None if it is no address."""
+    value = (value or "").strip()
+    if not value:
+        return ""
+    if len(value) > 254 or not _EMAIL_RE.fullmatch(value):
+        return None
+    return value
+
+
+def enqueue(con: sqlite3.Connection, dedupe_key: str, to: str, subject: str, body: str, created_at: str) -> bool:
+    """Queue one mail in the caller's transaction; False if the key was queued before."""
+    cur = con.execute(
+        "INSERT OR IGNORE INTO outbox(dedupe_key, recipient, subject, body, created_at) VALUES(?, ?, ?, ?, ?)",
+        (dedupe_key, to, subject, body, created_at),
+    )
+    return cur.rowcount == 1
+
+
+def enqueue_confirmation(
+    con: sqlite3.Connection, to: str, label: str, booked: list[tuple[str, str]], base_url: str, created_at: str
+) -> bool:
+    """One mail listing the (day, manage_token) pairs of a booking or series."""
+    if not booked:
+        return False
+    days = "\n".join(f"  {day}: {base_url}/manage/{token}" for day, token in booked)
+    return enqueue(
+        con,
+        f"booked:{booked[0][1]}",
+        to,
+        BOOKED_SUBJECT.format(label=label),
+        BOOKED_BODY.format(label=label, days=days),
+        created_at,
+    )
+
+
+def enqueue_cancellations(
+    con: sqlite3.Connection, spot_id: int, lo: str, hi: str, cancelled_at: str, base_url: str
+) -> int:
+    """Queue a mail for every opted-in booking of the spot cancelled at cancelled_at
+    within [lo, hi]; one statement in the caller's transaction."""
+    spot = con.execute("SELECT name, lot FROM spots WHERE id=?", (spot_id,)).fetchone()
+    if spot is None:
+        return 0
+    label = spot_label(spot["lot"], spot["name"])
+    return con.execute(
+        CANCEL_SQL,
+        (CANCEL_SUBJECT, label, CANCEL_BODY, label, base_url, cancelled_at, spot_id, lo, hi, cancelled_at),
+    ).rowcount
+
+
+# --- Delivery -----------------------------------------------------------------------
+
+
+@dataclass
+class DeliveryResult:
+    sent: int = 0
+    retried: int = 0
+    failed: int = 0
+
+    @property
+    def claimed(self) -> int:
+        return self.sent + self.retried + self.failed
+
+
+def _permanent(e: Exception) -> bool:
+    """Errors a retry will not fix (the server rejected the address or message)."""
+    if isinstance(e, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in e.recipients.values())
+    return isinstance(e, smtplib.SMTPDataError) and e.smtp_code >= 500
+
+
+def _connection_lost(e: Exception) -> bool:
+    """No usable session (SMTPException derives from OSError, hence the order)."""
+    if isinstance(e, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, smtplib.SMTPAuthenticationError)):
+        return True
+    return isinstance(e, OSError) and not isinstance(e, smtplib.SMTPException)
+
+
+def deliver_due(con: sqlite3.Connection, sender: SmtpSender, now: Optional[float] = None, limit: int = BATCH_SIZE) -> DeliveryResult:
+    """Claim, send and record one batch of due mails."""
+    now = time.time() if now is None else now
+    with db.immediate(con):
+        batch = con.execute(CLAIM_SQL, (now + LEASE_S, now, limit)).fetchall()
+    res = DeliveryResult()
+    if not batch:
+        return res
+
+    sent: list[tuple[str, int]] = []
+    retry: list[tuple[float, str, int]] = []
+    failed: list[tuple[str, int]] = []
+    error: Optional[Exception] = None
+    for row in batch:
+        if error is None:
+            try:
+                sender.send(build_message(sender.cfg, row["dedupe_key"], row["recipient"], row["subject"], row["body"]))
+                sent.append((datetime.utcnow().replace(microsecond=0).isoformat() + "Z", row["id"]))
+                continue
+            except Exception as e:
+                if _connection_lost(e):
+                    # The server is gone for this batch: the rest waits for the backoff too.
+                    sender.close()
+                    error = e
+                elif _permanent(e):
+                    failed.append((repr(e)[:500], row["id"]))
+                    continue
+                else:
+                    log.warning("mail %s failed: %r", row["id"], e)
+                    _retry_or_fail(row, repr(e), now, retry, failed)
+                    continue
+        _retry_or_fail(row, repr(error), now, retry, failed)
+    if error is not None:
+        log.warning("smtp unavailable, %d mails postponed: %r", len(batch) - len(sent), error)
+
+    with db.immediate(con):
+        con.executemany("UPDATE outbox SET status='sent', sent_at=?, last_error=NULL WHERE id=?", sent)
+        con.executemany("UPDATE outbox SET next_attempt_at=?, last_error=? WHERE id=?", retry)
+        con.executemany("UPDATE outbox SET status='failed', last_error=? WHERE id=?", failed)
+    res.sent, res.retried, res.failed = len(sent), len(retry), len(failed)
+    return res
+
+
+def _retry_or_fail(row: sqlite3.Row, error: str, now: float, retry: list, failed: list) -> None:
+    if row["attempts"] >= MAX_ATTEMPTS:
+        failed.append((error[:500], row["id"]))
+    else:
+        retry.append((now + BACKOFF_S[row["attempts"] - 1], error[:500], row["id"]))
+
+
+def prune(con: sqlite3.Connection, keep_days: int = KEEP_DAYS, today: Optional[date] = None) -> int:
+    """Drop sent and failed rows older than keep_days."""
+    before = ((today or berlin.today()) - timedelta(days=keep_days)).isoformat()
+    with db.immediate(con):
+        return con.execute("DELETE FROM outbox WHERE status IN ('sent', 'failed') AND created_at < ?", (before,)).rowcount
+
+
+def counts(con: sqlite3.Connection) -> dict[str, int]:
+    return {r[0]: r[1] for r in con.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status")}
+
+
+# --- Background worker --------------------------------------------------------------
+
+
+class Deliverer:
+    """The delivery thread of one worker process (own connection, own SMTP session)."""
+
+    def __init__(self, cfg: SmtpConfig, poll_s: float = POLL_S) -> None:
+        self.sender = SmtpSender(cfg)
+        self.poll_s = poll_s
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="outbox", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join(timeout=STOP_TIMEOUT_S)
+
+    def _run(self) -> None:
+        con = db.open_connection()
+        last_work = time.monotonic()
+        last_prune = 0.0
+        try:
+            while not self._stop.is_set():
+                try:
+                    res = deliver_due(con, self.sender)
+                    if time.monotonic() - last_prune >= PRUNE_EVERY_S:
+                        prune(con)
+                        last_prune = time.monotonic()
+                except Exception:
+                    log.exception("outbox delivery failed")
+                    res = DeliveryResult()
+                if res.claimed:
+                    last_work = time.monotonic()
+                    if res.claimed == BATCH_SIZE:
+                        continue  # more may be due right away
+                elif self.sender.connected and time.monotonic() - last_work >= IDLE_CLOSE_S:
+                    self.sender.close()
+                self._stop.wait(self.poll_s)
+        finally:
+            self.sender.close()
+            con.close()
+
+
+_deliverer: Optional[Deliverer] = None
+
+
+def start(secrets_dir: Path = SECRETS_DIR) -> bool:
+    """Start this worker's delivery thread; False (mail stays queued) without smtp.json."""
+    global _deliverer
+    if _deliverer is not None:
+        return True
+    cfg = load_config(secrets_dir)
+    if cfg is None:
+        return False
+    _deliverer = Deliverer(cfg)
+    _deliverer.start()
+    return True
+
+
+def stop() -> None:
+    global _deliverer
+    if _deliverer is not None:
+        _deliverer.stop()
+        _deliverer = None
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m parking_app.app.outbox", description=__doc__.splitlines()[0])
+    ap.add_argument("--send", action="store_true", help="deliver all mails due now, then exit")
+    ap.add_argument("--secrets", type=Path, default=SECRETS_DIR, help="directory with smtp.json")
+    args = ap.parse_args(argv)
+
+    db.migrate()
+    con = db.open_connection()
+    try:
+        if args.send:
+            cfg = load_config(args.secrets)
+            if cfg is None:
+                print(f"no {args.secrets / 'smtp.json'}, nothing sent", file=sys.stderr)
+                return 1
+            sender = SmtpSender(cfg)
+            total = DeliveryResult()
+            try:
+                while True:
+                    res = deliver_due(con, sender)
+                    total.sent += res.sent
+                    total.retried += res.retried
+                    total.failed += res.failed
+                    if res.claimed < BATCH_SIZE:
+                        break
+            finally:
+                sender.close()
+            print(f"sent {total.sent}, retry later {total.retried}, failed {total.failed}")
+        print(" ".join(f"{k}={v}" for k, v in sorted(counts(con).items())) or "outbox empty")
+    finally:
+        con.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
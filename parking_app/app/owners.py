@@ -48,6 +48,17 @@ def is_post_spot(name: str) -> bool:
     return name.startswith("PP::") or name.startswith("PP")
 
 
+def spot_label(lot: str, name: str) -> str:
+    """Name as shown on the signs: PP::X -> X, PP12 -> P12 (post), P12 -> BP12 (bank)."""
+    if lot == "post" and name.startswith("PP::"):
+        return name[4:]
+    if lot == "post" and name.startswith("PP"):
+        return "P" + name[2:]
+    if lot == "bank" and name.startswith("P"):
+        return "BP" + name[1:]
+    return name
+
+
 def _new_code(used: set[str]) -> str:
     code = None
     while code is None or code in used:
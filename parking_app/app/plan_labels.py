@@ -1,13 +1,31 @@
 from __future__ import annotations
 
+import argparse
+import hashlib
+import io
 import json
+import logging
+import multiprocessing
+import os
 import secrets
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable, Optional, TypeVar
 
 from PIL import Image, ImageDraw, ImageFont
 
+from . import metrics, versions
+from .db import connect, immediate, migrate
+
+log = logging.getLogger("parking_app.plan")
+
 BASE_DIR = Path(__file__).resolve().parents[1]
 PLAN_DIR = BASE_DIR / "plan"
 DATA_DIR = BASE_DIR / "data"
@@ -31,20 +49,222 @@ def ensure_admin_token() -> str:
     return token
 
 
-def load_labels() -> list[dict[str, Any]]:
+# --- Label store -----------------------------------------------------------------
+# One row per numbered point in plan_labels, so adding, moving or removing a point is
+# a single-row write in the caller's transaction. Every change bumps the lot's row in
+# plan_label_versions and publishes LABELS_TOPIC on the versions bus; each worker
+# keeps a lot's labels in memory until that happens. Rendered plans are keyed on the
+# version.
+
+LABELS_TOPIC = "labels"
+MAX_BATCH = 500  # points per batch request
+
+ADD_SQL = """
+INSERT INTO plan_labels(lot, n, x, y)
+SELECT ?, COALESCE(MAX(n), 0) + 1, ?, ? FROM plan_labels WHERE lot=?
+RETURNING n, x, y
+"""
+
+
+@dataclass(frozen=True)
+class LabelSet:
+    version: int  # 0: no labels stored for the lot yet
+    updated_at: float  # unix time of the last change
+    labels: list[dict[str, int]]  # {"n", "x", "y"} ordered by n; shared, do not modify
+
+
+_label_sets: dict[str, LabelSet] = {}
+_label_lock = threading.Lock()
+_label_gen = 0
+
+
+def _labels_changed(lot: Optional[str]) -> None:
+    global _label_gen
+    with _label_lock:
+        _label_gen += 1
+        if lot is None:
+            _label_sets.clear()
+        else:
+            _label_sets.pop(lot, None)
+
+
+versions.subscribe(LABELS_TOPIC, _labels_changed)
+versions.subscribe("*", _labels_changed)
+
+
+def label_set(lot: str = "bank") -> LabelSet:
+    """Current labels of a lot (from memory unless they changed in any worker)."""
+    versions.sync()
+    cached = _label_sets.get(lot)
+    if cached is not None:
+        return cached
+    gen = _label_gen
+    with connect() as con:
+        # One statement: version and points come from the same snapshot.
+        rows = con.execute(
+            """
+            SELECT v.version, v.updated_at, l.n, l.x, l.y
+            FROM plan_label_versions v
+            LEFT JOIN plan_labels l ON l.lot=v.lot
+            WHERE v.lot=?
+            ORDER BY l.n
+            """,
+            (lot,),
+        ).fetchall()
+    if rows:
+        labels = LabelSet(
+            rows[0]["version"],
+            rows[0]["updated_at"],
+            [{"n": r["n"], "x": r["x"], "y": r["y"]} for r in rows if r["n"] is not None],
+        )
+    else:
+        labels = LabelSet(0, 0.0, [])
+    with _label_lock:
+        if gen == _label_gen:  # no change arrived while we were reading
+            _label_sets[lot] = labels
+    return labels
+
+
+def load_labels(lot: str = "bank") -> list[dict[str, int]]:
+    return label_set(lot).labels
+
+
+def _bump(con: sqlite3.Connection, lot: str) -> int:
+    version = con.execute(
+        """
+        INSERT INTO plan_label_versions(lot, version, updated_at) VALUES(?, 1, ?)
+        ON CONFLICT(lot) DO UPDATE SET version=version+1, updated_at=excluded.updated_at
+        RETURNING version
+        """,
+        (lot, time.time()),
+    ).fetchone()[0]
+    versions.publish(con, LABELS_TOPIC, lot)
+    return version
+
+
+def stored_version(con: sqlite3.Connection, lot: str) -> int:
+    row = con.execute("SELECT version FROM plan_label_versions WHERE lot=?", (lot,)).fetchone()
+    return row[0] if row else 0
+
+
+def add_labels(con: sqlite3.Connection, lot: str, points: list[tuple[int, int]]) -> tuple[int, list[dict[str, int]]]:
+    """Append points with the next numbers; returns (version, added labels)."""
+    added = []
+    for x, y in points:
+        n, x, y = con.execute(ADD_SQL, (lot, x, y, lot)).fetchone()
+        added.append({"n": n, "x": x, "y": y})
+    return (_bump(con, lot) if added else stored_version(con, lot)), added
+
+
+def undo_label(con: sqlite3.Connection, lot: str) -> tuple[int, Optional[int]]:
+    """Remove the highest-numbered point; returns (version, its number or None)."""
+    row = con.execute(
+        "DELETE FROM plan_labels WHERE lot=? AND n=(SELECT MAX(n) FROM plan_labels WHERE lot=?) RETURNING n",
+        (lot, lot),
+    ).fetchone()
+    if row is None:
+        return stored_version(con, lot), None
+    return _bump(con, lot), row[0]
+
+
+def move_label(con: sqlite3.Connection, lot: str, n: int, x: int, y: int) -> Optional[int]:
+    """Move point n; returns the new version, None if there is no such point."""
+    cur = con.execute("UPDATE plan_labels SET x=?, y=? WHERE lot=? AND n=?", (x, y, lot, n))
+    return _bump(con, lot) if cur.rowcount else None
+
+
+def reset_labels(con: sqlite3.Connection, lot: str) -> int:
+    con.execute("DELETE FROM plan_labels WHERE lot=?", (lot,))
+    return _bump(con, lot)
+
+
+def replace_labels(con: sqlite3.Connection, lot: str, labels: list[dict[str, Any]]) -> int:
+    """Replace all points of a lot, keeping their numbers (plan_labels.json import)."""
+    con.execute("DELETE FROM plan_labels WHERE lot=?", (lot,))
+    con.executemany(
+        "INSERT INTO plan_labels(lot, n, x, y) VALUES(?, ?, ?, ?)",
+        [(lot, int(lab["n"]), int(lab["x"]), int(lab["y"])) for lab in labels],
+    )
+    return _bump(con, lot)
+
+
+def read_labels_json(path: Path) -> list[dict[str, Any]]:
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def import_legacy_labels(lot: str = "bank") -> int:
+    """Import LABELS_PATH once, for a lot whose labels were never stored; returns the count.
+
+    Called at startup. Once the lot has a version row (any edit, reset or import)
+    the JSON file is ignored. An unreadable or malformed file is logged and skipped
+    like a missing one: the app must still start.
+    """
     if not LABELS_PATH.exists():
-        return []
-    return json.loads(LABELS_PATH.read_text(encoding="utf-8"))
+        return 0
+    try:
+        labels = read_labels_json(LABELS_PATH)
+        with connect() as con:
+            with immediate(con):
+                if con.execute("SELECT 1 FROM plan_label_versions WHERE lot=?", (lot,)).fetchone():
+                    return 0
+                replace_labels(con, lot, labels)
+    except (OSError, ValueError, KeyError, TypeError, sqlite3.IntegrityError) as e:  # JSONDecodeError is a ValueError
+        log.warning("%s not imported: %r", LABELS_PATH, e)
+        return 0
+    return len(labels)
+
+
+# --- Render processes ---------------------------------------------------------------
+# PIL work that takes tens to hundreds of milliseconds runs in a small process pool
+# so it neither holds the GIL for request threads nor blocks the event loop. The
+# job functions only take small picklable arguments (paths, labels, rings); large
+# images are loaded inside the render process.
+
+RENDER_PROCESSES = max(1, min(2, (os.cpu_count() or 1) - 1))
+_render_pool: Optional[ProcessPoolExecutor] = None
+
+T = TypeVar("T")
+
+
+def start_render_pool(processes: int = RENDER_PROCESSES) -> None:
+    global _render_pool
+    if _render_pool is None:
+        # spawn: never fork a process that holds sqlite connections and locks
+        _render_pool = ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context("spawn"))
+        # Start the processes (and their PIL imports) now, not on the first render.
+        for _ in range(processes):
+            _render_pool.submit(_warm)
+
 
+def _warm() -> None:
+    pass
 
-def save_labels(labels: list[dict[str, Any]]) -> None:
-    DATA_DIR.mkdir(parents=True, exist_ok=True)
-    LABELS_PATH.write_text(json.dumps(labels, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
 
+def stop_render_pool() -> None:
+    global _render_pool
+    if _render_pool is not None:
+        _render_pool.shutdown(wait=True)
+        _render_pool = None
 
-def render_annotated(out_path: Path) -> None:
-    labels = load_labels()
-    img = Image.open(PLAN_IMAGE).convert("RGBA")
+
+def _offload(fn: Callable[..., T], *args: Any) -> T:
+    """Run fn(*args) in the render pool (inline when no pool is running)."""
+    pool = _render_pool
+    if pool is None:
+        return fn(*args)
+    try:
+        return pool.submit(fn, *args).result()
+    except BrokenProcessPool:
+        return fn(*args)
+
+
+@metrics.timed_render("annotated")
+def _render_png(labels: list[dict[str, Any]]) -> bytes:
+    return _offload(_draw_annotated, str(PLAN_IMAGE), labels)
+
+
+def _draw_annotated(plan_image: str, labels: list[dict[str, Any]]) -> bytes:
+    img = Image.open(plan_image).convert("RGBA")
     draw = ImageDraw.Draw(img)
 
     # Use a default font; PIL will fall back.
@@ -66,5 +286,348 @@ def render_annotated(out_path: Path) -> None:
         th = bbox[3] - bbox[1]
         draw.text((x - tw / 2, y - th / 2 - 1), n, fill=(0, 0, 0, 255), font=font)
 
-    out_path.parent.mkdir(parents=True, exist_ok=True)
-    img.convert("RGB").save(out_path, format="PNG")
+    buf = io.BytesIO()
+    img.convert("RGB").save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=path.name + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+@dataclass(frozen=True)
+class AnnotatedPlan:
+    version: str  # short hash of the sources; doubles as ETag value
+    png: bytes
+    mtime: float  # newest source mtime (Last-Modified)
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.version}"'
+
+
+_annotated: AnnotatedPlan | None = None
+_render_lock = threading.Lock()
+
+
+def _sources() -> tuple[tuple[int, int], LabelSet]:
+    plan = PLAN_IMAGE.stat()
+    return (plan.st_mtime_ns, plan.st_size), label_set("bank")
+
+
+def _version(plan_key: tuple[int, int], labels: LabelSet) -> str:
+    return hashlib.sha256(repr((plan_key, labels.version)).encode()).hexdigest()[:16]
+
+
+def plan_version() -> str:
+    """Version of the annotated plan, derived from plan-1.png and the label version (no render)."""
+    return _version(*_sources())
+
+
+def annotated_plan(out_path: Path) -> AnnotatedPlan:
+    """Annotated plan, rendered only when plan-1.png or the labels changed.
+
+    Concurrent callers wait for a single render. The PNG is also written to out_path
+    (atomically, with a version sidecar) so restarted/other workers can reuse it.
+    """
+    global _annotated
+    plan_key, labels = _sources()
+    version = _version(plan_key, labels)
+    cached = _annotated
+    if cached is not None and cached.version == version:
+        return cached
+
+    with _render_lock:
+        cached = _annotated
+        if cached is not None and cached.version == version:
+            return cached
+
+        stamp = out_path.with_name(out_path.name + ".version")
+        png = None
+        try:
+            if stamp.read_text(encoding="utf-8").strip() == version:
+                png = out_path.read_bytes()
+        except OSError:
+            pass
+        if png is None:
+            png = _render_png(labels.labels)
+            _write_atomic(out_path, png)
+            _write_atomic(stamp, (version + "\n").encode())
+
+        mtime = max(plan_key[0] / 1e9, labels.updated_at)
+        _annotated = AnnotatedPlan(version=version, png=png, mtime=mtime)
+        return _annotated
+
+
+# --- Tiled, multi-resolution plan images -------------------------------------------
+
+TILE_SIZE = 512
+# Level z=0 is the smallest; the last level is full resolution.
+LEVEL_SCALES = (0.125, 0.25, 0.5, 1.0)
+TILE_FORMATS = {"webp": "image/webp", "png": "image/png"}
+
+
+def post_plan_path() -> Path | None:
+    candidates = [
+        BASE_DIR / "plan" / "Plan_Postparkplatz.png",
+        BASE_DIR / "Plan" / "Plan_Postparkplatz.png",
+        BASE_DIR / "static" / "Plan_Postparkplatz.png",
+        BASE_DIR / "Plan_Postparkplatz.png",
+    ]
+    for p in candidates:
+        if p.exists():
+            return p
+    return None
+
+
+class PlanPyramid:
+    """Pre-scaled resolution levels of one plan; tiles are encoded on first use and kept.
+
+    source/stamp name the file the levels were built from (see _read_source), so
+    render processes can load a level themselves instead of receiving it.
+    """
+
+    def __init__(self, version: str, img: Image.Image, source: Path, stamp: Path | None = None) -> None:
+        self.version = version
+        self.source = source
+        self.stamp = stamp
+        self.width, self.height = img.size
+        self.levels: list[Image.Image] = []
+        with metrics.render_timer("pyramid"):
+            for scale in LEVEL_SCALES:
+                size = (max(1, round(self.width * scale)), max(1, round(self.height * scale)))
+                self.levels.append(img if scale == 1.0 else img.resize(size, Image.LANCZOS))
+        self._tiles: dict[tuple[int, int, int, str], bytes] = {}
+
+    def meta(self) -> dict[str, Any]:
+        return {
+            "version": self.version,
+            "width": self.width,
+            "height": self.height,
+            "tile": TILE_SIZE,
+            "levels": [
+                {
+                    "z": z,
+                    "scale": LEVEL_SCALES[z],
+                    "width": im.width,
+                    "height": im.height,
+                    "cols": -(-im.width // TILE_SIZE),
+                    "rows": -(-im.height // TILE_SIZE),
+                }
+                for z, im in enumerate(self.levels)
+            ],
+        }
+
+    def tile(self, z: int, x: int, y: int, fmt: str) -> bytes | None:
+        if not (0 <= z < len(self.levels)) or fmt not in TILE_FORMATS:
+            return None
+        key = (z, x, y, fmt)
+        data = self._tiles.get(key)
+        if data is not None:
+            return data
+        im = self.levels[z]
+        left, top = x * TILE_SIZE, y * TILE_SIZE
+        if x < 0 or y < 0 or left >= im.width or top >= im.height:
+            return None
+        crop = im.crop((left, top, min(left + TILE_SIZE, im.width), min(top + TILE_SIZE, im.height)))
+        buf = io.BytesIO()
+        with metrics.render_timer("tile"):
+            if fmt == "webp":
+                crop.save(buf, format="WEBP", quality=80, method=4)
+            else:
+                crop.save(buf, format="PNG", optimize=True)
+        data = buf.getvalue()
+        self._tiles[key] = data
+        return data
+
+
+_pyramids: dict[str, PlanPyramid] = {}
+_pyramid_lock = threading.Lock()
+
+
+def _lot_source(lot: str) -> tuple[str, Path] | None:
+    """(version, source image) for a lot; None if that plan is not installed."""
+    if lot == "bank":
+        if not PLAN_IMAGE.exists():
+            return None
+        return plan_version(), PLAN_IMAGE
+    p = post_plan_path()
+    if p is None:
+        return None
+    return _file_version(p), p
+
+
+def _file_version(path: Path) -> str:
+    st = path.stat()
+    return hashlib.sha256(repr((str(path), st.st_mtime_ns, st.st_size)).encode()).hexdigest()[:16]
+
+
+def plan_pyramid(lot: str, annotated_out: Path) -> PlanPyramid | None:
+    """Pyramid for a lot ("bank" uses the annotated plan), rebuilt when its source changes."""
+    src = _lot_source(lot)
+    if src is None:
+        return None
+    version, path = src
+    pyr = _pyramids.get(lot)
+    if pyr is not None and pyr.version == version:
+        return pyr
+    with _pyramid_lock:
+        pyr = _pyramids.get(lot)
+        if pyr is not None and pyr.version == version:
+            return pyr
+        if lot == "bank":
+            img = Image.open(io.BytesIO(annotated_plan(annotated_out).png))
+            source, stamp = annotated_out, annotated_out.with_name(annotated_out.name + ".version")
+        else:
+            img = Image.open(path)
+            source, stamp = path, None
+        pyr = PlanPyramid(version, img.convert("RGB"), source, stamp)
+        _pyramids[lot] = pyr
+        return pyr
+
+
+# --- Availability overlay --------------------------------------------------------------
+
+STATUS_COLORS = {
+    "free": (22, 163, 74),  # green
+    "booked": (220, 38, 38),  # red
+    "not_offered": (156, 163, 175),  # grey
+}
+OVERLAY_LEVEL = 2  # half resolution: readable numbers, small encode
+
+
+def label_spot_name(lot: str, n: int) -> str | None:
+    """Spot name a plan label number stands for (only the bank plan is numbered)."""
+    if lot == "bank":
+        return f"P{n:02d}"
+    return None
+
+
+@metrics.timed_render("overlay")
+def render_status_overlay(
+    pyr: PlanPyramid,
+    lot: str,
+    statuses: dict[str, str],
+    z: int = OVERLAY_LEVEL,
+    fmt: str = "webp",
+) -> bytes:
+    """Composite per-spot status rings onto a cached pyramid level.
+
+    The decoded plan with its static labels is the pyramid level (kept in memory,
+    and in each render process); only the status layer is drawn per call.
+    """
+    z = max(0, min(z, len(pyr.levels) - 1))
+    scale = LEVEL_SCALES[z]
+    rings = []
+    for lab in load_labels(lot):
+        name = label_spot_name(lot, int(lab.get("n")))
+        if name is None:
+            continue
+        color = STATUS_COLORS[statuses.get(name, "not_offered")]
+        rings.append((int(lab.get("x")) * scale, int(lab.get("y")) * scale, color))
+    if _render_pool is not None:
+        stamp = str(pyr.stamp) if pyr.stamp is not None else None
+        data = _offload(_draw_overlay_level, lot, pyr.version, str(pyr.source), stamp, z, rings, fmt)
+        if data is not None:
+            return data
+    # No pool, or the source file already moved on to another version.
+    return _draw_overlay(pyr.levels[z], scale, rings, fmt)
+
+
+# Render processes: (version, level) per (lot, z), loaded from the pyramid's source file.
+_worker_levels: dict[tuple[str, int], tuple[str, Image.Image]] = {}
+
+
+def _read_source(source: str, stamp: str | None, version: str) -> Image.Image | None:
+    """The pyramid's source image if it still is that version, else None.
+
+    The annotated bank plan carries a version sidecar (checked before and after the
+    read, another worker may replace both); other plans are versioned by file stat.
+    """
+    path = Path(source)
+    try:
+        if stamp is None:
+            if _file_version(path) != version:
+                return None
+            return Image.open(path).convert("RGB")
+        stamp_path = Path(stamp)
+        if stamp_path.read_text(encoding="utf-8").strip() != version:
+            return None
+        data = path.read_bytes()
+        if stamp_path.read_text(encoding="utf-8").strip() != version:
+            return None
+        return Image.open(io.BytesIO(data)).convert("RGB")
+    except OSError:
+        return None
+
+
+def _draw_overlay_level(
+    lot: str, version: str, source: str, stamp: str | None, z: int, rings: list[tuple[float, float, tuple]], fmt: str
+) -> bytes | None:
+    cached = _worker_levels.get((lot, z))
+    if cached is None or cached[0] != version:
+        img = _read_source(source, stamp, version)
+        if img is None:
+            return None
+        scale = LEVEL_SCALES[z]
+        if scale != 1.0:
+            size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+            img = img.resize(size, Image.LANCZOS)
+        cached = _worker_levels[(lot, z)] = (version, img)
+    return _draw_overlay(cached[1], LEVEL_SCALES[z], rings, fmt)
+
+
+def _draw_overlay(level: Image.Image, scale: float, rings: list[tuple[float, float, tuple]], fmt: str) -> bytes:
+    layer = Image.new("RGBA", level.size, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(layer)
+    r = max(6, round(26 * scale))
+    width = max(2, round(8 * scale))
+    for x, y, color in rings:
+        draw.ellipse((x - r, y - r, x + r, y + r), outline=color + (235,), width=width)
+
+    out = level.convert("RGBA")
+    out.alpha_composite(layer)
+    buf = io.BytesIO()
+    if fmt == "webp":
+        out.convert("RGB").save(buf, format="WEBP", quality=80, method=2)
+    else:
+        out.convert("RGB").save(buf, format="PNG", compress_level=3)
+    return buf.getvalue()
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """python -m parking_app.app.plan_labels import [FILE] [--lot LOT]
+
+    Replaces the lot's labels with those of a plan_labels.json file (default:
+    data/plan_labels.json).
+    """
+    ap = argparse.ArgumentParser(prog="python -m parking_app.app.plan_labels")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    imp = sub.add_parser("import", help="load a plan_labels.json into the database")
+    imp.add_argument("file", nargs="?", type=Path, default=None)
+    imp.add_argument("--lot", default="bank")
+    args = ap.parse_args(argv)
+
+    path = args.file or LABELS_PATH
+    labels = read_labels_json(path)
+    migrate()
+    with connect() as con:
+        with immediate(con):
+            version = replace_labels(con, args.lot, labels)
+    print(f"{len(labels)} labels from {path} imported into lot {args.lot} (version {version})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
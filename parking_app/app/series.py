@@ -0,0 +1,229 @@
+from __future__ import annotations
+
+import secrets
+import sqlite3
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+
+from .berlin import ensure_days, iter_days, weekday_count
+from .db import immediate
+from .outbox import enqueue_cancellations, enqueue_confirmation
+
+# Same conflict rule as a single booking: take over cancelled rows, never active ones.
+SERIES_BOOK_SQL = """
+INSERT INTO bookings(spot_id, day, booker_email, status, created_at, manage_token)
+VALUES(?, ?, ?, 'active', ?, ?)
+ON CONFLICT(spot_id, day) DO UPDATE SET
+  booker_email=excluded.booker_email,
+  status='active',
+  created_at=excluded.created_at,
+  cancelled_at=NULL,
+  cancel_reason=NULL,
+  manage_token=excluded.manage_token
+WHERE bookings.status <> 'active'
+"""
+
+
+@dataclass
+class SeriesResult:
+    booked: list[tuple[str, str]] = field(default_factory=list)  # (day, manage_token)
+    failed: list[dict] = field(default_factory=list)  # {"day", "reason"}
+    hard_failed: bool = False
+
+
+def parse_weekdays(values: list[str] | None) -> set[int]:
+    """Form values "0".."6" (0=Mon) -> set of weekday ints; junk is ignored."""
+    out: set[int] = set()
+    for w in values or []:
+        try:
+            wi = int(w)
+        except Exception:
+            continue
+        if 0 <= wi <= 6:
+            out.add(wi)
+    return out
+
+
+def _weekday_params(weekdays: set[int]) -> tuple[str, list[int]]:
+    """Placeholders and values for days.weekday IN (...) (0=Mon, like date.weekday())."""
+    wd = sorted(weekdays)
+    return ",".join("?" * len(wd)), wd
+
+
+def book_series(
+    con: sqlite3.Connection,
+    spot_id: int,
+    start: date,
+    end: date,
+    weekdays: set[int],
+    mode: str,
+    today: date,
+    max_day: date,
+    created_at: str,
+    booker_email: str = "",
+    label: str = "",
+    base_url: str = "",
+) -> SeriesResult:
+    """Book the days in [start, end] on the given weekdays for one spot.
+
+    The target days within the booking window are read with their offer and booking
+    in one query (days table joined with offers and bookings) under the write lock, the accepted/failed
+    split is made per row and all bookings are written with a single executemany.
+    Hard mode writes nothing unless every target day is bookable. With a
+    booker_email one confirmation listing all booked days is queued in the same
+    transaction.
+    """
+    res = SeriesResult()
+    if end < start or not weekdays:
+        return res
+
+    # Days outside [today, max_day] fail whatever is stored; only the window is queried.
+    first, last = max(start, today), min(end, max_day)
+    res.failed = [
+        {"day": day_s, "reason": "liegt in der Vergangenheit"}
+        for day_s in iter_days(start, min(end, today - timedelta(days=1)), weekdays)
+    ]
+    wd_sql, wd = _weekday_params(weekdays)
+
+    with immediate(con):
+        accepted: list[str] = []
+        if first <= last:
+            ensure_days(con, first, last)
+            for day_s, offered, taken in con.execute(
+                f"""
+                SELECT d.day, o.id IS NOT NULL, b.status IS 'active'
+                FROM days d
+                LEFT JOIN offers o ON o.spot_id=? AND o.day=d.day
+                LEFT JOIN bookings b ON b.spot_id=? AND b.day=d.day
+                WHERE d.day BETWEEN ? AND ? AND d.weekday IN ({wd_sql})
+                ORDER BY d.day
+                """,
+                (spot_id, spot_id, first.isoformat(), last.isoformat(), *wd),
+            ):
+                if not offered:
+                    res.failed.append({"day": day_s, "reason": "nicht angeboten"})
+                elif taken:
+                    res.failed.append({"day": day_s, "reason": "bereits gebucht"})
+                else:
+                    accepted.append(day_s)
+        res.failed += [
+            {"day": day_s, "reason": "liegt außerhalb der Buchungsgrenze"}
+            for day_s in iter_days(max(start, max_day + timedelta(days=1)), end, weekdays)
+        ]
+
+        if mode == "hard" and res.failed:
+            res.hard_failed = True
+            return res
+
+        res.booked = [(day_s, secrets.token_urlsafe(24)) for day_s in accepted]
+        con.executemany(
+            SERIES_BOOK_SQL,
+            [(spot_id, day_s, booker_email, created_at, token) for day_s, token in res.booked],
+        )
+        if booker_email:
+            enqueue_confirmation(con, booker_email, label, res.booked, base_url, created_at)
+
+    return res
+
+
+@dataclass
+class RangeCounts:
+    inserted: int = 0
+    removed: int = 0
+    cancelled: int = 0
+    skipped: int = 0
+    notified: int = 0
+
+
+def offer_series(
+    con: sqlite3.Connection,
+    spot_id: int,
+    start: date,
+    end: date,
+    weekdays: set[int],
+    lo: date,
+    hi: date,
+    created_at: str,
+) -> RangeCounts:
+    """Offer the days in [start, end] on the given weekdays that lie within [lo, hi].
+
+    One INSERT ... SELECT from the days table; days outside the window or already
+    offered count as skipped.
+    """
+    res = RangeCounts()
+    first, last = max(start, lo), min(end, hi)
+    if first <= last and weekdays:
+        wd_sql, wd = _weekday_params(weekdays)
+        with immediate(con):
+            ensure_days(con, first, last)
+            res.inserted = con.execute(
+                f"""
+                INSERT OR IGNORE INTO offers(spot_id, day, created_at)
+                SELECT ?, day, ? FROM days WHERE day BETWEEN ? AND ? AND weekday IN ({wd_sql})
+                """,
+                (spot_id, created_at, first.isoformat(), last.isoformat(), *wd),
+            ).rowcount
+    res.skipped = weekday_count(start, end, weekdays) - res.inserted
+    return res
+
+
+def withdraw_range(
+    con: sqlite3.Connection,
+    spot_id: int,
+    lo: date,
+    hi: date,
+    weekdays: set[int],
+    cancel_from: str,
+    cancelled_at: str,
+    reason: str,
+    base_url: str,
+) -> RangeCounts:
+    """Withdraw offers in [lo, hi] on the given weekdays and cancel affected bookings.
+
+    Active bookings on days >= cancel_from (owner cancel window) are cancelled in one
+    UPDATE; offers are then removed with one range DELETE. Days whose active booking
+    can no longer be cancelled keep their offer and are reported as skipped.
+    Opted-in bookers of the cancelled bookings get a mail queued with one INSERT.
+    """
+    res = RangeCounts()
+    if hi < lo or not weekdays:
+        return res
+    lo_s = lo.isoformat()
+    hi_s = hi.isoformat()
+    wd_sql, wd = _weekday_params(weekdays)
+    # The matching days, from the days table.
+    in_days = f"day IN (SELECT day FROM days WHERE day BETWEEN ? AND ? AND weekday IN ({wd_sql}))"
+    days_args = (lo_s, hi_s, *wd)
+
+    with immediate(con):
+        ensure_days(con, lo, hi)
+        res.cancelled = con.execute(
+            f"""
+            UPDATE bookings SET status='cancelled_by_owner', cancelled_at=?, cancel_reason=?
+            WHERE spot_id=? AND day BETWEEN ? AND ? AND status='active'
+              AND day>=? AND {in_days}
+            """,
+            (cancelled_at, reason, spot_id, lo_s, hi_s, cancel_from, *days_args),
+        ).rowcount
+        if res.cancelled:
+            res.notified = enqueue_cancellations(con, spot_id, lo_s, hi_s, cancelled_at, base_url)
+        res.removed = con.execute(
+            f"""
+            DELETE FROM offers
+            WHERE spot_id=? AND day BETWEEN ? AND ? AND {in_days}
+              AND NOT EXISTS (
+                SELECT 1 FROM bookings b
+                WHERE b.spot_id=offers.spot_id AND b.day=offers.day AND b.status='active'
+              )
+            """,
+            (spot_id, lo_s, hi_s, *days_args),
+        ).rowcount
+        res.skipped = con.execute(
+            f"""
+            SELECT COUNT(*) FROM bookings
+            WHERE spot_id=? AND day BETWEEN ? AND ? AND status='active'
+              AND {in_days}
+            """,
+            (spot_id, lo_s, hi_s, *days_args),
+        ).fetchone()[0]
+    return res
@@ -0,0 +1,212 @@
+"""Signed owner/admin sessions and the in-memory credential index.
+
+Credentials (admin code, plan token, owner codes, session key) are loaded once
+into a Credentials index. The secret files are re-checked for changes at most
+every CHECK_EVERY_S; owner codes are reloaded from spots when the spots topic
+fires (versions bus). Lookups never touch disk or the database.
+
+After logging in, owners and admins get a signed, expiring cookie (itsdangerous)
+with their role, spot id and a fingerprint of the code they used, so changing a
+code ends the sessions made with the old one. Handlers read the identity from
+the cookie; the old ?code= links keep working.
+"""
+from __future__ import annotations
+
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Optional
+
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from starlette.requests import Request
+from starlette.responses import Response
+
+from .db import connect
+
+OWNER_COOKIE = "owner_session"
+ADMIN_COOKIE = "admin_session"
+OWNER_MAX_AGE_S = 30 * 24 * 3600
+ADMIN_MAX_AGE_S = 12 * 3600
+CHECK_EVERY_S = 2.0
+
+
+@dataclass(frozen=True)
+class Owner:
+    spot_id: int
+    spot: str
+    code: str
+
+
+def _same_secret(given: str, secret: str) -> bool:
+    # compare_digest rejects non-ASCII str, so any user input is compared as bytes.
+    return hmac.compare_digest(given.strip().encode("utf-8"), secret.encode("utf-8"))
+
+
+def ensure_session_key(secrets_dir: Path) -> str:
+    secrets_dir.mkdir(parents=True, exist_ok=True)
+    p = secrets_dir / "session_key.txt"
+    if p.exists():
+        return p.read_text(encoding="utf-8").strip()
+    key = secrets.token_urlsafe(32)
+    p.write_text(key + "\n", encoding="utf-8")
+    try:
+        os.chmod(p, 0o600)
+    except Exception:
+        pass
+    return key
+
+
+class Credentials:
+    """In-memory index of every credential the app checks.
+
+    secrets: name -> loader returning the current value (creating it if needed);
+    "admin", "plan" and "session_key" are used. watch: the files behind them.
+    """
+
+    def __init__(self, secrets: dict[str, Callable[[], str]], watch: Callable[[], list[Path]]) -> None:
+        self._loaders = secrets
+        self._watch = watch
+        self._lock = threading.Lock()
+        self._values: dict[str, str] = {}
+        self._stamps: dict[Path, Optional[tuple[int, int]]] = {}
+        self._checked = 0.0
+        self._owners: dict[str, Owner] = {}
+        self._by_spot: dict[int, Owner] = {}
+        self._owners_stale = True
+        self._signer: Optional[URLSafeTimedSerializer] = None
+
+    def load(self) -> None:
+        """(Re)read everything; at startup after the spots are in place."""
+        with self._lock:
+            self._load_files()
+        self._load_owners()
+
+    def _stamp(self, p: Path) -> Optional[tuple[int, int]]:
+        try:
+            st = p.stat()
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _load_files(self) -> None:
+        self._values = {name: load() for name, load in self._loaders.items()}
+        self._stamps = {p: self._stamp(p) for p in self._watch()}
+        self._signer = URLSafeTimedSerializer(self._values["session_key"], salt="parking-session")
+        self._checked = time.monotonic()
+
+    def _fresh(self) -> dict[str, str]:
+        now = time.monotonic()
+        if not self._values or now - self._checked >= CHECK_EVERY_S:
+            with self._lock:
+                if not self._values:
+                    self._load_files()
+                elif now - self._checked >= CHECK_EVERY_S:
+                    self._checked = now
+                    if any(self._stamp(p) != stamp for p, stamp in self._stamps.items()):
+                        self._load_files()
+        return self._values
+
+    def _load_owners(self) -> None:
+        with connect() as con:
+            rows = con.execute("SELECT id, name, owner_code FROM spots WHERE owner_code IS NOT NULL").fetchall()
+        owners = {r["owner_code"].upper(): Owner(r["id"], r["name"], r["owner_code"].upper()) for r in rows}
+        with self._lock:
+            self._owners = owners
+            self._by_spot = {o.spot_id: o for o in owners.values()}
+            self._owners_stale = False
+
+    def owners_changed(self, _key: Optional[str] = None) -> None:
+        self._owners_stale = True
+
+    def _owner_index(self) -> tuple[dict[str, Owner], dict[int, Owner]]:
+        if self._owners_stale:
+            self._load_owners()
+        return self._owners, self._by_spot
+
+    def owner_by_code(self, code: str) -> Optional[Owner]:
+        return self._owner_index()[0].get((code or "").strip().upper())
+
+    def owner_by_spot(self, spot_id: int) -> Optional[Owner]:
+        return self._owner_index()[1].get(spot_id)
+
+    def is_admin_code(self, code: str) -> bool:
+        return bool(code) and _same_secret(code, self._fresh()["admin"])
+
+    def is_plan_token(self, token: str) -> bool:
+        return bool(token) and _same_secret(token, self._fresh()["plan"])
+
+    def plan_token(self) -> str:
+        return self._fresh()["plan"]
+
+    def admin_fingerprint(self) -> str:
+        return self.fingerprint(self._fresh()["admin"])
+
+    def fingerprint(self, code: str) -> str:
+        key = self._fresh()["session_key"].encode()
+        return hmac.new(key, code.encode(), hashlib.sha256).hexdigest()[:16]
+
+    def sign(self, payload: dict) -> str:
+        self._fresh()
+        return self._signer.dumps(payload)
+
+    def unsign(self, value: str, max_age: int) -> Optional[dict]:
+        self._fresh()
+        try:
+            payload = self._signer.loads(value, max_age=max_age)
+        except BadSignature:  # also covers expired
+            return None
+        return payload if isinstance(payload, dict) else None
+
+
+def current_owner(request: Request, creds: Credentials, code: str = "") -> Optional[Owner]:
+    """Owner from an explicit code (old links, forms) or else from the session cookie."""
+    if code:
+        return creds.owner_by_code(code)
+    value = request.cookies.get(OWNER_COOKIE)
+    payload = creds.unsign(value, OWNER_MAX_AGE_S) if value else None
+    if not payload or payload.get("r") != "owner":
+        return None
+    owner = creds.owner_by_spot(payload.get("s", 0))
+    if owner is None or not hmac.compare_digest(payload.get("k", ""), creds.fingerprint(owner.code)):
+        return None
+    return owner
+
+
+def is_admin(request: Request, creds: Credentials, code: str = "") -> bool:
+    if code:
+        return creds.is_admin_code(code)
+    value = request.cookies.get(ADMIN_COOKIE)
+    payload = creds.unsign(value, ADMIN_MAX_AGE_S) if value else None
+    if not payload or payload.get("r") != "admin":
+        return False
+    return hmac.compare_digest(payload.get("k", ""), creds.admin_fingerprint())
+
+
+def _set(response: Response, request: Request, name: str, value: str, max_age: int) -> None:
+    response.set_cookie(
+        name,
+        value,
+        max_age=max_age,
+        httponly=True,
+        samesite="lax",
+        secure=request.url.scheme == "https",
+    )
+
+
+def login_owner(response: Response, request: Request, creds: Credentials, owner: Owner) -> None:
+    value = creds.sign({"r": "owner", "s": owner.spot_id, "k": creds.fingerprint(owner.code)})
+    _set(response, request, OWNER_COOKIE, value, OWNER_MAX_AGE_S)
+
+
+def login_admin(response: Response, request: Request, creds: Credentials) -> None:
+    value = creds.sign({"r": "admin", "k": creds.admin_fingerprint()})
+    _set(response, request, ADMIN_COOKIE, value, ADMIN_MAX_AGE_S)
+
+
+def logout(response: Response, name: str) -> None:
+    response.delete_cookie(name)
@@ -0,0 +1,68 @@
+"""Jinja environment with a persistent bytecode cache.
+
+Compiled templates are stored as Python bytecode in CACHE_DIR, so a restarted
+worker loads them instead of parsing and compiling each template on its first
+request. precompile() compiles everything in TEMPLATE_DIR up front (at startup,
+or at build time via `make templates`).
+
+    python -m parking_app.app.templating
+"""
+from __future__ import annotations
+
+import sys
+import time
+from pathlib import Path
+
+import jinja2
+from fastapi.templating import Jinja2Templates
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+TEMPLATE_DIR = BASE_DIR / "templates"
+CACHE_DIR = BASE_DIR / "data" / "template_cache"
+
+
+class _BytecodeCache(jinja2.FileSystemBytecodeCache):
+    # The cache only saves time: an unwritable directory must not break rendering.
+    def dump_bytecode(self, bucket: jinja2.bccache.Bucket) -> None:
+        try:
+            super().dump_bytecode(bucket)
+        except OSError:
+            pass
+
+
+def make_templates(directory: Path = TEMPLATE_DIR, cache_dir: Path = CACHE_DIR) -> Jinja2Templates:
+    env = jinja2.Environment(
+        loader=jinja2.FileSystemLoader(str(directory)),
+        autoescape=True,  # as Jinja2Templates(directory=...) does
+        bytecode_cache=_BytecodeCache(str(cache_dir)),
+    )
+    return Jinja2Templates(env=env)
+
+
+def set_cache_dir(templates: Jinja2Templates, cache_dir: Path) -> None:
+    templates.env.bytecode_cache = _BytecodeCache(str(cache_dir))
+
+
+def precompile(templates: Jinja2Templates) -> int:
+    """Load every template once (fills the bytecode cache); returns the count."""
+    cache = templates.env.bytecode_cache
+    if isinstance(cache, jinja2.FileSystemBytecodeCache):
+        try:
+            Path(cache.directory).mkdir(parents=True, exist_ok=True)
+        except OSError:
+            pass
+    names = templates.env.list_templates(extensions=["html"])
+    for name in names:
+        templates.env.get_template(name)
+    return len(names)
+
+
+def main() -> int:
+    t0 = time.perf_counter()
+    n = precompile(make_templates())
+    print(f"{n} templates compiled into {CACHE_DIR} in {(time.perf_counter() - t0) * 1000:.0f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
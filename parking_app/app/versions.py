@@ -0,0 +1,154 @@
+"""Per-day data versions and the cross-worker invalidation bus.
+
+Cache keys include version(day), so stale entries simply stop being hit. The
+versions themselves are process-local but fed from the change_log table: triggers
+on offers/bookings/spots append a row for every change (migration 4) and other
+writers can add their own topics with publish().
+
+Each worker keeps one listener connection. sync() reads PRAGMA data_version on it,
+which only changes when some other connection committed, and only then tails
+change_log. New "day" entries bump that day, every entry is handed to the
+callbacks subscribed to its topic.
+"""
+from __future__ import annotations
+
+import itertools
+import sqlite3
+import threading
+from collections import defaultdict
+from typing import Callable, Iterable, Optional
+
+from .db import is_busy, open_connection
+
+# change_log rows kept for workers that were idle for a while; a worker that falls
+# further behind than that invalidates everything instead of replaying.
+CHANGE_LOG_KEEP = 50_000
+PRUNE_EVERY = 10_000
+
+_lock = threading.Lock()
+_counter = itertools.count(1)
+_days: dict[str, int] = {}
+_epoch = 0  # bumped when everything has to be considered changed
+
+Subscriber = Callable[[Optional[str]], None]
+_subscribers: dict[str, list[Subscriber]] = defaultdict(list)
+
+_sync_lock = threading.Lock()
+_listener: Optional[sqlite3.Connection] = None
+_data_version: Optional[int] = None
+_seen_seq = 0
+_pruned_seq = 0
+
+
+def bump(days: Iterable[str]) -> None:
+    with _lock:
+        for day in days:
+            _days[day] = next(_counter)
+
+
+def bump_all() -> None:
+    global _epoch
+    with _lock:
+        _epoch = next(_counter)
+
+
+def version(day: str) -> tuple[int, int]:
+    return _epoch, _days.get(day, 0)
+
+
+def range_version(con: sqlite3.Connection, first: str, last: str) -> tuple[int, int, int]:
+    """Database-wide version of the days first..last, the same in every worker.
+
+    (latest change of a day in the range, latest spots change, oldest kept entry).
+    Any change appends a newer change_log row; once pruning drops rows the oldest
+    kept entry moves up, so an old value never comes back for different data.
+    """
+    row = con.execute(
+        """
+        SELECT (SELECT MAX(seq) FROM change_log WHERE topic='day' AND key BETWEEN ? AND ?),
+               (SELECT MAX(seq) FROM change_log WHERE topic='spots'),
+               (SELECT MIN(seq) FROM change_log)
+        """,
+        (first, last),
+    ).fetchone()
+    return tuple(v or 0 for v in row)
+
+
+def subscribe(topic: str, callback: Subscriber) -> None:
+    """Call callback(key) for every change_log entry of topic.
+
+    Topic "*" is dispatched (key None) when this worker missed entries and must treat
+    everything as changed.
+    """
+    _subscribers[topic].append(callback)
+
+
+def publish(con: sqlite3.Connection, topic: str, key: Optional[str] = None) -> None:
+    """Log a change; part of the caller's transaction, visible to all workers after commit."""
+    con.execute("INSERT INTO change_log(topic, key) VALUES(?, ?)", (topic, key))
+
+
+def _dispatch(topic: str, key: Optional[str]) -> None:
+    for callback in _subscribers.get(topic, ()):
+        callback(key)
+
+
+def sync() -> None:
+    """Apply changes committed by any connection since the last call (cheap when none)."""
+    global _listener, _data_version, _seen_seq, _pruned_seq
+    with _sync_lock:
+        if _listener is None:
+            _listener = open_connection()
+            # Never wait for the write lock while requests queue behind _sync_lock.
+            _listener.execute("PRAGMA busy_timeout = 0")
+            _seen_seq = _listener.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log").fetchone()[0]
+            _pruned_seq = _seen_seq
+            _data_version = _listener.execute("PRAGMA data_version").fetchone()[0]
+            return
+
+        dv = _listener.execute("PRAGMA data_version").fetchone()[0]
+        if dv == _data_version:
+            return
+        _data_version = dv
+
+        lo, hi = _listener.execute(
+            "SELECT MIN(seq), MAX(seq) FROM change_log WHERE seq > ?", (_seen_seq,)
+        ).fetchone()
+        if hi is None:
+            return
+        if lo != _seen_seq + 1:
+            # Entries we never saw were pruned (or skipped): treat everything as changed.
+            bump_all()
+            _dispatch("*", None)
+        else:
+            rows = _listener.execute(
+                "SELECT DISTINCT topic, key FROM change_log WHERE seq BETWEEN ? AND ?", (lo, hi)
+            ).fetchall()
+            bump(key for topic, key in rows if topic == "day")
+            for topic, key in rows:
+                _dispatch(topic, key)
+        _seen_seq = hi
+
+        if _seen_seq - _pruned_seq >= PRUNE_EVERY:
+            _prune()
+
+
+def _prune() -> None:
+    global _pruned_seq
+    try:
+        _listener.execute("DELETE FROM change_log WHERE seq <= ?", (_seen_seq - CHANGE_LOG_KEEP,))
+        _listener.commit()
+    except sqlite3.OperationalError as e:
+        if not is_busy(e):
+            raise
+        _listener.rollback()
+        return  # another worker is writing; try again later
+    _pruned_seq = _seen_seq
+
+
+def close() -> None:
+    global _listener
+    with _sync_lock:
+        if _listener is not None:
+            _listener.close()
+            _listener = None
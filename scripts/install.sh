@@ -2,7 +2,7 @@
 set -euo pipefail
 
 # Minimal installer for a VPS.
-# Installs deps into .venv and runs migrations.
+# Installs deps into .venv, runs migrations and precompiles the templates.
 
 cd "$(dirname "$0")/.."
 
@@ -13,6 +13,7 @@ fi
 ./.venv/bin/pip install -U pip wheel
 ./.venv/bin/pip install -r requirements.txt
 
-./.venv/bin/python -c "from parking_app.app.db import migrate; migrate(); print('migrate ok')"
+./.venv/bin/python -c "from parking_app.app.db import migrate; print('migrate ok, schema version', migrate())"
+./.venv/bin/python -m parking_app.app.templating
 
 echo "OK"
@@ -0,0 +1,50 @@
+"""One app per test session, on a throwaway database and secrets directory.
+
+The app keeps module-level state (connection pools, caches, the credential index),
+so every test shares this instance; tests use their own spots and days.
+"""
+from __future__ import annotations
+
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from parking_app.app import db, owners
+from parking_app.app import plan_labels as plan_store
+
+
+@pytest.fixture(scope="session")
+def app_dir(tmp_path_factory):
+    tmp = tmp_path_factory.mktemp("app")
+    db.DB_PATH = tmp / "parking.sqlite3"
+    owners.SECRETS_DIR = tmp / "secrets"
+    owners.OWNERS_PATH = owners.SECRETS_DIR / "owners.json"
+    plan_store.SECRETS_DIR = tmp / "secrets"
+    plan_store.ADMIN_TOKEN_PATH = plan_store.SECRETS_DIR / "plan_admin_token.txt"
+    plan_store.DATA_DIR = tmp / "data"
+    plan_store.LABELS_PATH = plan_store.DATA_DIR / "plan_labels.json"
+
+    from parking_app.app import main
+
+    main.SECRETS_DIR = tmp / "secrets"
+    main.DATA_DIR = tmp / "data"
+    return tmp
+
+
+@pytest.fixture(scope="session")
+def client(app_dir):
+    from parking_app.app import main
+
+    with TestClient(main.app) as c:
+        yield c
+
+
+@pytest.fixture(scope="session")
+def owner_codes(client) -> dict[str, str]:
+    return json.loads(owners.OWNERS_PATH.read_text(encoding="utf-8"))
+
+
+@pytest.fixture(scope="session")
+def admin_code(client, app_dir) -> str:
+    return (app_dir / "secrets" / "admin_code.txt").read_text(encoding="utf-8").strip()
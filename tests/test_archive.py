@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+from datetime import timedelta
+
+import pytest
+
+from parking_app.app import archive, berlin, db
+
+
+def _hot_offers() -> int:
+    with db.connect() as con:
+        return con.execute("SELECT COUNT(*) FROM offers").fetchone()[0]
+
+
+@pytest.mark.parametrize("keep_days", [0, -1, -365])
+def test_keep_days_below_one_is_rejected(client, keep_days):
+    before = _hot_offers()
+    with pytest.raises(ValueError):
+        archive.archive(keep_days)
+    assert _hot_offers() == before
+
+
+def test_cli_rejects_keep_days_below_one(client, capsys):
+    with pytest.raises(SystemExit) as exc:
+        archive.main(["--keep-days", "0"])
+    assert exc.value.code == 2
+    assert "--keep-days" in capsys.readouterr().err
+
+
+def test_archive_moves_past_days_without_change_log(client):
+    t = berlin.today()
+    past = [(t - timedelta(days=500 + i)).isoformat() for i in range(10)]
+    with db.connect() as con:
+        spot_id = con.execute("SELECT id FROM spots WHERE name='P30'").fetchone()[0]
+        con.executemany("INSERT INTO offers(spot_id, day, created_at) VALUES(?, ?, '')", [(spot_id, d) for d in past])
+        seq = con.execute("SELECT MAX(seq) FROM change_log").fetchone()[0]
+
+    res = archive.archive(archive.RETENTION_DAYS)
+
+    assert res.offers == len(past)
+    with db.connect() as con:
+        assert con.execute("SELECT COUNT(*) FROM offers WHERE spot_id=?", (spot_id,)).fetchone()[0] == 0
+        assert con.execute("SELECT COUNT(*) FROM change_log WHERE seq > ?", (seq,)).fetchone()[0] == 0
+        assert con.execute("SELECT moving FROM archive_state").fetchone()[0] == 0
@@ -0,0 +1,21 @@
+from __future__ import annotations
+
+import pytest
+
+
+@pytest.mark.parametrize(
+    "method, url, data, status",
+    [
+        ("post", "/admin", {"code": "ä"}, 401),
+        ("get", "/admin/diag?code=ü", None, 403),
+        ("get", "/plan/labeler?k=ü", None, 403),
+        ("post", "/owner", {"code": "ö"}, 401),
+    ],
+)
+def test_non_ascii_codes_are_rejected(client, method, url, data, status):
+    r = client.request(method, url, data=data, follow_redirects=False)
+    assert r.status_code == status
+
+
+def test_admin_code_still_accepted(client, admin_code):
+    assert client.get("/admin/diag", params={"code": f" {admin_code} "}).status_code == 200
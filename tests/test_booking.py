@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+from datetime import timedelta
+
+from parking_app.app import berlin, db
+
+ALL_WEEKDAYS = [str(i) for i in range(7)]
+
+
+def _day(offset: int) -> str:
+    return (berlin.today() + timedelta(days=offset)).isoformat()
+
+
+def _active_bookings(spot: str) -> list[str]:
+    with db.connect() as con:
+        rows = con.execute(
+            "SELECT b.day FROM bookings b JOIN spots s ON s.id=b.spot_id WHERE s.name=? AND b.status='active' ORDER BY b.day",
+            (spot,),
+        ).fetchall()
+    return [r[0] for r in rows]
+
+
+def _offer_range(client, code: str, first: str, last: str) -> None:
+    r = client.post(
+        "/owner/offer_series",
+        data={"code": code, "start_day": first, "end_day": last, "weekdays": ALL_WEEKDAYS},
+        follow_redirects=False,
+    )
+    assert r.status_code == 303
+
+
+def _book(client, spot: str, day: str):
+    return client.post("/book", data={"day": day, "spot": spot, "lot": "bank"}, follow_redirects=False)
+
+
+def test_double_booking_is_a_conflict(client, owner_codes):
+    d = _day(5)
+    r = client.post("/owner/offer", data={"code": owner_codes["P20"], "day": d, "p": 0}, follow_redirects=False)
+    assert r.status_code == 303
+
+    first = _book(client, "P20", d)
+    assert first.status_code == 303 and first.headers["location"].startswith("/manage/")
+    assert _book(client, "P20", d).status_code == 409
+    assert _active_bookings("P20") == [d]
+
+
+def test_booking_a_day_that_is_not_offered_fails(client):
+    r = _book(client, "P24", _day(5))
+    assert r.status_code == 400
+    assert _active_bookings("P24") == []
+
+
+def test_soft_series_books_the_free_days(client, owner_codes):
+    first, last = _day(3), _day(16)
+    _offer_range(client, owner_codes["P21"], first, last)
+    taken = _day(7)
+    assert _book(client, "P21", taken).status_code == 303
+
+    r = client.post(
+        "/series",
+        data={"spot": "P21", "start_day": first, "end_day": last, "mode": "soft", "weekdays": ALL_WEEKDAYS},
+    )
+    assert r.status_code == 200
+    assert "Nicht möglich (1)" in r.text
+    assert _active_bookings("P21") == [_day(i) for i in range(3, 17)]
+
+
+def test_hard_series_books_nothing_on_conflict(client, owner_codes):
+    first, last = _day(3), _day(16)
+    _offer_range(client, owner_codes["P22"], first, last)
+    taken = _day(10)
+    assert _book(client, "P22", taken).status_code == 303
+
+    r = client.post(
+        "/series",
+        data={"spot": "P22", "start_day": first, "end_day": last, "mode": "hard", "weekdays": ALL_WEEKDAYS},
+    )
+    assert r.status_code == 409
+    assert _active_bookings("P22") == [taken]
+
+
+def test_hard_series_needs_every_day_offered(client, owner_codes):
+    _offer_range(client, owner_codes["P23"], _day(3), _day(9))
+    r = client.post(
+        "/series",
+        data={"spot": "P23", "start_day": _day(3), "end_day": _day(12), "mode": "hard", "weekdays": ALL_WEEKDAYS},
+    )
+    assert r.status_code == 409
+    assert _active_bookings("P23") == []
@@ -0,0 +1,21 @@
+from __future__ import annotations
+
+from datetime import timedelta
+
+from parking_app.app import berlin
+
+
+def test_cached_day_view_follows_bookings(client, owner_codes):
+    d = (berlin.today() + timedelta(days=40)).isoformat()
+    book_form = 'name="spot" value="P25"'
+    assert book_form not in client.get(f"/day/{d}").text
+
+    r = client.post("/owner/offer", data={"code": owner_codes["P25"], "day": d, "p": 0}, follow_redirects=False)
+    assert r.status_code == 303
+    assert book_form in client.get(f"/day/{d}").text
+
+    r = client.post("/book", data={"day": d, "spot": "P25", "lot": "bank"}, follow_redirects=False)
+    assert r.status_code == 303
+    page = client.get(f"/day/{d}")
+    assert page.status_code == 200
+    assert book_form not in page.text
@@ -0,0 +1,16 @@
+from __future__ import annotations
+
+from parking_app.app.emailer import SmtpConfig, build_message
+
+
+def _build(cfg: SmtpConfig, key: str):
+    return build_message(cfg, key, "owner@example.org", "Buchung storniert", "P30 am 2026-10-19")
+
+
+def test_message_id_is_stable_per_outbox_row():
+    cfg = SmtpConfig(host="127.0.0.1", sender="Parkplatz-Share <parken@example.org>")
+    first = _build(cfg, "cancel:17:2026-10-19")
+    again = _build(cfg, "cancel:17:2026-10-19")
+    assert first["Message-ID"] == again["Message-ID"]
+    assert first["Message-ID"].endswith("@example.org>")
+    assert _build(cfg, "cancel:18:2026-10-19")["Message-ID"] != first["Message-ID"]
@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from parking_app.app import db
+from parking_app.app import plan_labels as plan_store
+
+
+def _has_labels_version(lot: str = "bank") -> bool:
+    with db.connect() as con:
+        return con.execute("SELECT 1 FROM plan_label_versions WHERE lot=?", (lot,)).fetchone() is not None
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        '[{"n": 1, "x": 10',  # cut off
+        '[{"n": 1}]',  # missing coordinates
+        '{"n": 1, "x": 10, "y": 20}',  # not a list
+        '[{"n": "a", "x": 10, "y": 20}]',
+        '[{"n": 1, "x": 10, "y": 20}, {"n": 1, "x": 30, "y": 40}]',  # duplicate number
+    ],
+)
+def test_malformed_labels_file_does_not_break_startup(client, content):
+    from parking_app.app import main
+
+    plan_store.LABELS_PATH.parent.mkdir(parents=True, exist_ok=True)
+    plan_store.LABELS_PATH.write_text(content, encoding="utf-8")
+    try:
+        main._startup()
+        assert plan_store.import_legacy_labels() == 0
+    finally:
+        plan_store.LABELS_PATH.unlink()
+    assert not _has_labels_version()
+    assert client.get("/").status_code == 200
+
+
+def test_labels_file_is_imported_once(client):
+    labels = [{"n": 1, "x": 10, "y": 20}, {"n": 2, "x": 30, "y": 40}]
+    plan_store.LABELS_PATH.parent.mkdir(parents=True, exist_ok=True)
+    plan_store.LABELS_PATH.write_text(json.dumps(labels), encoding="utf-8")
+    try:
+        assert plan_store.import_legacy_labels() == 2
+        assert plan_store.import_legacy_labels() == 0
+    finally:
+        plan_store.LABELS_PATH.unlink()
+    assert plan_store.load_labels("bank") == labels